@@ -0,0 +1,196 @@
+"""
+CourtIQ Answer Rendering
+Plain-text answers for simple query results, without asking the model.
+
+Most generated queries return a single figure, one record or a short
+ranked list, and the model's answer only restates those rows. Results of
+one of those shapes are phrased here from the column names and values
+instead, in the same plain-text style the answer prompt asks for: dashes
+for lists, dollar amounts for money columns.
+
+The model still writes the answer when the result is larger or wider
+than a short list, was truncated, has computed column names without an
+alias, or when the question is not in English or asks for analysis
+(why, compare, trend, ...). Set ANSWER_RENDERER=0 to always use the model.
+"""
+
+import os
+import re
+import threading
+
+ENABLED = os.getenv('ANSWER_RENDERER', '1').lower() not in ('0', 'false', 'no')
+# Longest list and widest row rendered locally
+MAX_ROWS = int(os.getenv('ANSWER_RENDER_MAX_ROWS', 10))
+MAX_COLUMNS = int(os.getenv('ANSWER_RENDER_MAX_COLUMNS', 4))
+
+# Questions with these words want an explanation, not the rows read back
+ANALYSIS_WORDS = {
+    'why', 'explain', 'compare', 'comparison', 'versus', 'vs', 'trend', 'trends', 'should', 'recommend',
+    'suggest', 'insight', 'insights', 'analyse', 'analyze', 'analysis', 'summarise', 'summarize', 'summary',
+    'describe', 'difference', 'predict', 'forecast', 'improve',
+}
+# Questions in other languages get the model's answer, which replies in kind. A question counts as
+# English when its letters are ASCII and it has no more of FOREIGN_WORDS than of ENGLISH_WORDS.
+ENGLISH_WORDS = {
+    'what', 'which', 'who', 'how', 'when', 'where', 'show', 'list', 'give', 'tell', 'find', 'the', 'is', 'are',
+    'was', 'were', 'did', 'do', 'does', 'me', 'our', 'we', 'top', 'many', 'much', 'most', 'least', 'per', 'by',
+    'of', 'in', 'for', 'with', 'total', 'average', 'number', 'all', 'each', 'have', 'has', "what's", 'and',
+    'a', 'an', 'to', 'from', 'on', 'at', 'any', 'this', 'last', 'members', 'bookings', 'coaches', 'courts',
+}
+FOREIGN_WORDS = {
+    'de', 'la', 'el', 'los', 'las', 'le', 'les', 'des', 'du', 'und', 'der', 'die', 'das', 'ist', 'que', 'qui',
+    'quel', 'quelle', 'quels', 'combien', 'cuantos', 'cuantas', 'cual', 'cuales', 'wie', 'viele', 'welche',
+    'il', 'di', 'che', 'quanti', 'quante', 'os', 'um', 'uma', 'para', 'por', 'con', 'avec', 'mit', 'dans',
+}
+# Matched against whole words of the column name (split on '_'), so lost_bookings is not money
+MONEY_WORDS = {'revenue', 'revenues', 'price', 'prices', 'amount', 'cost', 'costs', 'fee', 'fees', 'spend', 'spent',
+               'income', 'sales', 'paid', 'earned', 'earnings', 'dollar', 'dollars', 'usd'}
+PERCENT_WORDS = {'percent', 'percentage', 'pct'}
+
+_WORDS = re.compile(r"[a-z']+")
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def is_english(question):
+    """Rough check that a question is in English"""
+    if any(not char.isascii() for char in question if char.isalpha()):
+        return False
+    words = _WORDS.findall(question.lower())
+    return sum(word in FOREIGN_WORDS for word in words) <= sum(word in ENGLISH_WORDS for word in words)
+
+
+def wants_analysis(question):
+    return bool(ANALYSIS_WORDS & set(_WORDS.findall(question.lower())))
+
+
+def label(column):
+    """Column name as a phrase: total_revenue -> Total revenue"""
+    text = column.replace("_", " ").strip()
+    return text[:1].upper() + text[1:]
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def format_value(column, value):
+    """A cell for an answer, with money and percentage columns formatted as such"""
+    if value is None:
+        return "none"
+    if not _is_number(value):
+        return str(value)
+    words = set(column.lower().split("_"))
+    if words & MONEY_WORDS and not words & PERCENT_WORDS:
+        return f"${value:,.2f}"
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = f"{value:,}" if isinstance(value, int) else f"{value:,.2f}"
+    if words & PERCENT_WORDS:
+        text += "%"
+    return text
+
+
+def _is_id(column):
+    name = column.lower()
+    return name == "id" or name.endswith("_id")
+
+
+def _numeric_columns(rows, indexes):
+    return [i for i in indexes
+            if all(_is_number(row[i]) for row in rows if row[i] is not None)
+            and any(row[i] is not None for row in rows)]
+
+
+def _join_labels(labels):
+    return labels[0] if len(labels) == 1 else f"{', '.join(labels[:-1])} and {labels[-1]}"
+
+
+def _scalar(rows, column_names, shown):
+    i = shown[0]
+    return f"{label(column_names[i])}: {format_value(column_names[i], rows[0][i])}."
+
+
+def _record(rows, column_names, shown):
+    return "\n".join(f"- {label(column_names[i])}: {format_value(column_names[i], rows[0][i])}" for i in shown)
+
+
+def _list(rows, column_names, shown):
+    i = shown[0]
+    return f"{label(column_names[i])}:\n" + "\n".join(f"- {format_value(column_names[i], row[i])}" for row in rows)
+
+
+def _ranked(rows, column_names, keys, values):
+    def key_text(row):
+        text = format_value(column_names[keys[0]], row[keys[0]])
+        if len(keys) > 1:
+            text += f" ({format_value(column_names[keys[1]], row[keys[1]])})"
+        return text
+
+    def value_text(row):
+        if len(values) == 1:
+            return format_value(column_names[values[0]], row[values[0]])
+        return ", ".join(f"{column_names[i].replace('_', ' ')} {format_value(column_names[i], row[i])}" for i in values)
+
+    header = label(f"{_join_labels([column_names[i] for i in values])} by {column_names[keys[0]]}:")
+    return header + "\n" + "\n".join(f"- {key_text(row)}: {value_text(row)}" for row in rows)
+
+
+def render(question, rows, column_names, truncated=False):
+    """(answer, shape) for a simple result, or (None, reason the model should answer)"""
+    if not is_english(question):
+        return None, "language"
+    if wants_analysis(question):
+        return None, "analysis"
+    if truncated or len(rows) > MAX_ROWS:
+        return None, "rows"
+    if not rows:
+        return "No matching records were found.", "empty"
+    if not all(_IDENTIFIER.match(column) for column in column_names):
+        return None, "unnamed_column"
+
+    # Ids mean nothing to the reader; keep them only when there is nothing else
+    shown = [i for i, column in enumerate(column_names) if not _is_id(column)] or list(range(len(column_names)))
+    if len(shown) > MAX_COLUMNS:
+        return None, "columns"
+
+    if len(rows) == 1:
+        if len(shown) == 1:
+            return _scalar(rows, column_names, shown), "scalar"
+        return _record(rows, column_names, shown), "record"
+
+    if len(shown) == 1:
+        return _list(rows, column_names, shown), "list"
+    values = _numeric_columns(rows, shown)
+    keys = [i for i in shown if i not in values]
+    if not values or not keys or len(keys) > 2:
+        return None, "table"
+    return _ranked(rows, column_names, keys, values), "ranked"
+
+
+class AnswerRenderer:
+    """render() with counts of rendered answers by shape and model answers by reason"""
+
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._rendered = {}
+        self._deferred = {}
+
+    def render(self, question, rows, column_names, truncated=False):
+        """(answer, shape) or (None, reason); answer is None when the model should write it"""
+        if not self.enabled:
+            return None, "disabled"
+        answer, outcome = render(question, rows, column_names, truncated)
+        with self._lock:
+            counts = self._deferred if answer is None else self._rendered
+            counts[outcome] = counts.get(outcome, 0) + 1
+        return answer, outcome
+
+    def stats(self):
+        """Rendered answers by shape (each a model call saved) and model answers by reason"""
+        with self._lock:
+            rendered = sum(self._rendered.values())
+            total = rendered + sum(self._deferred.values())
+            return {"enabled": self.enabled, "llm_calls_saved": rendered,
+                    "rendered_ratio": round(rendered / total, 4) if total else 0.0,
+                    "rendered": dict(self._rendered), "deferred": dict(self._deferred)}
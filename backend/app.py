@@ -3,98 +3,147 @@ CourtIQ Flask Backend
 Handles API requests from React frontend
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import sqlite3
 import os
+import json
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from db import read_connection, write_connection, dedicated_read_connection, pool_stats, data_version
+from migrations import apply_migrations
+from rollups import apply_booking, fetch_booking, normalize_date, dashboard_stats, revenue_by_day
+from bulk_import import import_rows, open_text, iter_csv, iter_ndjson, ENTITIES as BULK_ENTITIES
+from pagination import (parse_page_args, parse_filters, fetch_page, page_headers, InvalidPageRequest,
+                        NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER)
+from cache import (sql_cache, answer_cache, result_cache, admin_cache, prewarm_store, session_store, rows_tokens,
+                   normalize_question, make_key, digest_results)
+from schema import SchemaCache
+from intents import IntentRouter, ENABLED as INTENT_ROUTER_ENABLED
+from answer_render import AnswerRenderer
+from singleflight import SingleFlight
+from llm import ResilientClient, LLMUnavailable, upstream_breaker
+from model_tiers import sql_route, answer_route, test_route, describe as describe_model_tiers
+from prewarm import Prewarmer, load_questions as load_prewarm_questions, ENABLED as PREWARM_ENABLED
+from query_guard import run_guarded_query, guarded_cursor, translate_error, QueryRejected
+from result_format import summarize_for_prompt, ROW_STREAMS, CHARS_PER_TOKEN
+from sessions import (SESSION_HEADER, new_session_id, valid_session_id, new_state, record_turn, render_context,
+                      history_context)
+from encoding import dumps, compress, wants_columnar, columns_from_rows, columns_from_records, COLUMNAR_MIMETYPE
+from rate_limit import rate_limiter, tier_for_api_key
+from metrics import (rate_limit_decisions, intent_routes, rendered_answers, prewarm_answers, sql_repairs, timed_stage,
+                     timed_llm_call, record_llm_response, record_rows, annotate, start_trace, end_trace,
+                     update_cache_gauges, update_flight_metrics, update_llm_metrics, update_pool_gauges,
+                     render as render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE)
 from anthropic import Anthropic
 from dotenv import load_dotenv
-from collections import defaultdict
-from datetime import datetime, timedelta
+from datetime import date
+from functools import partial, wraps
 
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
-
-client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
-
-# Rate limiting
-request_tracker = defaultdict(list)
-MAX_REQUESTS_PER_IP = 5
-
-
-
-SCHEMA = """
-Database Schema for CourtIQ (Tennis Club Analytics):
-
-TABLE: members
-- member_id (INTEGER, PRIMARY KEY)
-- name (TEXT)
-- email (TEXT)
-- phone (TEXT)
-- membership_tier (TEXT: Premium, Standard, Junior)
-- join_date (DATE)
-- status (TEXT: active, inactive, churned)
-
-TABLE: courts
-- court_id (INTEGER, PRIMARY KEY)
-- court_name (TEXT)
-- surface_type (TEXT: hard, clay, grass)
-- indoor (INTEGER: 0 or 1)
-
-TABLE: coaches
-- coach_id (INTEGER, PRIMARY KEY)
-- name (TEXT)
-- specialty (TEXT)
-- hourly_rate (REAL)
-- weekly_available_hours (INTEGER)
-
-TABLE: bookings
-- booking_id (INTEGER, PRIMARY KEY)
-- member_id (INTEGER, FOREIGN KEY)
-- coach_id (INTEGER, FOREIGN KEY, nullable)
-- court_id (INTEGER, FOREIGN KEY)
-- lesson_type (TEXT: private, semi-private, group, court-rental)
-- booking_date (DATE)
-- start_time (TEXT)
-- end_time (TEXT)
-- duration_minutes (INTEGER)
-- price (REAL)
-- status (TEXT: completed, cancelled, no-show, scheduled)
-- cancellation_reason (TEXT: weather, member-request, coach-unavailable)
-- created_at (TEXT)
-
-Current date context: 2026-01-02
-"""
+CORS(app, expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, SESSION_HEADER])
+
+if os.getenv('COURTIQ_FAKE_LLM'):
+    # Offline runs and benchmarks; see fake_anthropic.py
+    from fake_anthropic import FakeAnthropic
+    client = FakeAnthropic()
+else:
+    # llm.py does the retrying
+    client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), max_retries=0)
+llm = ResilientClient(client)
+# Every resilient client in the process, for /health and /metrics
+llm_clients = [llm]
+
+with write_connection() as conn:
+    apply_migrations(conn)
+
+# Filled in with the caller's tier and the quota it exceeded
+RATE_LIMIT_ANSWER = "You've reached the {tier} limit of {quota}. If you'd like to see more or discuss this project, feel free to connect with me on LinkedIn!"
+GREETING_ANSWER = "Hi! I'm here to help you analyze your tennis club data. Try asking questions like: 'Which members have the highest cancellation rate?'"
+UNKNOWN_QUESTION_ANSWER = "I couldn't understand that question. Please ask about members, bookings, coaches, courts, or revenue."
+UPSTREAM_UNAVAILABLE_ANSWER = "I can't reach the language model right now, so I can only answer the suggested and most common questions. Please try again in a minute."
+CASUAL_KEYWORDS = ['hello', 'hi', 'hey', 'thanks', 'thank you', 'bye', 'goodbye']
+
+# Listing filters: query argument -> (condition, converter)
+MEMBER_FILTERS = {
+    'tier': ('membership_tier = ?', str),
+    'status': ('status = ?', str),
+    'joined_from': ('join_date >= ?', str),
+    'joined_to': ('join_date <= ?', str),
+}
+BOOKING_FILTERS = {
+    'date_from': ('b.booking_date >= ?', str),
+    'date_to': ('b.booking_date <= ?', str),
+    'status': ('b.status = ?', str),
+    'lesson_type': ('b.lesson_type = ?', str),
+    'coach_id': ('b.coach_id = ?', int),
+    'court_id': ('b.court_id = ?', int),
+    'member_id': ('b.member_id = ?', int),
+    'tier': ('m.membership_tier = ?', str),
+}
+
+# Ask the larger model to fix generated SQL that fails to run, once per question
+SQL_REPAIR = os.getenv('SQL_REPAIR', '1').lower() not in ('0', 'false', 'no')
+
+# Larger result sets are re-queried rather than cached
+RESULT_CACHE_MAX_ROWS = int(os.getenv('RESULT_CACHE_MAX_ROWS', 5000))
+
+# /ask/batch: questions per request, and pipeline steps run at once per worker
+BATCH_MAX_QUESTIONS = int(os.getenv('BATCH_MAX_QUESTIONS', 20))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 16))
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="courtiq-batch")
+
+# Limits for /ask/rows, which streams every row of a truncated /ask result to the client
+EXPORT_MAX_ROWS = int(os.getenv('EXPORT_MAX_ROWS', 100000))
+EXPORT_TIMEOUT_SECONDS = float(os.getenv('EXPORT_TIMEOUT_SECONDS', 30))
+
+
+
+# Generated from the database and refreshed when a migration changes the schema
+schema_cache = SchemaCache(read_connection)
+schema_cache.get()
+
 
-def get_sql_from_question(question, conversation_history=None):
-    """Convert natural language to SQL using Claude with conversation context"""
-    context = ""
-    if conversation_history:
-        context = "\n\nRecent conversation for context:\n"
-        for msg in conversation_history[-3:]:
-            if msg.get('question'):
-                context += f"User asked: {msg['question']}\n"
-            if msg.get('answer'):
-                context += f"Assistant answered: {msg['answer'][:300]}...\n"
+def current_schema():
+    """The schema the model is shown; generated SQL may only read its tables"""
+    return schema_cache.get()
 
-    prompt = f"""You are a SQL expert for a tennis club database. Generate ONLY the SQL query needed to answer the question. No explanation, no markdown, just the query.
 
-{SCHEMA}
-{context}
+intent_router = IntentRouter(read_connection, current_schema, data_version)
+answer_renderer = AnswerRenderer()
 
-Current question: {question}
+
+def sql_cache_key(question, conversation=None):
+    """Cache key for a translation: normalized question, schema and conversation text"""
+    # [] keeps the keys of questions asked without context as they were before sessions
+    return make_key(normalize_question(question), current_schema().hash, conversation or [])
+
+
+def build_sql_system():
+    """System blocks for SQL generation: instructions and the cacheable schema"""
+    return current_schema().system_blocks()
+
+
+def build_sql_prompt(question, conversation=None, failed=None):
+    """User message asking the model to translate a question into SQL, or to fix the failed (sql, error);
+    conversation is the context text from open_conversation"""
+    context = f"{conversation}\n\n" if conversation else ""
+    if failed:
+        context += f"This query was written for the question below but failed with \"{failed[1]}\":\n{failed[0]}\n" \
+                   "Write a corrected query.\n\n"
+
+    return f"""{context}Current question: {question}
 
 Return ONLY the SQL query."""
 
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=1000,
-        messages=[{"role": "user", "content": prompt}]
-    )
 
-    sql_query = message.content[0].text.strip()
+def clean_sql(text):
+    """Strip whitespace and any markdown fence around the model's SQL"""
+    sql_query = text.strip()
 
     if sql_query.startswith("```"):
         sql_query = sql_query.split("\n", 1)[1]
@@ -102,37 +151,65 @@ Return ONLY the SQL query."""
 
     return sql_query.strip()
 
-def execute_query(sql_query):
-    """Execute SQL against database"""
+
+def get_sql_from_question(question, conversation=None, failed=None):
+    """Convert natural language to SQL using Claude with conversation context; failed=(sql, error) asks for a fix"""
+    prompt = build_sql_prompt(question, conversation, failed)
+    route = sql_route(repair=failed is not None)
+
+    with timed_llm_call(route.stage, route.model):
+        message = llm.create(
+            route.stage,
+            system=build_sql_system(),
+            messages=[{"role": "user", "content": prompt}],
+            **route.params()
+        )
+    record_llm_response(route.stage, route.model, message)
+
+    return clean_sql(message.content[0].text)
+
+def execute_query(sql_query, conn=None):
+    """Execute generated SQL against the database under the query guard, on conn or a pooled connection"""
     try:
-        conn = sqlite3.connect('courtiq.db')
-        cursor = conn.cursor()
-        cursor.execute(sql_query)
-        results = cursor.fetchall()
-        column_names = [desc[0] for desc in cursor.description]
-        conn.close()
-        return results, column_names, None
+        with timed_stage("execute_query"), ExitStack() as stack:
+            if conn is None:
+                conn = stack.enter_context(read_connection())
+            results, column_names, truncated = run_guarded_query(conn, sql_query, current_schema().tables)
+        record_rows("execute_query", len(results))
+        annotate("truncated", truncated)
+        return results, column_names, None, truncated
+    except QueryRejected as e:
+        annotate("query_rejected", str(e))
+        return None, None, str(e), False
     except Exception as e:
-        return None, None, str(e)
+        return None, None, str(e), False
 
-def format_results(results, column_names):
-    """Format query results as text"""
-    if not results:
-        return "No results found."
+def execute_query_cached(sql_query, conn=None):
+    """execute_query backed by the result cache for the current data version, or the version conn sees"""
+    # On a snapshot connection the version has to come from the same snapshot as the rows
+    cache_key = make_key(sql_query, data_version(conn))
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached['rows'], cached['columns'], None, cached.get('truncated', False)
 
-    output = "\n" + " | ".join(column_names) + "\n"
-    output += "-" * (len(output) - 2) + "\n"
+    results, column_names, error, truncated = execute_query(sql_query, conn)
+    if error is None and len(results) <= RESULT_CACHE_MAX_ROWS:
+        result_cache.set(cache_key, {"rows": results, "columns": column_names, "truncated": truncated})
+    return results, column_names, error, truncated
 
-    for row in results:
-        output += " | ".join(str(val) if val is not None else "NULL" for val in row) + "\n"
 
-    return output
+def format_results(results, column_names):
+    """Format query results as text for the answer prompt, summarised if over the token budget"""
+    return summarize_for_prompt(results, column_names)
 
-def get_natural_language_answer(question, sql_query, results, column_names):
-    """Generate natural language answer from results"""
+
+def build_answer_prompt(question, sql_query, results, column_names, truncated=False):
+    """Prompt asking the model to narrate query results"""
     results_text = format_results(results, column_names)
+    if truncated:
+        results_text += f"(Only the first {len(results)} rows are shown; the query returned more.)\n"
 
-    prompt = f"""Based on the SQL results, provide a clear answer to the user's question.
+    return f"""Based on the SQL results, provide a clear answer to the user's question.
 
 IMPORTANT: 
 - Respond in the SAME LANGUAGE the user asked their question in
@@ -148,18 +225,503 @@ Results:
 
 Provide a conversational, natural answer. If presenting multiple items, format as a simple list with dashes."""
 
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=1000,
-        messages=[{"role": "user", "content": prompt}]
-    )
+
+def get_natural_language_answer(question, sql_query, results, column_names, truncated=False):
+    """Generate natural language answer from results"""
+    prompt = build_answer_prompt(question, sql_query, results, column_names, truncated)
+    route = answer_route(len(results), truncated)
+
+    with timed_llm_call(route.stage, route.model):
+        message = llm.create(
+            route.stage,
+            messages=[{"role": "user", "content": prompt}],
+            **route.params()
+        )
+    record_llm_response(route.stage, route.model, message)
 
     return message.content[0].text.strip()
 
+
+def stream_natural_language_answer(question, sql_query, results, column_names, truncated=False):
+    """Yield the natural language answer as the model produces it"""
+    prompt = build_answer_prompt(question, sql_query, results, column_names, truncated)
+    route = answer_route(len(results), truncated)
+
+    with timed_llm_call(route.stage, route.model), llm.stream(
+        route.stage,
+        messages=[{"role": "user", "content": prompt}],
+        **route.params()
+    ) as stream:
+        for text in stream.text_stream:
+            yield text
+        record_llm_response(route.stage, route.model, stream.get_final_message())
+
+
+def answer_cache_key(question, sql_query, results, column_names):
+    """Cache key for an answer: normalized question, SQL and result digest"""
+    return make_key(normalize_question(question), sql_query, digest_results(results, column_names))
+
+
+def render_answer(question, results, column_names, truncated=False):
+    """Answer phrased locally for a simple result, or None when the model should write it"""
+    answer, outcome = answer_renderer.render(question, results, column_names, truncated)
+    rendered_answers.inc(result="deferred" if answer is None else "rendered", reason=outcome)
+    if answer is not None:
+        annotate("answer_rendered", outcome)
+    return answer
+
+
+def fallback_answer(results, truncated=False):
+    """Answer sent with the results when the model can't be reached to summarise them"""
+    annotate("llm_fallback", "answer_generation")
+    count = f"at least {len(results)}" if truncated else str(len(results))
+    rows = "row" if len(results) == 1 and not truncated else "rows"
+    return (f"I can't reach the language model right now to summarise this, but the query returned {count} "
+            f"{rows}, shown below.")
+
+
+def route_question(question, conversation=None):
+    """Intent template match for a common question, or None when the model should translate it"""
+    if not INTENT_ROUTER_ENABLED:
+        return None
+    match = intent_router.route(question, conversation)
+    intent = match.intent.name if match else None
+    intent_routes.inc(intent=intent or "none", result="hit" if match else "miss")
+    annotate("intent", intent)
+    return match
+
+
+def record_translation(cache_key, sql_query, sql_cached, error):
+    """Keep translations that executed cleanly and forget cached ones that stopped working"""
+    if error and sql_cached:
+        sql_cache.delete(cache_key)
+    elif not error and not sql_cached:
+        sql_cache.set(cache_key, sql_query)
+
+
+class Step:
+    """One piece of pipeline work, left to the driver running the pipeline.
+
+    kind is "db" (a blocking call: args are the function and its arguments), "query" (run generated SQL),
+    "prepare" (prepare_query_shared), "sql" (the model writes or repairs SQL), "answer" (the model answers
+    from results) or "results" (results are ready to show; nothing to run). stage names the timing it counts
+    towards."""
+
+    __slots__ = ("kind", "stage", "args")
+
+    def __init__(self, kind, stage, *args):
+        self.kind, self.stage, self.args = kind, stage, args
+
+
+def repair_steps(question, conversation, cache_key, sql_query, error):
+    """Steps giving (SQL, results, column names, error, truncated) after the larger model rewrites SQL that
+    failed to run"""
+    try:
+        repaired = yield Step("sql", "repair", question, conversation, (sql_query, error))
+    except LLMUnavailable:
+        return sql_query, None, None, error, False
+    results, column_names, repair_error, truncated = yield Step("query", "repair", repaired)
+    yield Step("db", "repair", record_translation, cache_key, repaired, False, repair_error)
+    sql_repairs.inc(result="failed" if repair_error else "fixed")
+    annotate("sql_repaired", not repair_error)
+    return repaired, results, column_names, repair_error, truncated
+
+
+def prepare_steps(question, conversation):
+    """Steps giving (intent match, SQL, results, column names, error, truncated, source) for a question"""
+    match = yield Step("db", "sql", route_question, question, conversation)
+    if match is not None:
+        results, column_names, error, truncated = yield Step("query", "query", match.sql)
+        return match, match.sql, results, column_names, error, truncated, "intent"
+
+    cache_key = sql_cache_key(question, conversation)
+    sql_query = yield Step("db", "sql", sql_cache.get, cache_key)
+    sql_cached = sql_query is not None
+    annotate("sql_cached", sql_cached)
+    if not sql_cached:
+        sql_query = yield Step("sql", "sql", question, conversation)
+    results, column_names, error, truncated = yield Step("query", "query", sql_query)
+    yield Step("db", "query", record_translation, cache_key, sql_query, sql_cached, error)
+    source = "cache" if sql_cached else "model"
+    if error and SQL_REPAIR:
+        sql_query, results, column_names, error, truncated = yield from repair_steps(
+            question, conversation, cache_key, sql_query, error)
+        if not error:
+            source = "repaired"
+    return None, sql_query, results, column_names, error, truncated, source
+
+
+def answer_steps(question, match, sql_query, results, column_names, truncated=False):
+    """Steps giving the answer for query results: the intent's template, a locally phrased answer, the answer
+    given earlier for the same question, SQL and rows, or a new one from the model"""
+    answer = match.answer(results) if match is not None else None
+    if answer is None:
+        answer = render_answer(question, results, column_names, truncated)
+    if answer is not None:
+        return answer
+    cache_key = answer_cache_key(question, sql_query, results, column_names)
+    answer = yield Step("db", "answer", answer_cache.get, cache_key)
+    if answer is None:
+        answer = yield Step("answer", "answer", question, sql_query, results, column_names, truncated)
+        yield Step("db", "answer", answer_cache.set, cache_key, answer)
+    return answer
+
+
+def unanswered(answer, source):
+    """Pipeline outcome for a question no query could answer"""
+    return {"sql": None, "answer": answer, "rows": None, "columns": None, "truncated": False, "source": source}
+
+
+def ask_steps(question, conversation, share_query=True):
+    """The question pipeline as steps: a prewarmed answer, or route, translate and run the SQL, then answer.
+
+    Every way of asking runs it: /ask, /ask/stream and /ask/batch through a StepRunner, the async /ask
+    through asgi.run_steps. share_query has identical questions asked meanwhile share the translation and
+    query (query_flight); /ask/batch turns it off to run its queries in one snapshot. Returns the sql (None
+    when no query could answer), answer, rows, columns, truncated and source."""
+    prewarmed = yield Step("db", "sql", lookup_prewarmed, question)
+    if prewarmed is not None:
+        yield Step("results", "query", prewarmed["sql"], prewarmed["rows"], prewarmed["columns"],
+                   prewarmed["truncated"])
+        return {"sql": prewarmed["sql"], "answer": prewarmed["answer"], "rows": prewarmed["rows"],
+                "columns": prewarmed["columns"], "truncated": prewarmed["truncated"], "source": "prewarmed"}
+
+    try:
+        if share_query:
+            prepared = yield Step("prepare", "sql", question, conversation)
+        else:
+            prepared = yield from prepare_steps(question, conversation)
+    except LLMUnavailable:
+        annotate("llm_fallback", "sql_generation")
+        return unanswered(UPSTREAM_UNAVAILABLE_ANSWER, "fallback")
+    match, sql_query, results, column_names, error, truncated, source = prepared
+    if error:
+        return unanswered(UNKNOWN_QUESTION_ANSWER, source)
+
+    yield Step("results", "query", sql_query, results, column_names, truncated)
+    try:
+        answer = yield from answer_steps(question, match, sql_query, results, column_names, truncated)
+    except LLMUnavailable:
+        answer = fallback_answer(results, truncated)
+    return {"sql": sql_query, "answer": answer, "rows": results, "columns": column_names, "truncated": truncated,
+            "source": source}
+
+
+def perform_step(step, conn=None):
+    """Value of a pipeline step run in this thread; a query step runs on conn when one is given"""
+    if step.kind == "db":
+        func, *args = step.args
+        return func(*args)
+    if step.kind == "query":
+        return execute_query_cached(*step.args, conn)
+    if step.kind == "prepare":
+        return prepare_query_shared(*step.args)
+    if step.kind == "sql":
+        return get_sql_from_question(*step.args)
+    if step.kind == "answer":
+        return get_natural_language_answer(*step.args)
+    return None
+
+
+class StepRunner:
+    """Runs a pipeline's steps in this thread, timing each stage.
+
+    run() can stop at steps of given kinds and leave them to the caller, which passes back their value with
+    resume() (or runs them with perform()): /ask/stream streams the answer step, /ask/batch runs the query
+    steps of the whole batch in one snapshot."""
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.timings = {}
+        self.pending = None
+        self.finished = False
+        self.outcome = None
+        self._value, self._error = None, None
+
+    def resume(self, value=None, error=None):
+        """Hand the pending step's value, or the exception it raised, back to the pipeline"""
+        self.pending = None
+        self._value, self._error = value, error
+
+    def perform(self, step, conn=None):
+        """Run step with perform_step and hand back its value"""
+        started = time.perf_counter()
+        try:
+            self.resume(perform_step(step, conn))
+        except Exception as e:
+            self.resume(error=e)
+        self.timings[step.stage] = round(self.timings.get(step.stage, 0) + _elapsed_ms(started), 3)
+
+    def run(self, pause_on=()):
+        """True once the pipeline has returned its outcome, False when it stopped at a step of a kind in pause_on
+        (left in pending)"""
+        while True:
+            try:
+                if self._error is not None:
+                    step = self.steps.throw(self._error)
+                else:
+                    step = self.steps.send(self._value)
+            except StopIteration as stop:
+                self.finished, self.outcome = True, stop.value
+                return True
+            if step.kind in pause_on:
+                self.pending = step
+                return False
+            self.perform(step)
+
+
+def run_steps(steps):
+    """Outcome of a pipeline run from start to finish in this thread"""
+    runner = StepRunner(steps)
+    runner.run()
+    return runner.outcome
+
+
+# Identical questions asked at the same time share one pipeline run in this worker
+ask_flight = SingleFlight("ask")
+query_flight = SingleFlight("query")
+# Every single-flight group in the process, for /health and /metrics
+flights = [ask_flight, query_flight]
+
+
+def prepare_query(question, conversation):
+    """(intent match, SQL, results, column names, error, truncated, source) for a question"""
+    return run_steps(prepare_steps(question, conversation))
+
+
+def prepare_query_shared(question, conversation):
+    """prepare_query, shared with identical questions already being translated"""
+    prepared, shared = query_flight.do(sql_cache_key(question, conversation), prepare_query,
+                                       question, conversation)
+    if shared:
+        annotate("query_coalesced", True)
+    return prepared
+
+
+def answer_pipeline(question, conversation):
+    """SQL, results and answer for a question; sql is None when no query could answer it"""
+    return run_steps(ask_steps(question, conversation))
+
+
+def compute_prewarmed(question, previous):
+    """Answer entry for a suggested question, reusing the previous answer while its SQL and results still hold"""
+    match, sql_query, results, column_names, error, truncated, _ = prepare_query(question, None)
+    if error:
+        return None
+    digest = digest_results(results, column_names)
+    if previous is not None and previous["sql"] == sql_query and previous["digest"] == digest:
+        answer = previous["answer"]
+        prewarm_answers.inc(result="reused")
+    else:
+        answer = run_steps(answer_steps(question, match, sql_query, results, column_names, truncated))
+        prewarm_answers.inc(result="regenerated")
+    return {"sql": sql_query, "answer": answer, "columns": column_names, "rows": results, "truncated": truncated,
+            "digest": digest}
+
+
+prewarmer = Prewarmer(load_prewarm_questions(), prewarm_store, compute_prewarmed, data_version)
+if PREWARM_ENABLED:
+    prewarmer.ensure_started()
+
+
+def lookup_prewarmed(question):
+    """Stored answer for a suggested question at the current data version, or None"""
+    if not PREWARM_ENABLED:
+        return None
+    entry = prewarmer.lookup(question)
+    if entry is not None:
+        prewarm_answers.inc(result="served")
+        annotate("prewarmed", True)
+    return entry
+
+
+def get_client_ip():
+    """Caller address, honouring the proxy's X-Forwarded-For"""
+    return request.headers.get('X-Forwarded-For', request.remote_addr).split(',')[0]
+
+
+def get_caller_tier():
+    """Quota tier of the caller, from its X-API-Key"""
+    return tier_for_api_key(request.headers.get('X-API-Key'))
+
+
+def get_session_id(data):
+    """Session id the client sent in the body or the X-Session-Id header"""
+    return data.get('session_id') or request.headers.get(SESSION_HEADER)
+
+
+def open_conversation(session_id, history=None):
+    """(session id, session state, conversation text) for a question.
+
+    A history posted without a session id is used as before and nothing is stored. Otherwise an unknown or
+    expired session starts empty, and a missing or malformed id gets a new one."""
+    if history and not session_id:
+        return None, None, history_context(history)
+    state = None
+    if valid_session_id(session_id):
+        state = session_store.get(session_id)
+    else:
+        session_id = new_session_id()
+    if state is None:
+        state = new_state()
+    conversation = render_context(state) or history_context(history)
+    annotate("session_context_tokens", len(conversation) // CHARS_PER_TOKEN)
+    return session_id, state, conversation
+
+
+def save_turn(session_id, state, question, answer, sql_query, results, column_names):
+    """Fold an answered question into its session; questions no query answered are left out"""
+    if session_id is None or sql_query is None:
+        return
+    session_store.set(session_id, record_turn(state, question, answer, sql_query, results, column_names))
+
+
+def check_rate_limit(client_ip, tier=None, route='ask'):
+    """Spend one of client_ip's requests for the route group; None when allowed, else the answer naming the
+    quota it exceeded"""
+    tier = tier or rate_limiter.default_tier
+    allowed, _ = rate_limiter.hit(route, client_ip, tier)
+    rate_limit_decisions.inc(route=route, tier=tier, result="allowed" if allowed else "limited")
+    if allowed:
+        return None
+    return RATE_LIMIT_ANSWER.format(tier=tier, quota=rate_limiter.quota(route, tier).describe("questions"))
+
+
+def is_casual(question):
+    """Greetings and thanks that don't need a query"""
+    question_words = question.lower().split()
+    return any(keyword in question_words for keyword in CASUAL_KEYWORDS)
+
+
+def sse_event(event, data):
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def json_response(payload, status=200, headers=None, mimetype='application/json'):
+    """JSON response encoded with encoding.dumps and compressed when the client accepts it"""
+    with timed_stage("serialize"):
+        body, coding = compress(dumps(payload), request.accept_encodings)
+    response = Response(body, status=status, mimetype=mimetype, headers=headers)
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    if coding:
+        response.headers['Content-Encoding'] = coding
+    return response
+
+
+def rows_token(sql_query):
+    """Token for /ask/rows to stream every row of a query the pipeline generated"""
+    token = make_key("rows", sql_query)
+    rows_tokens.set(token, sql_query)
+    return token
+
+
+def results_payload(results, column_names, truncated, columnar=False, sql_query=None):
+    """Query results for an /ask response, as rows or as columns; truncated results carry a rows_token"""
+    payload = columns_from_rows(column_names, results) if columnar else {"columns": column_names, "rows": results}
+    payload["truncated"] = truncated
+    if truncated and sql_query:
+        payload["rows_token"] = rows_token(sql_query)
+    return payload
+
+
+def ask_response(question, sql_query, answer, results, column_names, truncated, session_id=None):
+    """The /ask response, with the results as rows or columns as the client asked"""
+    columnar = wants_columnar(request.args, request.accept_mimetypes)
+    return json_response({
+        "question": question,
+        "sql": sql_query,
+        "answer": answer,
+        "results": results_payload(results, column_names, truncated, columnar, sql_query),
+        "session_id": session_id
+    }, mimetype=COLUMNAR_MIMETYPE if columnar else 'application/json')
+
+
+def listing_response(body, headers=None):
+    """Admin response body, as columns when the client asked for the columnar format"""
+    if isinstance(body, list) and wants_columnar(request.args, request.accept_mimetypes):
+        return json_response(columns_from_records(body), headers=headers, mimetype=COLUMNAR_MIMETYPE)
+    return json_response(body, headers=headers)
+
+
+def cached_admin_view(view):
+    """Serve an admin GET from cache until the next write changes the data version.
+
+    The view returns its body (or body and headers) unencoded; listing_response encodes it once, in the format
+    the client asked for. Responses the view built itself, such as errors, are passed through."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Today's date is part of the key because several views are relative to 'now'.
+        # The body is cached before encoding, so the response format is left out.
+        query_args = sorted((name, value) for name, value in request.args.items(multi=True) if name != 'format')
+        cache_key = make_key("page", request.path, query_args, data_version(), date.today().isoformat())
+        cached = admin_cache.get(cache_key)
+        annotate("admin_cached", cached is not None)
+        if cached is not None:
+            return listing_response(cached['body'], cached['headers'])
+
+        with timed_stage(f"admin_{view.__name__}"):
+            result = view(*args, **kwargs)
+        body, headers = result if isinstance(result, tuple) else (result, {})
+        if isinstance(body, Response):
+            return result
+        admin_cache.set(cache_key, {"body": body, "headers": headers})
+        return listing_response(body, headers)
+    return wrapper
+
+@app.before_request
+def begin_request_trace():
+    start_trace(request.method, request.path, request.headers.get('X-Request-ID'))
+
+
+@app.before_request
+def start_prewarming():
+    # The refresh thread doesn't survive a fork, so each worker starts its own
+    if PREWARM_ENABLED:
+        prewarmer.ensure_started()
+
+
+@app.after_request
+def finish_request_trace(response):
+    end_trace(request.url_rule.rule if request.url_rule else 'unmatched', response.status_code)
+    return response
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
-    return jsonify({"status": "healthy"})
+    return jsonify({
+        "status": "healthy",
+        "db_pool": pool_stats(),
+        "rate_limit": rate_limiter.stats(),
+        "intent_router": intent_router.stats(),
+        "answer_renderer": answer_renderer.stats(),
+        "prewarm": prewarmer.stats(),
+        "singleflight": {flight.name: flight.stats() for flight in flights},
+        "llm": {"models": describe_model_tiers(), "circuit": upstream_breaker.stats(), "clients": {llm_client.name: llm_client.stats()
+                                                                 for llm_client in llm_clients}},
+        "schema": {"hash": current_schema().hash, "tables": current_schema().tables,
+                   "refreshes": schema_cache.refreshes},
+        "caches": {
+            "sql": sql_cache.stats(),
+            "answer": answer_cache.stats(),
+            "result": result_cache.stats(),
+            "admin": admin_cache.stats(),
+            "prewarm": prewarm_store.stats(),
+            "session": session_store.stats()
+        }
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics for this worker"""
+    update_cache_gauges({"sql": sql_cache, "answer": answer_cache, "result": result_cache, "admin": admin_cache,
+                         "prewarm": prewarm_store, "session": session_store})
+    update_pool_gauges(pool_stats())
+    update_flight_metrics(flights)
+    update_llm_metrics(llm_clients, upstream_breaker)
+    return Response(render_metrics(), mimetype=METRICS_CONTENT_TYPE)
 
 
 @app.route('/test-key', methods=['GET'])
@@ -178,10 +740,11 @@ def test_key():
 def test_api():
     """Test if Anthropic API works"""
     try:
-        message = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=100,
-            messages=[{"role": "user", "content": "Say hello"}]
+        route = test_route()
+        message = llm.create(
+            route.stage,
+            messages=[{"role": "user", "content": "Say hello"}],
+            **route.params()
         )
         return jsonify({"status": "API works", "response": message.content[0].text})
     except Exception as e:
@@ -195,61 +758,43 @@ def ask_question():
     try:
         data = request.json
         question = data.get('question', '').strip()
-        conversation_history = data.get('history', [])
-
-        client_ip = request.headers.get('X-Forwarded-For', request.remote_addr).split(',')[0]
-        now = datetime.now()
 
-        request_tracker[client_ip] = [
-            req_time for req_time in request_tracker[client_ip]
-            if now - req_time < timedelta(hours=1)
-        ]
-
-        if len(request_tracker[client_ip]) >= MAX_REQUESTS_PER_IP:
+        rate_limit_answer = check_rate_limit(get_client_ip(), get_caller_tier())
+        if rate_limit_answer:
             return jsonify({
                 "question": question,
                 "sql": None,
-                "answer": "You've reached the demo limit of 5 questions per hour. If you'd like to see more or discuss this project, feel free to connect with me on LinkedIn!",
+                "answer": rate_limit_answer,
                 "results": None
             })
 
-        request_tracker[client_ip].append(now)
-
         if not question:
             return jsonify({"error": "No question provided"}), 400
 
-        casual_keywords = ['hello', 'hi', 'hey', 'thanks', 'thank you', 'bye', 'goodbye']
-        question_words = question.lower().split()
-        if any(keyword in question_words for keyword in casual_keywords):
+        if is_casual(question):
             return jsonify({
                 "question": question,
                 "sql": None,
-                "answer": "Hi! I'm here to help you analyze your tennis club data. Try asking questions like: 'Which members have the highest cancellation rate?'",
+                "answer": GREETING_ANSWER,
                 "results": None
             })
 
-        sql_query = get_sql_from_question(question, conversation_history)
-        results, column_names, error = execute_query(sql_query)
-
-        if error:
+        session_id, state, conversation = open_conversation(get_session_id(data), data.get('history'))
+        outcome, shared = ask_flight.do(sql_cache_key(question, conversation), answer_pipeline,
+                                        question, conversation)
+        annotate("coalesced", shared)
+        save_turn(session_id, state, question, outcome["answer"], outcome["sql"], outcome["rows"], outcome["columns"])
+        if outcome["sql"] is None:
             return jsonify({
                 "question": question,
                 "sql": None,
-                "answer": "I couldn't understand that question. Please ask about members, bookings, coaches, courts, or revenue.",
-                "results": None
+                "answer": outcome["answer"],
+                "results": None,
+                "session_id": session_id
             })
 
-        answer = get_natural_language_answer(question, sql_query, results, column_names)
-
-        return jsonify({
-            "question": question,
-            "sql": sql_query,
-            "answer": answer,
-            "results": {
-                "columns": column_names,
-                "rows": results
-            }
-        })
+        return ask_response(question, outcome["sql"], outcome["answer"], outcome["rows"], outcome["columns"],
+                            outcome["truncated"], session_id)
 
 
     except Exception as e:
@@ -270,78 +815,249 @@ def ask_question():
 
         return jsonify({"error": str(e), "details": error_details}), 500
 
+@app.route('/ask/stream', methods=['POST'])
+def ask_question_stream():
+    """Streaming variant of /ask: SQL, then results, then answer tokens as server-sent events"""
+    data = request.json or {}
+    question = data.get('question', '').strip()
+
+    rate_limit_answer = check_rate_limit(get_client_ip(), get_caller_tier())
+    if not rate_limit_answer and not question:
+        return jsonify({"error": "No question provided"}), 400
+    session_id, state, conversation = None, None, ""
+    if not rate_limit_answer:
+        session_id, state, conversation = open_conversation(get_session_id(data), data.get('history'))
+
+    def generate():
+        if rate_limit_answer or is_casual(question):
+            answer = rate_limit_answer or GREETING_ANSWER
+            yield sse_event("token", {"text": answer})
+            yield sse_event("done", {"question": question, "sql": None, "answer": answer})
+            return
+
+        try:
+            runner = StepRunner(ask_steps(question, conversation))
+            streamed = False
+            while not runner.run(pause_on=("results", "answer")):
+                step = runner.pending
+                if step.kind == "results":
+                    sql_query, results, column_names, truncated = step.args
+                    yield sse_event("sql", {"sql": sql_query})
+                    yield sse_event("results", results_payload(results, column_names, truncated,
+                                                               sql_query=sql_query))
+                    runner.resume()
+                    continue
+                parts = []
+                try:
+                    for text in stream_natural_language_answer(*step.args):
+                        parts.append(text)
+                        yield sse_event("token", {"text": text})
+                except LLMUnavailable as e:
+                    # Raised only before the first token; the pipeline falls back
+                    runner.resume(error=e)
+                    continue
+                streamed = True
+                runner.resume("".join(parts).strip())
+
+            outcome = runner.outcome
+            if not streamed:
+                yield sse_event("token", {"text": outcome["answer"]})
+            save_turn(session_id, state, question, outcome["answer"], outcome["sql"], outcome["rows"],
+                      outcome["columns"])
+            yield sse_event("done", {"question": question, "sql": outcome["sql"], "answer": outcome["answer"]})
+        except Exception as e:
+            print(f"ERROR IN /ask/stream: {type(e).__name__}: {e}")
+            yield sse_event("error", {"error": str(e)})
+
+    headers = {
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    }
+    if session_id is not None:
+        headers[SESSION_HEADER] = session_id
+    return Response(generate(), mimetype='text/event-stream', headers=headers)
+
+def in_parallel(func, items):
+    """func applied to every item on the batch executor, each in a copy of the request's context"""
+    futures = [batch_executor.submit(contextvars.copy_context().run, func, item) for item in items]
+    for future in futures:
+        future.result()
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+def batch_run(item, pause_on=()):
+    """Run one batch question's pipeline until it finishes or reaches a step of a kind in pause_on"""
+    try:
+        item["runner"].run(pause_on)
+    except Exception as e:
+        item["error"] = str(e)
+
+
+@app.route('/ask/batch', methods=['POST'])
+def ask_batch():
+    """Several questions at once: SQL and answers are generated concurrently, queries share one snapshot"""
+    started = time.perf_counter()
+    data = request.json or {}
+    questions = data.get('questions')
+    if not isinstance(questions, list) or not questions:
+        return jsonify({"error": "questions must be a non-empty list"}), 400
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        return jsonify({"error": f"At most {BATCH_MAX_QUESTIONS} questions per batch"}), 400
+
+    # The session gives every question the same context; the batch itself is not added to it
+    _, _, conversation = open_conversation(get_session_id(data), data.get('history'))
+    client_ip, tier = get_client_ip(), get_caller_tier()
+    items = [{"question": str(question or '').strip(), "sql": None, "answer": None, "columns": None, "rows": None,
+              "timings_ms": {}} for question in questions]
+    pending = []
+    for item in items:
+        # Each question spends from the same quota as /ask
+        rate_limit_answer = check_rate_limit(client_ip, tier) if item["question"] else None
+        if not item["question"]:
+            item["error"] = "No question provided"
+        elif rate_limit_answer:
+            item["answer"] = rate_limit_answer
+        elif is_casual(item["question"]):
+            item["answer"] = GREETING_ANSWER
+        else:
+            item["runner"] = StepRunner(ask_steps(item["question"], conversation, share_query=False))
+            pending.append(item)
+
+    # Up to each question's query: prewarmed answers, routing and translation
+    in_parallel(partial(batch_run, pause_on=("query",)), pending)
+
+    with read_connection() as conn:
+        # One read transaction, so every answer in the batch sees the same data
+        conn.execute("BEGIN")
+        try:
+            for item in pending:
+                if "error" not in item and item["runner"].pending is not None:
+                    item["runner"].perform(item["runner"].pending, conn)
+        finally:
+            conn.rollback()
+
+    # After the snapshot, so model calls don't hold the read transaction open; a repaired query reads current data
+    in_parallel(batch_run, [item for item in pending if "error" not in item and not item["runner"].finished])
+    for item in pending:
+        runner = item.pop("runner")
+        item["timings_ms"] = runner.timings
+        if "error" not in item:
+            item.update(runner.outcome)
+
+    columnar = wants_columnar(request.args, request.accept_mimetypes)
+    answers = []
+    for item in items:
+        answer = {"question": item["question"], "sql": item["sql"], "answer": item["answer"], "results": None,
+                  "source": item.get("source"), "timings_ms": item["timings_ms"]}
+        if item["rows"] is not None:
+            answer["results"] = results_payload(item["rows"], item["columns"], item["truncated"], columnar,
+                                                item["sql"])
+        if "error" in item:
+            answer["error"] = item["error"]
+        item["timings_ms"]["total"] = round(sum(item["timings_ms"].values()), 3)
+        answers.append(answer)
+    annotate("batch_questions", len(items))
+    return json_response({"answers": answers, "timings_ms": {"total": _elapsed_ms(started)}},
+                         mimetype=COLUMNAR_MIMETYPE if columnar else 'application/json')
+
+
+@app.route('/ask/rows', methods=['POST'])
+def stream_query_rows():
+    """Stream every row of a truncated /ask result as NDJSON, row by row or as column batches.
+
+    Only SQL the pipeline generated can be streamed: the client sends the rows_token from the results."""
+    data = request.json or {}
+    row_format = data.get('format', 'ndjson')
+    if row_format not in ROW_STREAMS:
+        return jsonify({"error": f"format must be one of {', '.join(ROW_STREAMS)}"}), 400
+    if check_rate_limit(get_client_ip(), get_caller_tier(), route='rows'):
+        return jsonify({"error": "Rate limit exceeded"}), 429
+    token = data.get('rows_token')
+    sql_query = rows_tokens.get(token) if isinstance(token, str) else None
+    if sql_query is None:
+        return jsonify({"error": "Unknown or expired rows_token; ask the question again"}), 404
+
+    # Guard failures are reported before the stream starts. The stream gets its own connection, held until it
+    # ends, so slow exports can't use up the read pool.
+    stack = ExitStack()
+    try:
+        conn = stack.enter_context(dedicated_read_connection())
+        cursor = stack.enter_context(guarded_cursor(conn, sql_query, current_schema().tables, EXPORT_TIMEOUT_SECONDS))
+        column_names = [desc[0] for desc in cursor.description]
+    except Exception as e:
+        stack.close()
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        try:
+            yield from ROW_STREAMS[row_format](cursor, column_names, EXPORT_MAX_ROWS)
+        except sqlite3.DatabaseError as e:
+            yield json.dumps({"error": str(translate_error(e, EXPORT_TIMEOUT_SECONDS))}) + "\n"
+
+    response = Response(generate(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+    response.call_on_close(stack.close)
+    return response
+
 # Admin endpoints continue here...
 # (I'll give you the rest in the next message to keep it manageable)
 
 # ADMIN ENDPOINTS
 @app.route('/admin/stats', methods=['GET'])
+@cached_admin_view
 def get_stats():
     """Get dashboard statistics"""
     try:
-        conn = sqlite3.connect('courtiq.db')
-        cursor = conn.cursor()
+        with read_connection() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute('SELECT COUNT(*) FROM members WHERE status="active"')
-        total_members = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM members WHERE status="active"')
+            total_members = cursor.fetchone()[0]
 
-        cursor.execute('SELECT SUM(price) FROM bookings WHERE status="completed"')
-        total_revenue = cursor.fetchone()[0] or 0
+            stats = dashboard_stats(conn)
 
-        cursor.execute("SELECT COUNT(*) FROM bookings WHERE strftime('%Y-%m', booking_date) = strftime('%Y-%m', 'now')")
-        bookings_this_month = cursor.fetchone()[0]
-
-        cursor.execute(
-            "SELECT SUM(price) FROM bookings WHERE status='completed' AND strftime('%Y-%m', booking_date) = strftime('%Y-%m', 'now')")
-        revenue_this_month = cursor.fetchone()[0] or 0
-
-        conn.close()
-
-        return jsonify({
+        return {
             "total_members": total_members,
-            "total_revenue": round(total_revenue, 2),
-            "bookings_this_month": bookings_this_month,
-            "revenue_this_month": round(revenue_this_month, 2)
-        })
+            "total_revenue": round(stats['total_revenue'], 2),
+            "bookings_this_month": stats['bookings_this_month'],
+            "revenue_this_month": round(stats['revenue_this_month'], 2)
+        }
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/admin/revenue-chart', methods=['GET'])
+@cached_admin_view
 def get_revenue_chart():
     """Get revenue data for chart"""
     try:
         days = request.args.get('days', 30, type=int)
-        conn = sqlite3.connect('courtiq.db')
-        cursor = conn.cursor()
-
-        cursor.execute("""
-                       SELECT DATE (booking_date) as date, SUM (CASE WHEN status='completed' THEN price ELSE 0 END) as revenue
-                       FROM bookings
-                       WHERE booking_date >= DATE ('now', '-' || ? || ' days')
-                       GROUP BY DATE (booking_date)
-                       ORDER BY date
-                       """, (days,))
-
-        results = cursor.fetchall()
-        conn.close()
+        with read_connection() as conn:
+            results = revenue_by_day(conn, days)
 
         data = [{"date": row[0], "revenue": round(row[1], 2)} for row in results]
-        return jsonify(data)
+        return data
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/admin/members', methods=['GET'])
+@cached_admin_view
 def get_members():
-    """Get all members"""
+    """Get a page of members, newest first; see pagination.py for cursor and filter arguments"""
     try:
-        conn = sqlite3.connect('courtiq.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM members ORDER BY join_date DESC')
-        members = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return jsonify(members)
+        limit, cursor_token, include_total = parse_page_args(request.args)
+        conditions, params = parse_filters(request.args, MEMBER_FILTERS)
+        with read_connection() as conn:
+            members, next_cursor, total = fetch_page(
+                conn.cursor(), "*", "members", conditions, params,
+                keys=[("join_date", "join_date"), ("member_id", "member_id")],
+                limit=limit, cursor_token=cursor_token, include_total=include_total)
+        return members, page_headers(next_cursor, total)
+    except InvalidPageRequest as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -351,15 +1067,13 @@ def create_member():
     """Create a new member"""
     try:
         data = request.json
-        conn = sqlite3.connect('courtiq.db')
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO members (name, email, phone, membership_tier, join_date, status) VALUES (?, ?, ?, ?, ?, ?)",
-            (data['name'], data['email'], data.get('phone'), data['membership_tier'], data['join_date'],
-             data.get('status', 'active')))
-        conn.commit()
-        member_id = cursor.lastrowid
-        conn.close()
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO members (name, email, phone, membership_tier, join_date, status) VALUES (?, ?, ?, ?, ?, ?)",
+                (data['name'], data['email'], data.get('phone'), data['membership_tier'], data['join_date'],
+                 data.get('status', 'active')))
+            member_id = cursor.lastrowid
         return jsonify({"id": member_id, "message": "Member created successfully"}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -369,27 +1083,25 @@ def create_member():
 def delete_member(member_id):
     """Delete a member"""
     try:
-        conn = sqlite3.connect('courtiq.db')
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM members WHERE member_id=?', (member_id,))
-        conn.commit()
-        conn.close()
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM members WHERE member_id=?', (member_id,))
         return jsonify({"message": "Member deleted successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/admin/coaches', methods=['GET'])
+@cached_admin_view
 def get_coaches():
     """Get all coaches"""
     try:
-        conn = sqlite3.connect('courtiq.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM coaches')
-        coaches = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return jsonify(coaches)
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute('SELECT * FROM coaches')
+            coaches = [dict(row) for row in cursor.fetchall()]
+        return coaches
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -399,13 +1111,11 @@ def create_coach():
     """Create a new coach"""
     try:
         data = request.json
-        conn = sqlite3.connect('courtiq.db')
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO coaches (name, specialty, hourly_rate, weekly_available_hours) VALUES (?, ?, ?, ?)",
-                       (data['name'], data['specialty'], data['hourly_rate'], data.get('weekly_available_hours', 40)))
-        conn.commit()
-        coach_id = cursor.lastrowid
-        conn.close()
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO coaches (name, specialty, hourly_rate, weekly_available_hours) VALUES (?, ?, ?, ?)",
+                           (data['name'], data['specialty'], data['hourly_rate'], data.get('weekly_available_hours', 40)))
+            coach_id = cursor.lastrowid
         return jsonify({"id": coach_id, "message": "Coach created successfully"}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -415,27 +1125,25 @@ def create_coach():
 def delete_coach(coach_id):
     """Delete a coach"""
     try:
-        conn = sqlite3.connect('courtiq.db')
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM coaches WHERE coach_id=?', (coach_id,))
-        conn.commit()
-        conn.close()
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM coaches WHERE coach_id=?', (coach_id,))
         return jsonify({"message": "Coach deleted successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/admin/courts', methods=['GET'])
+@cached_admin_view
 def get_courts():
     """Get all courts"""
     try:
-        conn = sqlite3.connect('courtiq.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM courts')
-        courts = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return jsonify(courts)
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute('SELECT * FROM courts')
+            courts = [dict(row) for row in cursor.fetchall()]
+        return courts
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -445,13 +1153,11 @@ def create_court():
     """Create a new court"""
     try:
         data = request.json
-        conn = sqlite3.connect('courtiq.db')
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO courts (court_name, surface_type, indoor) VALUES (?, ?, ?)",
-                       (data['court_name'], data['surface_type'], data.get('indoor', 0)))
-        conn.commit()
-        court_id = cursor.lastrowid
-        conn.close()
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO courts (court_name, surface_type, indoor) VALUES (?, ?, ?)",
+                           (data['court_name'], data['surface_type'], data.get('indoor', 0)))
+            court_id = cursor.lastrowid
         return jsonify({"id": court_id, "message": "Court created successfully"}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -461,34 +1167,36 @@ def create_court():
 def delete_court(court_id):
     """Delete a court"""
     try:
-        conn = sqlite3.connect('courtiq.db')
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM courts WHERE court_id=?', (court_id,))
-        conn.commit()
-        conn.close()
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM courts WHERE court_id=?', (court_id,))
         return jsonify({"message": "Court deleted successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/admin/bookings', methods=['GET'])
+@cached_admin_view
 def get_bookings():
-    """Get all bookings with member and coach names"""
+    """Get a page of bookings with member and coach names, most recent first"""
     try:
-        conn = sqlite3.connect('courtiq.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("""
-                       SELECT b.*, m.name as member_name, c.name as coach_name, co.court_name
-                       FROM bookings b
-                                JOIN members m ON b.member_id = m.member_id
-                                LEFT JOIN coaches c ON b.coach_id = c.coach_id
-                                JOIN courts co ON b.court_id = co.court_id
-                       ORDER BY b.booking_date DESC, b.start_time DESC LIMIT 100
-                       """)
-        bookings = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return jsonify(bookings)
+        limit, cursor_token, include_total = parse_page_args(request.args)
+        conditions, params = parse_filters(request.args, BOOKING_FILTERS)
+        with read_connection() as conn:
+            bookings, next_cursor, total = fetch_page(
+                conn.cursor(),
+                "b.*, m.name as member_name, c.name as coach_name, co.court_name",
+                """bookings b
+                       JOIN members m ON b.member_id = m.member_id
+                       LEFT JOIN coaches c ON b.coach_id = c.coach_id
+                       JOIN courts co ON b.court_id = co.court_id""",
+                conditions, params,
+                keys=[("b.booking_date", "booking_date"), ("b.start_time", "start_time"),
+                      ("b.booking_id", "booking_id")],
+                limit=limit, cursor_token=cursor_token, include_total=include_total)
+        return bookings, page_headers(next_cursor, total)
+    except InvalidPageRequest as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -497,20 +1205,20 @@ def get_bookings():
 def create_booking():
     """Create a new booking"""
     try:
-        data = request.json
-        conn = sqlite3.connect('courtiq.db')
-        cursor = conn.cursor()
-        cursor.execute("""
-                       INSERT INTO bookings (member_id, coach_id, court_id, lesson_type, booking_date, start_time,
-                                             end_time, duration_minutes, price, status, cancellation_reason)
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                       """, (data['member_id'], data.get('coach_id'), data['court_id'], data['lesson_type'],
-                             data['booking_date'],
-                             data['start_time'], data['end_time'], data['duration_minutes'], data['price'],
-                             data.get('status', 'scheduled'), data.get('cancellation_reason')))
-        conn.commit()
-        booking_id = cursor.lastrowid
-        conn.close()
+        data = {**request.json, 'status': request.json.get('status', 'scheduled')}
+        data['booking_date'] = normalize_date(data['booking_date'])
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                           INSERT INTO bookings (member_id, coach_id, court_id, lesson_type, booking_date, start_time,
+                                                 end_time, duration_minutes, price, status, cancellation_reason)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                           """, (data['member_id'], data.get('coach_id'), data['court_id'], data['lesson_type'],
+                                 data['booking_date'],
+                                 data['start_time'], data['end_time'], data['duration_minutes'], data['price'],
+                                 data['status'], data.get('cancellation_reason')))
+            booking_id = cursor.lastrowid
+            apply_booking(conn, data)
         return jsonify({"id": booking_id, "message": "Booking created successfully"}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -520,17 +1228,47 @@ def create_booking():
 def delete_booking(booking_id):
     """Delete a booking"""
     try:
-        conn = sqlite3.connect('courtiq.db')
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM bookings WHERE booking_id=?', (booking_id,))
-        conn.commit()
-        conn.close()
+        with write_connection() as conn:
+            booking = fetch_booking(conn, booking_id)
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM bookings WHERE booking_id=?', (booking_id,))
+            if booking:
+                apply_booking(conn, booking, sign=-1)
         return jsonify({"message": "Booking deleted successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-import os
+@app.route('/admin/<entity>/bulk', methods=['POST'])
+def bulk_import(entity):
+    """Bulk insert members, coaches, courts or bookings from CSV, NDJSON or a JSON array"""
+    try:
+        if entity not in BULK_ENTITIES:
+            return jsonify({"error": f"Unknown entity {entity}"}), 404
+
+        content_type = request.mimetype
+        if content_type == 'application/json':
+            rows = request.json
+            if not isinstance(rows, list):
+                return jsonify({"error": "Expected a JSON array of rows"}), 400
+        elif content_type in ('application/x-ndjson', 'application/jsonl'):
+            rows = iter_ndjson(open_text(request.stream))
+        elif content_type == 'text/csv':
+            rows = iter_csv(open_text(request.stream))
+        else:
+            return jsonify({"error": "Send text/csv, application/x-ndjson or application/json"}), 415
+
+        atomic = request.args.get('atomic', '').lower() in ('1', 'true', 'yes')
+        with write_connection() as conn:
+            report = import_rows(conn, entity, rows, atomic=atomic)
+
+        result = report.as_dict()
+        status = 201 if result['inserted'] else 400 if result['failed'] else 200
+        return jsonify(result), status
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 
-port = int(os.environ.get('PORT', 10000))
-app.run(host='0.0.0.0', port=port)
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 10000))
+    app.run(host='0.0.0.0', port=port)
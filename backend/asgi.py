@@ -0,0 +1,234 @@
+"""
+CourtIQ ASGI Server
+Async serving mode: POST /ask runs on an event loop so one worker can
+multiplex many in-flight questions; every other route is the Flask app.
+
+Run with:  uvicorn asgi:app --workers 2
+     or:  gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+"""
+
+import asyncio
+import json
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from anthropic import AsyncAnthropic
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.datastructures import MultiDict, MIMEAccept
+from werkzeug.http import parse_accept_header
+
+from app import (app as flask_app, build_sql_system, build_sql_prompt, build_answer_prompt, clean_sql,
+                 execute_query_cached, sql_cache_key, ask_steps, check_rate_limit, is_casual, flights,
+                 open_conversation, save_turn, results_payload, llm_clients, GREETING_ANSWER)
+from encoding import dumps, compress, wants_columnar, COLUMNAR_MIMETYPE
+from rate_limit import tier_for_api_key
+from metrics import timed_llm_call, record_llm_response, start_trace, end_trace, annotate
+from singleflight import AsyncSingleFlight
+from llm import AsyncResilientClient
+from model_tiers import sql_route, answer_route
+
+# Questions processed at once by this process; the rest wait for a slot
+ASK_MAX_CONCURRENCY = int(os.getenv('ASK_MAX_CONCURRENCY', 32))
+# Threads for SQLite work (queries and cache lookups) off the event loop
+DB_THREADS = int(os.getenv('ASK_DB_THREADS', 8))
+
+if os.getenv('COURTIQ_FAKE_LLM'):
+    from fake_anthropic import AsyncFakeAnthropic
+    async_client = AsyncFakeAnthropic()
+else:
+    async_client = AsyncAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), max_retries=0)
+# Shares app.llm's circuit breaker
+async_llm = AsyncResilientClient(async_client)
+llm_clients.append(async_llm)
+db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="courtiq-db")
+wsgi_app = WsgiToAsgi(flask_app)
+
+_ask_slots = None
+# Identical questions asked at the same time share one pipeline run in this process
+ask_flight = AsyncSingleFlight("ask_async")
+flights.append(ask_flight)
+
+
+def ask_slots():
+    """Per-process semaphore, created inside the running loop"""
+    global _ask_slots
+    if _ask_slots is None:
+        _ask_slots = asyncio.Semaphore(ASK_MAX_CONCURRENCY)
+    return _ask_slots
+
+
+async def run_db(func, *args):
+    """Run blocking SQLite work on the DB thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(db_executor, func, *args)
+
+
+async def get_sql_from_question(question, conversation=None, failed=None):
+    """Async counterpart of app.get_sql_from_question"""
+    system = await run_db(build_sql_system)
+    route = sql_route(repair=failed is not None)
+    with timed_llm_call(route.stage, route.model):
+        message = await async_llm.create(
+            route.stage,
+            system=system,
+            messages=[{"role": "user", "content": build_sql_prompt(question, conversation, failed)}],
+            **route.params()
+        )
+    record_llm_response(route.stage, route.model, message)
+    return clean_sql(message.content[0].text)
+
+
+async def get_natural_language_answer(question, sql_query, results, column_names, truncated=False):
+    """Async counterpart of app.get_natural_language_answer"""
+    prompt = build_answer_prompt(question, sql_query, results, column_names, truncated)
+    route = answer_route(len(results), truncated)
+    with timed_llm_call(route.stage, route.model):
+        message = await async_llm.create(
+            route.stage,
+            messages=[{"role": "user", "content": prompt}],
+            **route.params()
+        )
+    record_llm_response(route.stage, route.model, message)
+    return message.content[0].text.strip()
+
+
+async def answer_question(question, session_id, history, client_ip, tier=None, columnar=False):
+    """The /ask pipeline; returns (payload, status)"""
+    rate_limit_answer = await run_db(check_rate_limit, client_ip, tier)
+    if rate_limit_answer:
+        return {"question": question, "sql": None, "answer": rate_limit_answer, "results": None}, 200
+
+    if not question:
+        return {"error": "No question provided"}, 400
+
+    if is_casual(question):
+        return {"question": question, "sql": None, "answer": GREETING_ANSWER, "results": None}, 200
+
+    session_id, state, conversation = await run_db(open_conversation, session_id, history)
+    outcome, shared = await ask_flight.do(sql_cache_key(question, conversation), run_pipeline,
+                                          question, conversation)
+    annotate("coalesced", shared)
+    await run_db(save_turn, session_id, state, question, outcome["answer"], outcome["sql"], outcome["rows"],
+                 outcome["columns"])
+    results = None
+    if outcome["sql"] is not None:
+        results = await run_db(results_payload, outcome["rows"], outcome["columns"], outcome["truncated"], columnar,
+                               outcome["sql"])
+    return {"question": question, "sql": outcome["sql"], "answer": outcome["answer"], "results": results,
+            "session_id": session_id}, 200
+
+
+async def run_steps(steps):
+    """Outcome of an app.ask_steps pipeline run on this loop: blocking steps on the DB threads, model calls
+    through async_llm"""
+    value, error = None, None
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(value)
+        except StopIteration as stop:
+            return stop.value
+        value, error = None, None
+        try:
+            if step.kind == "db":
+                value = await run_db(*step.args)
+            elif step.kind == "query":
+                value = await run_db(execute_query_cached, *step.args)
+            elif step.kind == "sql":
+                value = await get_sql_from_question(*step.args)
+            elif step.kind == "answer":
+                value = await get_natural_language_answer(*step.args)
+        except Exception as e:
+            error = e
+
+
+async def run_pipeline(question, conversation):
+    """SQL, answer and results for a question, shared by identical questions asked meanwhile"""
+    async with ask_slots():
+        # ask_flight already shares the whole run, so the query isn't shared again through query_flight
+        return await run_steps(ask_steps(question, conversation, share_query=False))
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+def negotiate(scope):
+    """(columnar, Accept-Encoding) of a request, parsed the way Flask parses them for app.json_response"""
+    headers = dict(scope.get("headers") or [])
+    args = MultiDict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+    accept = parse_accept_header(headers.get(b"accept", b"").decode("latin-1"), MIMEAccept)
+    accept_encodings = parse_accept_header(headers.get(b"accept-encoding", b"").decode("latin-1"))
+    return wants_columnar(args, accept), accept_encodings
+
+
+async def send_json(send, payload, status, accept_encodings=None, mimetype="application/json"):
+    """Send payload encoded with encoding.dumps and compressed when the client accepts it"""
+    body, coding = dumps(payload), None
+    if accept_encodings is not None:
+        body, coding = compress(body, accept_encodings)
+    headers = [
+        (b"content-type", mimetype.encode()),
+        (b"content-length", str(len(body)).encode()),
+        (b"vary", b"Accept, Accept-Encoding"),
+        (b"access-control-allow-origin", b"*"),
+    ]
+    if coding:
+        headers.append((b"content-encoding", coding.encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+def client_ip_from_scope(scope):
+    headers = dict(scope.get("headers") or [])
+    forwarded = headers.get(b"x-forwarded-for")
+    if forwarded:
+        return forwarded.decode("latin-1").split(",")[0]
+    return (scope.get("client") or ("unknown",))[0]
+
+
+async def handle_ask(scope, receive, send):
+    """POST /ask"""
+    headers = dict(scope.get("headers") or [])
+    request_id = headers.get(b"x-request-id")
+    start_trace("POST", "/ask", request_id.decode("latin-1") if request_id else None)
+    columnar, accept_encodings = negotiate(scope)
+    try:
+        data = json.loads(await read_body(receive) or b"{}")
+        question = data.get('question', '').strip()
+        session_id = headers.get(b"x-session-id")
+        session_id = data.get('session_id') or (session_id.decode("latin-1") if session_id else None)
+        api_key = headers.get(b"x-api-key")
+        tier = tier_for_api_key(api_key.decode("latin-1") if api_key else None)
+        payload, status = await answer_question(question, session_id, data.get('history'),
+                                                client_ip_from_scope(scope), tier, columnar)
+    except Exception as e:
+        error_details = {"error": str(e), "type": type(e).__name__, "traceback": traceback.format_exc()}
+        print(f"ERROR IN /ask: {error_details}")
+        payload, status = {"error": str(e), "details": error_details}, 500
+    # Like ask_response: the columnar type for answers carrying results, plain JSON otherwise
+    mimetype = COLUMNAR_MIMETYPE if columnar and payload.get("results") is not None else "application/json"
+    await send_json(send, payload, status, accept_encodings, mimetype)
+    end_trace("/ask", status)
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope["type"] == "http" and scope["path"] == "/ask" and scope["method"] == "POST":
+        await handle_ask(scope, receive, send)
+    elif scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                db_executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    else:
+        await wsgi_app(scope, receive, send)
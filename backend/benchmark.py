@@ -0,0 +1,369 @@
+"""
+CourtIQ Benchmark
+End-to-end /ask latency per pipeline stage against the fake LLM client.
+
+Builds synthetic datasets of the requested sizes with
+generate_realistic_data.py, then replays a fixed question mix against
+each one, either in-process through the Flask test client (per-stage
+timings) or against gunicorn (end-to-end only). Results are written as
+JSON so two commits can be compared:
+
+    python benchmark.py --sizes 0,100000,1000000 --requests 300 --latency-ms 50
+    python benchmark.py --sizes 0,100000 --compare benchmark-abc1234.json
+    python benchmark.py --sizes 100000 --gunicorn --workers 4 --concurrency 16
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import wraps
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Matches the canned SQL in fake_anthropic.py, from a single COUNT to a 500-row listing
+QUESTIONS = [
+    "How many bookings do we have?",
+    "Which members have the highest cancellation rate?",
+    "What is our revenue by month?",
+    "Which coach gives the most lessons?",
+    "Which court is booked most often?",
+    "How many members are in each tier?",
+    "List the most recent bookings",
+]
+
+# Pipeline stages and the app.py function each one times. Stages can nest:
+# format_results runs inside answer_generation when the prompt is built.
+STAGES = {
+    "sql_generation": "get_sql_from_question",
+    "execute_query": "execute_query",
+    "format_results": "format_results",
+    "answer_generation": "get_natural_language_answer",
+}
+
+# Setting the TTL to 0 makes every lookup of these caches a miss
+COLD_CACHE_ENV = {
+    'SQL_CACHE_TTL_SECONDS': '0',
+    'ANSWER_CACHE_TTL_SECONDS': '0',
+    'RESULT_CACHE_TTL_SECONDS': '0',
+    'PREWARM': '0',
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the /ask pipeline with a fake LLM")
+    parser.add_argument("--sizes", default="0,100000",
+                        help="comma-separated numbers of synthetic bookings to add to a copy of the base database")
+    parser.add_argument("--requests", type=int, default=200, help="requests per dataset")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=0, help="fake LLM delay per call")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--warm", action="store_true", help="leave the SQL, result and answer caches on")
+    parser.add_argument("--base-db", default=os.path.join(BACKEND_DIR, "courtiq.db"))
+    parser.add_argument("--data-dir", default=os.path.join(BACKEND_DIR, "bench_data"),
+                        help="where generated datasets are kept and reused")
+    parser.add_argument("--gunicorn", action="store_true", help="serve each dataset with gunicorn instead")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--url", help="benchmark an already running server; stage timings are not available")
+    parser.add_argument("--output", help="results file, default benchmark-<commit>.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative p95 slowdown that counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="ignore p95 changes smaller than this; sub-millisecond stages are noisy")
+    return parser.parse_args()
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds"""
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else None,
+        "p50_ms": round(percentile(values, 50) * 1000, 3) if values else None,
+        "p95_ms": round(percentile(values, 95) * 1000, 3) if values else None,
+        "p99_ms": round(percentile(values, 99) * 1000, 3) if values else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def build_dataset(base_db, data_dir, size):
+    """Path of a copy of base_db with `size` extra bookings, generated once and reused"""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"bookings_{size}.db")
+    if os.path.exists(path):
+        return path
+
+    tmp_path = path + ".tmp"
+    shutil.copyfile(base_db, tmp_path)
+    if size == 0:
+        os.replace(tmp_path, path)
+        return path
+
+    print(f"Building dataset with {size:,} extra bookings...")
+    days = min(size, 365)
+    per_day = size // days
+    subprocess.run([
+        sys.executable, os.path.join(BACKEND_DIR, "generate_realistic_data.py"),
+        "--db", tmp_path, "--members", str(max(80, size // 200)), "--days", str(days),
+        "--min-per-day", str(per_day), "--max-per-day", str(per_day), "--seed", "1",
+    ], check=True, cwd=BACKEND_DIR)
+    os.replace(tmp_path, path)
+    return path
+
+
+def count_bookings(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+    finally:
+        conn.close()
+
+
+class StageTimer:
+    """Collects durations of the wrapped app.py functions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def wrap(self, stage, func):
+        @wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self.samples[stage].append(elapsed)
+        return timed
+
+    def reset(self):
+        with self._lock:
+            self.samples = defaultdict(list)
+
+
+def run_load(send, requests, concurrency):
+    """Send the question mix; returns (per-request seconds, errors, wall seconds)"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def one(i):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        started = time.perf_counter()
+        try:
+            # A distinct client address per request keeps the per-IP rate limit out of the way
+            status = send(question, f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}")
+            error = None if status == 200 else f"HTTP {status}"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if error:
+                errors.append(error)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def http_sender(base_url):
+    def send(question, client_ip):
+        request = urllib.request.Request(
+            base_url.rstrip("/") + "/ask",
+            data=json.dumps({"question": question}).encode("utf-8"),
+            headers={"Content-Type": "application/json", "X-Forwarded-For": client_ip},
+        )
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            return response.status
+    return send
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(db_path, env, workers):
+    """gunicorn serving app:app on db_path; returns (process, base url) once /health answers"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}", "app:app"],
+        cwd=BACKEND_DIR, env={**os.environ, **env, "COURTIQ_DB": db_path})
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            urllib.request.urlopen(base_url + "/health", timeout=1).read()
+            return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start within 30s")
+
+
+def report(label, bookings, latencies, errors, wall, stages):
+    result = {
+        "dataset": label,
+        "bookings": bookings,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "total": summarize(latencies),
+        "stages": {stage: summarize(samples) for stage, samples in stages.items()},
+    }
+    size = f", {bookings:,} bookings" if bookings is not None else ""
+    print(f"\n{label}{size}: {result['requests']} requests, {result['errors']} errors, "
+          f"{result['throughput_rps']} req/s")
+    for name, summary in [("total", result["total"]), *result["stages"].items()]:
+        if summary["count"]:
+            print(f"  {name:<18} p50 {summary['p50_ms']:>9.2f}ms  p95 {summary['p95_ms']:>9.2f}ms  "
+                  f"p99 {summary['p99_ms']:>9.2f}ms  (n={summary['count']})")
+    return result
+
+
+def compare(baseline, current, threshold, min_delta_ms):
+    """Print p95 changes per dataset and stage; returns the regressions"""
+    regressions = []
+    baseline_runs = {run["dataset"]: run for run in baseline["runs"]}
+    print(f"\nCompared with {baseline['commit']}:")
+    for run in current["runs"]:
+        before = baseline_runs.get(run["dataset"])
+        if before is None:
+            continue
+        pairs = [("total", before["total"], run["total"])]
+        pairs += [(stage, before["stages"].get(stage), summary) for stage, summary in run["stages"].items()]
+        for name, old, new in pairs:
+            if not old or not old.get("p95_ms") or not new.get("p95_ms"):
+                continue
+            change = new["p95_ms"] / old["p95_ms"] - 1
+            slower = change > threshold and new["p95_ms"] - old["p95_ms"] > min_delta_ms
+            flag = "  REGRESSION" if slower else ""
+            print(f"  {run['dataset']:<16} {name:<18} p95 {old['p95_ms']:>9.2f}ms -> {new['p95_ms']:>9.2f}ms "
+                  f"({change:+.0%}){flag}")
+            if flag:
+                regressions.append((run["dataset"], name, change))
+    return regressions
+
+
+def main():
+    args = parse_args()
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    env = {
+        "COURTIQ_FAKE_LLM": "1",
+        "FAKE_LLM_LATENCY_MS": str(args.latency_ms),
+        "FAKE_LLM_JITTER_MS": str(args.jitter_ms),
+        "COURTIQ_CACHE_DB": os.path.join(args.data_dir, "bench_cache.db"),
+    }
+    if not args.warm:
+        env.update(COLD_CACHE_ENV)
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    runs = []
+    if args.url:
+        latencies, errors, wall = run_load(http_sender(args.url), args.requests, args.concurrency)
+        runs.append(report("live", None, latencies, errors, wall, {}))
+    elif args.gunicorn:
+        for size in sizes:
+            path = build_dataset(args.base_db, args.data_dir, size)
+            process, base_url = start_gunicorn(path, env, args.workers)
+            try:
+                latencies, errors, wall = run_load(http_sender(base_url), args.requests, args.concurrency)
+            finally:
+                process.terminate()
+                process.wait()
+            runs.append(report(f"bookings+{size}", count_bookings(path), latencies, errors, wall, {}))
+    else:
+        paths = [build_dataset(args.base_db, args.data_dir, size) for size in sizes]
+        # The app reads its configuration at import time
+        os.environ.update(env)
+        os.environ["COURTIQ_DB"] = paths[0]
+        sys.path.insert(0, BACKEND_DIR)
+        import app as courtiq
+        import db
+        from migrations import apply_migrations
+
+        timer = StageTimer()
+        for stage, function_name in STAGES.items():
+            setattr(courtiq, function_name, timer.wrap(stage, getattr(courtiq, function_name)))
+
+        def send(question, client_ip):
+            response = courtiq.app.test_client().post(
+                "/ask", json={"question": question}, headers={"X-Forwarded-For": client_ip})
+            return response.status_code
+
+        for size, path in zip(sizes, paths):
+            db.close_pools()
+            db.DB_PATH = path
+            with db.write_connection() as conn:
+                apply_migrations(conn)
+            timer.reset()
+            latencies, errors, wall = run_load(send, args.requests, args.concurrency)
+            runs.append(report(f"bookings+{size}", count_bookings(path), latencies, errors, wall, timer.samples))
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "mode": "url" if args.url else "gunicorn" if args.gunicorn else "test_client",
+        "settings": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "warm_caches": args.warm,
+            "workers": args.workers if args.gunicorn else None,
+        },
+        "runs": runs,
+    }
+
+    output = args.output or f"benchmark-{results['commit']}.json"
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✓ Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"✗ {len(regressions)} p95 regressions over {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+CourtIQ Bulk Import
+Validates CSV / NDJSON rows and inserts them in large executemany batches.
+
+Column layouts match setup_database.py. Id columns are optional: rows
+without one get the next id. An import that grows past
+REBUILD_INDEXES_MIN_ROWS rows (and a quarter of the table) drops the
+table's secondary indexes and rebuilds them at the end, which is much
+faster than maintaining them row by row. Usage from the command line:
+
+    python bulk_import.py bookings history.csv
+    python bulk_import.py members members.ndjson --format ndjson --atomic
+"""
+
+import argparse
+import csv
+import io
+import json
+import sqlite3
+import sys
+import time
+from datetime import date, datetime
+from functools import lru_cache
+from operator import itemgetter
+
+from rollups import apply_booking_rows, BOOKING_COLUMNS as ROLLUP_COLUMNS
+
+BATCH_SIZE = 5000
+# Page cache (KiB) while importing; index maintenance dominates and a larger cache avoids most page spills
+IMPORT_CACHE_KB = 262144
+# Only the first errors are reported back; the counts are always complete
+MAX_REPORTED_ERRORS = 100
+# Imports this large, and at least REBUILD_INDEXES_RATIO of the table's existing rows, rebuild its indexes once
+REBUILD_INDEXES_MIN_ROWS = 20000
+REBUILD_INDEXES_RATIO = 0.25
+# Rows sampled per index when re-analysing the rebuilt indexes
+ANALYSIS_LIMIT = 1000
+
+
+def _text(value):
+    return value if type(value) is str else str(value)
+
+
+# Imports repeat the same few thousand dates
+@lru_cache(maxsize=8192)
+def _date(value):
+    return date.fromisoformat(str(value)[:10]).isoformat()
+
+
+def _flag(value):
+    if str(value).lower() in ('1', 'true', 'yes'):
+        return 1
+    if str(value).lower() in ('0', 'false', 'no'):
+        return 0
+    raise ValueError(f"expected 0 or 1, got {value!r}")
+
+
+# entity -> (table, [(column, converter, required, default)])
+ENTITIES = {
+    "members": ("members", [
+        ("member_id", int, False, None),
+        ("name", _text, True, None),
+        ("email", _text, True, None),
+        ("phone", _text, False, None),
+        ("membership_tier", _text, False, None),
+        ("join_date", _date, True, None),
+        ("status", _text, False, "active"),
+    ]),
+    "coaches": ("coaches", [
+        ("coach_id", int, False, None),
+        ("name", _text, True, None),
+        ("specialty", _text, False, None),
+        ("hourly_rate", float, True, None),
+        ("weekly_available_hours", int, False, 40),
+    ]),
+    "courts": ("courts", [
+        ("court_id", int, False, None),
+        ("court_name", _text, True, None),
+        ("surface_type", _text, False, None),
+        ("indoor", _flag, False, 0),
+    ]),
+    "bookings": ("bookings", [
+        ("booking_id", int, False, None),
+        ("member_id", int, True, None),
+        ("coach_id", int, False, None),
+        ("court_id", int, True, None),
+        ("lesson_type", _text, False, None),
+        ("booking_date", _date, True, None),
+        ("start_time", _text, True, None),
+        ("end_time", _text, True, None),
+        ("duration_minutes", int, True, None),
+        ("price", float, True, None),
+        ("status", _text, False, "scheduled"),
+        ("cancellation_reason", _text, False, None),
+        ("created_at", _text, False, None),
+    ]),
+}
+
+
+class ImportReport:
+    """Counts and the first per-row errors of one import"""
+
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def error(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "error": message})
+
+    def as_dict(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda error: error["row"]),
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(self.inserted / elapsed) if elapsed else None,
+        }
+
+
+def iter_csv(stream):
+    """Rows of a CSV text stream with a header line; cells beyond the header are ignored"""
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    for row in reader:
+        if row:
+            yield dict(zip(header, row))
+
+
+def iter_ndjson(stream):
+    """Rows of a newline-delimited JSON text stream"""
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+READERS = {"csv": iter_csv, "ndjson": iter_ndjson}
+
+
+def validate_row(columns, row, now):
+    """Tuple in column order for one input row; raises ValueError with the reason"""
+    if not isinstance(row, dict):
+        raise ValueError("row is not an object")
+    get = row.get
+    values = []
+    append = values.append
+    for column, convert, required, default in columns:
+        value = get(column)
+        if value is None or value == '':
+            if required:
+                raise ValueError(f"missing {column}")
+            append(now if column == "created_at" else default)
+            continue
+        try:
+            append(convert(value))
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid {column}: {value!r}")
+    return tuple(values)
+
+
+def _insert_batch(conn, insert_sql, batch, report):
+    """Insert a batch in one executemany, falling back to row by row to pin down failures"""
+    conn.execute("SAVEPOINT bulk_batch")
+    try:
+        conn.executemany(insert_sql, [values for _, values in batch])
+        conn.execute("RELEASE bulk_batch")
+        report.inserted += len(batch)
+        return [values for _, values in batch]
+    except sqlite3.IntegrityError:
+        conn.execute("ROLLBACK TO bulk_batch")
+        conn.execute("RELEASE bulk_batch")
+
+    inserted = []
+    for row_number, values in batch:
+        try:
+            conn.execute(insert_sql, values)
+            inserted.append(values)
+        except sqlite3.IntegrityError as e:
+            report.error(row_number, str(e))
+    report.inserted += len(inserted)
+    return inserted
+
+
+def drop_secondary_indexes(conn, table):
+    """Drop a table's non-unique indexes in the caller's transaction, returning their SQL for rebuilding"""
+    indexes = conn.execute("SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL",
+                           (table,)).fetchall()
+    # Unique indexes stay: they enforce constraints the row-by-row fallback relies on
+    indexes = [(name, sql) for name, sql in indexes if not sql.upper().startswith("CREATE UNIQUE")]
+    for name, _ in indexes:
+        conn.execute(f"DROP INDEX {name}")
+    return indexes
+
+
+def rebuild_indexes(conn, indexes):
+    """Recreate dropped indexes and refresh their planner statistics (sampled: import_rows sets analysis_limit)"""
+    for _, sql in indexes:
+        conn.execute(sql)
+    for name, _ in indexes:
+        conn.execute(f"ANALYZE {name}")
+
+
+def import_rows(conn, entity, rows, batch_size=BATCH_SIZE, atomic=False):
+    """Validate and insert rows into the caller's transaction.
+
+    With atomic=True nothing is kept if any row fails. Returns an ImportReport.
+    """
+    if entity not in ENTITIES:
+        raise ValueError(f"Unknown entity {entity!r}; expected one of {', '.join(ENTITIES)}")
+    table, columns = ENTITIES[entity]
+    names = [column for column, *_ in columns]
+    insert_sql = f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' for _ in names)})"
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    report = ImportReport()
+    dropped_indexes = None
+    if entity == "bookings":
+        rollup_fields = itemgetter(*(names.index(column) for column in ROLLUP_COLUMNS.split(", ")))
+
+    def flush(batch, rows_read):
+        nonlocal dropped_indexes
+        if dropped_indexes is None and rows_read >= rebuild_threshold:
+            dropped_indexes = drop_secondary_indexes(conn, table)
+        inserted = _insert_batch(conn, insert_sql, batch, report)
+        if entity == "bookings" and inserted:
+            apply_booking_rows(conn, map(rollup_fields, inserted))
+
+    # Both are restored afterwards: under /admin, conn is the pooled writer
+    previous_cache_size = conn.execute("PRAGMA cache_size").fetchone()[0]
+    previous_analysis_limit = conn.execute("PRAGMA analysis_limit").fetchone()[0]
+    conn.execute(f"PRAGMA cache_size=-{IMPORT_CACHE_KB}")
+    conn.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+    try:
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        conn.execute("SAVEPOINT bulk_import")
+        existing = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+        rebuild_threshold = max(REBUILD_INDEXES_MIN_ROWS, existing * REBUILD_INDEXES_RATIO)
+        batch = []
+        row_number = 0
+        try:
+            for row_number, row in enumerate(rows, start=1):
+                try:
+                    batch.append((row_number, validate_row(columns, row, now)))
+                except ValueError as e:
+                    report.error(row_number, str(e))
+                if len(batch) >= batch_size:
+                    flush(batch, row_number)
+                    batch = []
+            if batch:
+                flush(batch, row_number)
+        except (ValueError, csv.Error) as e:
+            # The stream itself is unreadable past this point
+            report.error(row_number + 1, f"unreadable input: {e}")
+
+        if atomic and report.failed:
+            # Also brings back any dropped indexes
+            conn.execute("ROLLBACK TO bulk_import")
+            report.inserted = 0
+        elif dropped_indexes:
+            rebuild_indexes(conn, dropped_indexes)
+        conn.execute("RELEASE bulk_import")
+    finally:
+        conn.execute(f"PRAGMA cache_size={previous_cache_size}")
+        conn.execute(f"PRAGMA analysis_limit={previous_analysis_limit}")
+    return report
+
+
+def open_text(binary_stream):
+    """Text view of an uploaded byte stream"""
+    return io.TextIOWrapper(binary_stream, encoding="utf-8-sig", newline="")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import CourtIQ data from CSV or NDJSON")
+    parser.add_argument("entity", choices=sorted(ENTITIES))
+    parser.add_argument("path", help="input file, or - for stdin")
+    parser.add_argument("--format", choices=sorted(READERS), help="defaults to the file extension, else csv")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--atomic", action="store_true", help="import nothing if any row fails")
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+
+    from db import write_connection
+
+    stream = open_text(sys.stdin.buffer) if args.path == "-" else open(args.path, encoding="utf-8-sig", newline="")
+    with stream, write_connection() as conn:
+        report = import_rows(conn, args.entity, READERS[fmt](stream), args.batch_size, args.atomic)
+
+    result = report.as_dict()
+    print(f"✓ Inserted {result['inserted']} {args.entity} in {result['seconds']}s "
+          f"({result['rows_per_second']} rows/s), {result['failed']} failed")
+    for error in result["errors"]:
+        print(f"  row {error['row']}: {error['error']}")
+    sys.exit(1 if result["failed"] else 0)
@@ -0,0 +1,185 @@
+"""
+CourtIQ Caches
+Persistent LRU/TTL key-value caches stored in a local SQLite file
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+CACHE_DB_PATH = os.getenv('COURTIQ_CACHE_DB', 'courtiq_cache.db')
+
+# Trimming to max_entries is amortised over this many writes
+EVICT_EVERY = 64
+
+
+def normalize_question(question):
+    """Lower-case, collapse whitespace and drop trailing punctuation"""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip(" ?!.")
+
+
+def make_key(*parts):
+    """Stable digest of any JSON-serialisable parts"""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def digest_results(results, column_names):
+    """Fingerprint of a result set, used to recognise identical results"""
+    return make_key(column_names, results)
+
+
+class PersistentCache:
+    """LRU cache with TTL that survives restarts and is shared by all workers on the host"""
+
+    def __init__(self, name, max_entries=5000, ttl_seconds=7 * 24 * 3600, path=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path or CACHE_DB_PATH
+        self._table = f"cache_{name}"
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._evictions = 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self._table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self._table}_last_used ON {self._table} (last_used)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """Return the cached value, or None on a miss or an expired entry"""
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(f"SELECT value, created_at FROM {self._table} WHERE key=?", (key,)).fetchone()
+        if row is not None and now - row[1] > self.ttl_seconds:
+            conn.execute(f"DELETE FROM {self._table} WHERE key=?", (key,))
+            row = None
+
+        with self._lock:
+            if row is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        if row is None:
+            return None
+
+        conn.execute(f"UPDATE {self._table} SET last_used=? WHERE key=?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries past max_entries"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self._table} (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now, now))
+
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def delete(self, key):
+        """Drop a single entry"""
+        self._conn().execute(f"DELETE FROM {self._table} WHERE key=?", (key,))
+
+    def evict(self):
+        """Remove expired entries, then everything beyond max_entries by recency"""
+        conn = self._conn()
+        expired = conn.execute(f"DELETE FROM {self._table} WHERE created_at < ?",
+                               (time.time() - self.ttl_seconds,)).rowcount
+        overflow = conn.execute(f"""
+            DELETE FROM {self._table} WHERE key IN (
+                SELECT key FROM {self._table} ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,)).rowcount
+        with self._lock:
+            self._evictions += expired + overflow
+
+    def clear(self):
+        """Remove every entry"""
+        self._conn().execute(f"DELETE FROM {self._table}")
+
+    def stats(self):
+        """Hit/miss counters for this worker plus the shared entry count"""
+        entries = self._conn().execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+            }
+
+
+sql_cache = PersistentCache(
+    "sql",
+    max_entries=int(os.getenv('SQL_CACHE_MAX_ENTRIES', 5000)),
+    ttl_seconds=int(os.getenv('SQL_CACHE_TTL_SECONDS', 7 * 24 * 3600)),
+)
+
+answer_cache = PersistentCache(
+    "answer",
+    max_entries=int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 5000)),
+    ttl_seconds=int(os.getenv('ANSWER_CACHE_TTL_SECONDS', 7 * 24 * 3600)),
+)
+
+# Entries are keyed by data_version(), so writes invalidate them without a purge
+result_cache = PersistentCache(
+    "result",
+    max_entries=int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 2000)),
+    ttl_seconds=int(os.getenv('RESULT_CACHE_TTL_SECONDS', 24 * 3600)),
+)
+
+admin_cache = PersistentCache(
+    "admin",
+    max_entries=int(os.getenv('ADMIN_CACHE_MAX_ENTRIES', 500)),
+    ttl_seconds=int(os.getenv('ADMIN_CACHE_TTL_SECONDS', 24 * 3600)),
+)
+
+# Answers to the suggested questions, kept current by prewarm.py
+prewarm_store = PersistentCache(
+    "prewarm",
+    max_entries=int(os.getenv('PREWARM_MAX_ENTRIES', 200)),
+    ttl_seconds=int(os.getenv('PREWARM_TTL_SECONDS', 7 * 24 * 3600)),
+)
+
+# Compacted conversations of /ask sessions (see sessions.py); the TTL runs from a session's last question
+session_store = PersistentCache(
+    "session",
+    max_entries=int(os.getenv('SESSION_MAX_ENTRIES', 10000)),
+    ttl_seconds=int(os.getenv('SESSION_TTL_SECONDS', 24 * 3600)),
+)
+
+# SQL the pipeline generated, by the token that lets /ask/rows stream all of its rows
+rows_tokens = PersistentCache(
+    "rows_token",
+    max_entries=int(os.getenv('ROWS_TOKEN_MAX_ENTRIES', 5000)),
+    ttl_seconds=int(os.getenv('ROWS_TOKEN_TTL_SECONDS', 3600)),
+)
@@ -0,0 +1,257 @@
+"""
+CourtIQ Database Connections
+Per-worker SQLite connection pools shared by every backend endpoint
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+DB_PATH = os.getenv('COURTIQ_DB', 'courtiq.db')
+
+READ_POOL_SIZE = int(os.getenv('DB_READ_POOL_SIZE', 8))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+
+# Applied to every connection. cache_size is negative so SQLite reads it as KiB.
+CONNECTION_PRAGMAS = {
+    'busy_timeout': int(os.getenv('DB_BUSY_TIMEOUT_MS', 5000)),
+    'cache_size': -int(os.getenv('DB_CACHE_KB', 16384)),
+    'mmap_size': int(os.getenv('DB_MMAP_BYTES', 256 * 1024 * 1024)),
+    'temp_store': 'MEMORY',
+}
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection frees up within POOL_TIMEOUT"""
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections created lazily by a factory"""
+
+    def __init__(self, name, factory, size):
+        self.name = name
+        self._factory = factory
+        self._size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_seconds = 0.0
+
+    def acquire(self, timeout=POOL_TIMEOUT):
+        """Check out an idle connection, opening a new one while under the size limit"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._created < self._size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+                    self._waits += 1
+            if create:
+                try:
+                    conn = self._factory()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeout(f"No {self.name} connection available after {timeout}s")
+                finally:
+                    with self._lock:
+                        self._wait_seconds += time.perf_counter() - started
+
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, dropping it if it is no longer usable"""
+        if not discard and conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                discard = True
+
+        with self._lock:
+            self._in_use -= 1
+            if discard:
+                self._created -= 1
+
+        if discard:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block"""
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except sqlite3.ProgrammingError:
+            # A closed handle should not be handed to the next request
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self):
+        """Pool occupancy counters for /health"""
+        with self._lock:
+            return {
+                "size": self._size,
+                "open": self._created,
+                "in_use": self._in_use,
+                "idle": self._created - self._in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "wait_seconds": round(self._wait_seconds, 4),
+            }
+
+
+def _apply_pragmas(conn):
+    for pragma, value in CONNECTION_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma}={value}")
+
+
+def _ensure_meta(conn):
+    # generation changes whenever the database is recreated, so a fresh file
+    # never reuses a data version that a cache already saw
+    conn.execute("CREATE TABLE IF NOT EXISTS courtiq_meta (key TEXT PRIMARY KEY, value NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO courtiq_meta VALUES ('generation', lower(hex(randomblob(8))))")
+    conn.execute("INSERT OR IGNORE INTO courtiq_meta VALUES ('data_version', 0)")
+
+
+def bump_data_version(conn):
+    """Mark the data as changed; call inside the writing transaction"""
+    _ensure_meta(conn)
+    conn.execute("UPDATE courtiq_meta SET value = value + 1 WHERE key='data_version'")
+
+
+def _open_writer():
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    _apply_pragmas(conn)
+    # WAL lets the read pool keep serving while the writer commits.
+    # NORMAL is durable across application crashes in WAL mode.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    _ensure_meta(conn)
+    conn.commit()
+    return conn
+
+
+def _open_reader():
+    uri = Path(DB_PATH).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    _apply_pragmas(conn)
+    conn.execute("PRAGMA query_only=1")
+    return conn
+
+
+_pools = None
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def _get_pools():
+    """Create this worker's pools on first use (and again after a fork)"""
+    global _pools, _pools_pid
+    pid = os.getpid()
+    if _pools is None or _pools_pid != pid:
+        with _pools_lock:
+            if _pools is None or _pools_pid != pid:
+                writer = ConnectionPool("write", _open_writer, 1)
+                # Opening the writer first switches the file to WAL before any reader attaches
+                writer.release(writer.acquire())
+                _pools = {"read": ConnectionPool("read", _open_reader, READ_POOL_SIZE), "write": writer}
+                _pools_pid = pid
+    return _pools
+
+
+@contextmanager
+def read_connection():
+    """Read-only pooled connection for queries"""
+    with _get_pools()["read"].connection() as conn:
+        yield conn
+
+
+@contextmanager
+def write_connection():
+    """The worker's single write connection; commits on success, rolls back on error"""
+    with _get_pools()["write"].connection() as conn:
+        changes = conn.total_changes
+        try:
+            yield conn
+            if conn.total_changes != changes:
+                bump_data_version(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+@contextmanager
+def dedicated_read_connection():
+    """Read-only connection outside the pool, for long streams that shouldn't hold a pooled one"""
+    conn = _open_reader()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def data_version(conn=None):
+    """Token that changes on every committed write to the club data, as seen by conn (e.g. inside its snapshot)"""
+    if conn is None:
+        with read_connection() as conn:
+            return data_version(conn)
+    meta = dict(conn.execute(
+        "SELECT key, value FROM courtiq_meta WHERE key IN ('generation', 'data_version')").fetchall())
+    return f"{meta['generation']}:{meta['data_version']}"
+
+
+def pool_stats():
+    """Occupancy of both pools in this worker"""
+    pools = _get_pools()
+    return {name: pool.stats() for name, pool in pools.items()}
+
+
+def close_pools():
+    """Close idle connections, e.g. before the database file is replaced"""
+    global _pools
+    with _pools_lock:
+        if _pools is not None:
+            for pool in _pools.values():
+                pool.close_all()
+            _pools = None
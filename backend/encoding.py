@@ -0,0 +1,80 @@
+"""
+CourtIQ Response Encoding
+Compact columnar JSON for row-heavy responses, fast serialisation and
+response compression.
+
+Clients opt in to the columnar form with `?format=columnar` or
+`Accept: application/vnd.courtiq.columnar+json`; it sends the column
+names once and one array per column instead of one object per row.
+orjson is used when installed, and brotli is offered next to gzip when
+the brotli package is installed.
+"""
+
+import gzip
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COLUMNAR_MIMETYPE = 'application/vnd.courtiq.columnar+json'
+# Smaller bodies aren't worth the CPU or the extra header
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 5))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 4))
+
+
+def dumps(payload):
+    """Compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def wants_columnar(args, accept_mimetypes):
+    """Whether the request asked for the columnar format"""
+    if args.get('format') == 'columnar':
+        return True
+    return accept_mimetypes.best == COLUMNAR_MIMETYPE
+
+
+def columns_from_rows(column_names, rows):
+    """Columnar form of rows given as sequences"""
+    return {"columns": list(column_names), "data": [list(column) for column in zip(*rows)] if rows
+            else [[] for _ in column_names]}
+
+
+def columns_from_records(records):
+    """Columnar form of rows given as dicts sharing the same keys"""
+    if not records:
+        return {"columns": [], "data": []}
+    column_names = list(records[0])
+    return {"columns": column_names, "data": [[record[name] for record in records] for name in column_names]}
+
+
+def choose_encoding(accept_encodings):
+    """Best supported content coding from the request's Accept-Encoding"""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, accept_encodings):
+    """(body, content coding or None), compressed when large enough and accepted"""
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    coding = choose_encoding(accept_encodings)
+    if coding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY), coding
+    if coding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), coding
+    return body, None
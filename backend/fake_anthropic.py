@@ -0,0 +1,207 @@
+"""
+CourtIQ Fake Anthropic Client
+Offline stand-in for the Anthropic SDK used by benchmarks and local runs.
+
+Returns canned SQL for translation prompts (a question mentioning "typo"
+gets a query that fails, and the repair prompt a safe one) and a fixed
+answer for everything else, cut off at max_tokens, after a configurable
+delay. Enable it in the server with
+COURTIQ_FAKE_LLM=1; FAKE_LLM_LATENCY_MS / FAKE_LLM_JITTER_MS set the
+delay per call and FAKE_LLM_TOKEN_MS the delay per streamed token.
+
+For exercising llm.py, FAKE_LLM_ERROR_RATE is the fraction of calls that
+fail with a 529 overloaded error, and FAKE_LLM_SLOW_RATE the fraction that
+take an extra FAKE_LLM_SLOW_MS. A call whose delay exceeds the timeout it
+was given raises TimeoutError after the timeout, like the SDK would.
+"""
+
+import asyncio
+import os
+import random
+import re
+import time
+from types import SimpleNamespace
+
+LATENCY_MS = float(os.getenv('FAKE_LLM_LATENCY_MS', 0))
+JITTER_MS = float(os.getenv('FAKE_LLM_JITTER_MS', 0))
+TOKEN_MS = float(os.getenv('FAKE_LLM_TOKEN_MS', 0))
+ERROR_RATE = float(os.getenv('FAKE_LLM_ERROR_RATE', 0))
+SLOW_RATE = float(os.getenv('FAKE_LLM_SLOW_RATE', 0))
+SLOW_MS = float(os.getenv('FAKE_LLM_SLOW_MS', 5000))
+
+# (keyword in the question, SQL returned); first match wins
+CANNED_SQL = [
+    ("cancellation", "SELECT m.name, COUNT(*) AS cancellations FROM bookings b JOIN members m ON b.member_id = m.member_id "
+                     "WHERE b.status = 'cancelled' GROUP BY m.member_id ORDER BY cancellations DESC LIMIT 10"),
+    ("revenue", "SELECT strftime('%Y-%m', booking_date) AS month, SUM(price) AS revenue FROM bookings "
+                "WHERE status = 'completed' GROUP BY month ORDER BY month"),
+    ("coach", "SELECT c.name, COUNT(*) AS lessons FROM bookings b JOIN coaches c ON b.coach_id = c.coach_id "
+              "GROUP BY c.coach_id ORDER BY lessons DESC"),
+    ("court", "SELECT co.court_name, COUNT(*) AS bookings FROM bookings b JOIN courts co ON b.court_id = co.court_id "
+              "GROUP BY co.court_id ORDER BY bookings DESC"),
+    ("tier", "SELECT membership_tier, COUNT(*) AS members FROM members GROUP BY membership_tier"),
+    ("list", "SELECT * FROM bookings ORDER BY booking_date DESC LIMIT 500"),
+    ("typo", "SELECT nme FROM members"),
+]
+DEFAULT_SQL = "SELECT COUNT(*) AS bookings FROM bookings"
+ANSWER = "Here is what the data shows: the results above answer your question, with the top entries listed first."
+
+
+def canned_response(prompt):
+    """Text the fake model returns for a prompt"""
+    match = re.search(r"Current question: (.*)", prompt)
+    if match is None:
+        return ANSWER
+    if "Write a corrected query." in prompt:
+        return DEFAULT_SQL
+    question = match.group(1).lower()
+    for keyword, sql in CANNED_SQL:
+        if keyword in question:
+            return sql
+    return DEFAULT_SQL
+
+
+class FakeOverloadedError(Exception):
+    """Stand-in for the API's 529 overloaded response"""
+
+    status_code = 529
+
+
+def _delay():
+    delay = max(0.0, LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS))
+    if SLOW_RATE and random.random() < SLOW_RATE:
+        delay += SLOW_MS
+    return delay / 1000
+
+
+def _outcome(timeout):
+    """(seconds to wait, exception to raise afterwards or None) for one call"""
+    delay = _delay()
+    if timeout is not None and delay > timeout:
+        return timeout, TimeoutError(f"fake request timed out after {timeout:.2f}s")
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        return delay, FakeOverloadedError("Overloaded")
+    return delay, None
+
+
+def _wait(timeout):
+    delay, error = _outcome(timeout)
+    time.sleep(delay)
+    if error is not None:
+        raise error
+
+
+# Cacheable system prefixes seen so far, to report prompt-cache usage like the API
+_cached_prefixes = set()
+
+
+def _usage(prompt, text, system):
+    """Token usage, counting a cache_control system prefix as written once and read afterwards"""
+    usage = SimpleNamespace(input_tokens=len(prompt) // 4, output_tokens=max(1, len(text) // 4),
+                            cache_creation_input_tokens=0, cache_read_input_tokens=0)
+    if isinstance(system, list) and any("cache_control" in block for block in system):
+        prefix = "".join(block.get("text", "") for block in system)
+        if prefix in _cached_prefixes:
+            usage.cache_read_input_tokens = len(prefix) // 4
+        else:
+            _cached_prefixes.add(prefix)
+            usage.cache_creation_input_tokens = len(prefix) // 4
+    elif system:
+        usage.input_tokens += len(system) // 4
+    return usage
+
+
+def _message(prompt, text, model, system=None, max_tokens=None):
+    stop_reason = "end_turn"
+    if max_tokens is not None and len(text) // 4 > max_tokens:
+        text, stop_reason = text[:max_tokens * 4], "max_tokens"
+    return SimpleNamespace(
+        id="msg_fake",
+        type="message",
+        role="assistant",
+        model=model,
+        content=[SimpleNamespace(type="text", text=text)],
+        stop_reason=stop_reason,
+        usage=_usage(prompt, text, system),
+    )
+
+
+def _prompt(messages):
+    content = messages[-1]["content"]
+    if isinstance(content, list):
+        content = "".join(block.get("text", "") for block in content)
+    return content
+
+
+class _Stream:
+    """Context manager shaped like the SDK's MessageStream"""
+
+    def __init__(self, prompt, text, model, system=None, timeout=None, max_tokens=None):
+        self._prompt = prompt
+        self._text = text
+        self._max_tokens = max_tokens
+        self._model = model
+        self._system = system
+        self._timeout = timeout
+
+    def __enter__(self):
+        _wait(self._timeout)
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        text = self._text if self._max_tokens is None else self._text[:self._max_tokens * 4]
+        for word in re.findall(r"\S+\s*", text):
+            if TOKEN_MS:
+                time.sleep(TOKEN_MS / 1000)
+            yield word
+
+    def get_final_message(self):
+        return _message(self._prompt, self._text, self._model, self._system, self._max_tokens)
+
+
+class _Messages:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, model, max_tokens, messages, system=None, timeout=None, **kwargs):
+        self.calls += 1
+        prompt = _prompt(messages)
+        _wait(timeout)
+        return _message(prompt, canned_response(prompt), model, system, max_tokens)
+
+    def stream(self, model, max_tokens, messages, system=None, timeout=None, **kwargs):
+        self.calls += 1
+        prompt = _prompt(messages)
+        return _Stream(prompt, canned_response(prompt), model, system, timeout, max_tokens)
+
+
+class _AsyncMessages:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, model, max_tokens, messages, system=None, timeout=None, **kwargs):
+        self.calls += 1
+        prompt = _prompt(messages)
+        delay, error = _outcome(timeout)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return _message(prompt, canned_response(prompt), model, system, max_tokens)
+
+
+class FakeAnthropic:
+    """Drop-in for anthropic.Anthropic covering messages.create and messages.stream"""
+
+    def __init__(self, **kwargs):
+        self.messages = _Messages()
+
+
+class AsyncFakeAnthropic:
+    """Drop-in for anthropic.AsyncAnthropic covering messages.create"""
+
+    def __init__(self, **kwargs):
+        self.messages = _AsyncMessages()
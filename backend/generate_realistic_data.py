@@ -1,68 +1,254 @@
-import sqlite3
+"""
+CourtIQ Synthetic Data Generator
+Adds members, coaches, courts and bookings at any scale for demos and benchmarks.
+
+With no arguments it adds 80 members and 180 days of 2-8 bookings a day.
+For benchmark datasets, for example ~10M bookings:
+
+    python generate_realistic_data.py --members 20000 --coaches 40 --courts 24 \\
+        --days 1825 --min-per-day 5000 --max-per-day 6000 --seed 7
+
+Columns are generated a chunk at a time with random.choices and inserted
+with executemany; --csv writes the same rows to CSV files (in the
+bulk_import.py layout) instead of the database.
+"""
+
+import argparse
+import csv
+import os
 import random
+import sqlite3
+import time
 from datetime import datetime, timedelta
 
-conn = sqlite3.connect('courtiq.db')
-cursor = conn.cursor()
+from db import bump_data_version
+from rollups import rebuild_rollups
 
 first_names = ['Emma', 'Liam', 'Olivia', 'Noah', 'Ava', 'Ethan', 'Sophia', 'Mason', 'Isabella', 'William']
 last_names = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez']
 tiers = ['Premium', 'Standard', 'Junior']
 lesson_types = ['private', 'semi-private', 'group', 'court-rental']
+specialties = ['advanced', 'junior', 'adult']
+surfaces = ['hard', 'clay', 'grass']
+
+MEMBER_COLUMNS = ['member_id', 'name', 'email', 'phone', 'membership_tier', 'join_date', 'status']
+COACH_COLUMNS = ['coach_id', 'name', 'specialty', 'hourly_rate', 'weekly_available_hours']
+COURT_COLUMNS = ['court_id', 'court_name', 'surface_type', 'indoor']
+BOOKING_COLUMNS = ['booking_id', 'member_id', 'coach_id', 'court_id', 'lesson_type', 'booking_date', 'start_time',
+                   'end_time', 'duration_minutes', 'price', 'status', 'cancellation_reason', 'created_at']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate synthetic CourtIQ data")
+    parser.add_argument("--db", default=os.getenv('COURTIQ_DB', 'courtiq.db'))
+    parser.add_argument("--members", type=int, default=80, help="members to add")
+    parser.add_argument("--coaches", type=int, default=0, help="make sure at least this many coaches exist")
+    parser.add_argument("--courts", type=int, default=0, help="make sure at least this many courts exist")
+    parser.add_argument("--days", type=int, default=180, help="days of bookings, ending today")
+    parser.add_argument("--min-per-day", type=int, default=2)
+    parser.add_argument("--max-per-day", type=int, default=8)
+    parser.add_argument("--cancel-rate", type=float, default=0.25)
+    parser.add_argument("--no-show-rate", type=float, default=0.0)
+    parser.add_argument("--weather-share", type=float, default=0.5,
+                        help="share of cancellations caused by weather")
+    parser.add_argument("--seed", type=int, help="make the output reproducible")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="rows per executemany / CSV write")
+    parser.add_argument("--csv", metavar="DIR", help="write CSV files to DIR instead of the database")
+    parser.add_argument("--keep-indexes", action="store_true",
+                        help="maintain booking indexes during the load instead of rebuilding them after")
+    args = parser.parse_args()
+    for option in ("cancel_rate", "no_show_rate", "weather_share"):
+        if not 0 <= getattr(args, option) <= 1:
+            parser.error(f"--{option.replace('_', '-')} must be between 0 and 1")
+    if args.cancel_rate + args.no_show_rate > 1:
+        parser.error("--cancel-rate and --no-show-rate must add up to at most 1")
+    if not 0 <= args.min_per_day <= args.max_per_day:
+        parser.error("--min-per-day must be between 0 and --max-per-day")
+    return args
+
+
+class Sink:
+    """Destination for generated rows: the database or one CSV file per table"""
+
+    def __init__(self, conn, csv_dir=None):
+        self.conn = conn
+        self.csv_dir = csv_dir
+        self._files = {}
+
+    def write(self, table, columns, rows):
+        if self.csv_dir is None:
+            placeholders = ",".join("?" for _ in columns)
+            self.conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+            return
+
+        if table not in self._files:
+            f = open(os.path.join(self.csv_dir, f"{table}.csv"), "w", newline="")
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            self._files[table] = (f, writer)
+        self._files[table][1].writerows(rows)
+
+    def close(self):
+        for f, _ in self._files.values():
+            f.close()
+
+
+def next_id(cursor, table, column):
+    cursor.execute(f'SELECT MAX({column}) FROM {table}')
+    return (cursor.fetchone()[0] or 0) + 1
+
+
+def all_ids(cursor, table, column):
+    cursor.execute(f'SELECT {column} FROM {table}')
+    return [r[0] for r in cursor.fetchall()]
+
+
+def generate_members(rng, start_id, count, today):
+    members_data = []
+    for mid in range(start_id, start_id + count):
+        name = f"{rng.choice(first_names)} {rng.choice(last_names)}"
+        email = f"{name.lower().replace(' ', '.')}.{mid}@email.com"
+        phone = f"555-{rng.randint(1000, 9999)}"
+        join_date = (today - timedelta(days=rng.randint(0, 365))).strftime('%Y-%m-%d')
+        members_data.append((mid, name, email, phone, rng.choice(tiers), join_date, 'active'))
+    return members_data
+
+
+def generate_coaches(rng, start_id, count):
+    return [(cid, f"{rng.choice(first_names)} {rng.choice(last_names)}", rng.choice(specialties),
+             float(rng.randrange(50, 100, 5)), rng.randint(30, 40))
+            for cid in range(start_id, start_id + count)]
+
+
+def generate_courts(rng, start_id, count):
+    return [(ctid, f"Court {ctid}", rng.choice(surfaces), rng.randint(0, 1))
+            for ctid in range(start_id, start_id + count)]
+
+
+def generate_bookings(rng, args, start_id, member_ids, coach_ids, court_ids, start_date):
+    """Yield lists of booking rows of about chunk_size each"""
+    statuses = ['completed', 'cancelled', 'no-show']
+    weights = [1 - args.cancel_rate - args.no_show_rate, args.cancel_rate, args.no_show_rate]
+    hours = list(range(8, 20))
+    start_times = {h: f"{h:02d}:00" for h in hours + [20]}
+    prices = list(range(35, 91))
+
+    bid = start_id
+    day = 0
+    while day < args.days:
+        # Build one chunk column by column; random.choices runs its loop in C
+        dates = []
+        while day < args.days and len(dates) < args.chunk_size:
+            bdate = (start_date + timedelta(days=day)).strftime('%Y-%m-%d')
+            dates.extend([bdate] * rng.randint(args.min_per_day, args.max_per_day))
+            day += 1
+
+        n = len(dates)
+        chunk_statuses = rng.choices(statuses, weights, k=n)
+        reasons = [('weather' if rng.random() < args.weather_share else None) if st == 'cancelled' else None
+                   for st in chunk_statuses]
+        chunk_hours = rng.choices(hours, k=n)
+
+        yield list(zip(
+            range(bid, bid + n),
+            rng.choices(member_ids, k=n),
+            rng.choices(coach_ids, k=n),
+            rng.choices(court_ids, k=n),
+            rng.choices(lesson_types, k=n),
+            dates,
+            [start_times[h] for h in chunk_hours],
+            [start_times[h + 1] for h in chunk_hours],
+            [60] * n,
+            rng.choices(prices, k=n),
+            chunk_statuses,
+            reasons,
+            dates,
+        ))
+        bid += n
+
+
+def drop_booking_indexes(cursor):
+    """Drop secondary booking indexes, returning their SQL so they can be recreated"""
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name='bookings' AND sql IS NOT NULL")
+    indexes = cursor.fetchall()
+    for name, _ in indexes:
+        cursor.execute(f"DROP INDEX {name}")
+    return [sql for _, sql in indexes]
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    today = datetime.now()
+
+    conn = sqlite3.connect(args.db)
+    cursor = conn.cursor()
+    if args.csv:
+        os.makedirs(args.csv, exist_ok=True)
+    sink = Sink(conn, args.csv)
+    started = time.perf_counter()
+
+    coach_ids = all_ids(cursor, 'coaches', 'coach_id')
+    if len(coach_ids) < args.coaches:
+        print(f"Adding {args.coaches - len(coach_ids)} coaches...")
+        coaches_data = generate_coaches(rng, next_id(cursor, 'coaches', 'coach_id'), args.coaches - len(coach_ids))
+        sink.write('coaches', COACH_COLUMNS, coaches_data)
+        coach_ids += [c[0] for c in coaches_data]
+
+    court_ids = all_ids(cursor, 'courts', 'court_id')
+    if len(court_ids) < args.courts:
+        print(f"Adding {args.courts - len(court_ids)} courts...")
+        courts_data = generate_courts(rng, next_id(cursor, 'courts', 'court_id'), args.courts - len(court_ids))
+        sink.write('courts', COURT_COLUMNS, courts_data)
+        court_ids += [c[0] for c in courts_data]
+
+    print(f"Adding {args.members} members...")
+    member_ids = all_ids(cursor, 'members', 'member_id')
+    start_member_id = next_id(cursor, 'members', 'member_id')
+    for offset in range(0, args.members, args.chunk_size):
+        members_data = generate_members(rng, start_member_id + offset, min(args.chunk_size, args.members - offset),
+                                        today)
+        sink.write('members', MEMBER_COLUMNS, members_data)
+        member_ids += [m[0] for m in members_data]
+
+    if not (member_ids and coach_ids and court_ids):
+        print("Need at least one member, coach and court before generating bookings")
+        return
+
+    index_sql = []
+    if not args.csv and not args.keep_indexes:
+        # DDL outside a transaction autocommits; open one so a failed load also brings the indexes back
+        if not conn.in_transaction:
+            cursor.execute("BEGIN")
+        index_sql = drop_booking_indexes(cursor)
+
+    print("Generating bookings...")
+    total = 0
+    start_date = today - timedelta(days=args.days)
+    for chunk in generate_bookings(rng, args, next_id(cursor, 'bookings', 'booking_id'),
+                                   member_ids, coach_ids, court_ids, start_date):
+        sink.write('bookings', BOOKING_COLUMNS, chunk)
+        total += len(chunk)
+        if total >= 1000000 and total % 1000000 < len(chunk):
+            print(f"  {total:,} bookings ({total / (time.perf_counter() - started):,.0f}/s)")
+
+    if index_sql:
+        print(f"Rebuilding {len(index_sql)} booking indexes...")
+        for sql in index_sql:
+            cursor.execute(sql)
+
+    sink.close()
+    if not args.csv:
+        bump_data_version(conn)
+        rebuild_rollups(conn)
+        cursor.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+    where = f" to {args.csv}" if args.csv else ""
+    print(f"Done! Added {args.members} members and {total:,} bookings{where} "
+          f"in {time.perf_counter() - started:.1f}s")
+
 
-cursor.execute('SELECT MAX(member_id) FROM members')
-start_member_id = (cursor.fetchone()[0] or 0) + 1
-
-cursor.execute('SELECT MAX(booking_id) FROM bookings')
-start_booking_id = (cursor.fetchone()[0] or 0) + 1
-
-print("Adding 80 members...")
-members_data = []
-for i in range(80):
-    mid = start_member_id + i
-    name = f"{random.choice(first_names)} {random.choice(last_names)}"
-    email = f"{name.lower().replace(' ', '.')}.{mid}@email.com"
-    phone = f"555-{random.randint(1000, 9999)}"
-    tier = random.choice(tiers)
-    days_ago = random.randint(0, 365)
-    join_date = (datetime.now() - timedelta(days=days_ago)).strftime('%Y-%m-%d')
-    members_data.append((mid, name, email, phone, tier, join_date, 'active'))
-
-cursor.executemany('INSERT INTO members VALUES (?,?,?,?,?,?,?)', members_data)
-
-cursor.execute('SELECT member_id FROM members')
-all_members = [r[0] for r in cursor.fetchall()]
-
-cursor.execute('SELECT coach_id FROM coaches')
-all_coaches = [r[0] for r in cursor.fetchall()]
-
-cursor.execute('SELECT court_id FROM courts')
-all_courts = [r[0] for r in cursor.fetchall()]
-
-print("Generating bookings...")
-bid = start_booking_id
-bookings_data = []
-start_date = datetime.now() - timedelta(days=180)
-
-for day in range(180):
-    current_date = start_date + timedelta(days=day)
-    num_bookings = random.randint(2, 8)
-    for _ in range(num_bookings):
-        mid = random.choice(all_members)
-        cid = random.choice(all_coaches)
-        ctid = random.choice(all_courts)
-        lt = random.choice(lesson_types)
-        h = random.randint(8, 19)
-        p = random.randint(35, 90)
-        st = random.choice(['completed', 'cancelled', 'completed', 'completed'])
-        cr = 'weather' if st == 'cancelled' and random.random() > 0.5 else None
-        bdate = current_date.strftime('%Y-%m-%d')
-        bookings_data.append((bid, mid, cid, ctid, lt, bdate, f"{h:02d}:00", f"{h+1:02d}:00", 60, p, st, cr, bdate))
-        bid += 1
-
-sql = 'INSERT INTO bookings VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)'
-cursor.executemany(sql, bookings_data)
-conn.commit()
-conn.close()
-
-print(f"Done! Added {len(members_data)} members and {len(bookings_data)} bookings")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
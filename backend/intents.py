@@ -0,0 +1,539 @@
+"""
+CourtIQ Intent Router
+Answers the common analytics questions from SQL templates, without the model.
+
+A question is routed when an intent's trigger matches and every remaining
+word is either a slot (a period, "top N", a coach, a membership tier or a
+cancellation reason) or a word the intent knows. Anything else, such as
+an unfamiliar qualifier, sends the question to the model as before, so a
+template never answers a question it only half understands.
+
+Slot values are validated (dates, integers, ids and values read from the
+database) and bound into the template as SQL literals, so the resulting
+SQL runs through the usual query guard and result cache and can be shown
+to the user as-is.
+"""
+
+import calendar
+import os
+import re
+import threading
+from datetime import date, timedelta
+
+from schema import DATE_CONTEXT
+
+ENABLED = os.getenv('INTENT_ROUTER', '1').lower() not in ('0', 'false', 'no')
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+# Short follow-ups ("and last month?") lean on the conversation, which templates don't see
+MIN_FOLLOW_UP_WORDS = 4
+
+# Words any intent may contain
+COMMON_WORDS = {
+    "a", "all", "an", "are", "by", "can", "club", "did", "do", "does", "for", "from", "give", "has", "have",
+    "how", "i", "in", "is", "list", "me", "much", "many", "of", "on", "our", "overall", "please", "show", "so",
+    "tell", "the", "to", "top", "total", "us", "was", "we", "were", "what", "what's", "whats", "which", "who",
+    "with", "you",
+}
+
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+
+_WORDS = re.compile(r"[a-z0-9']+")
+
+
+def today():
+    """The date relative periods are measured from; the same one the model is told"""
+    return date.fromisoformat(DATE_CONTEXT)
+
+
+def add_months(day, months):
+    """day moved by a number of calendar months, clamped to the month's length"""
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month_index, 12)
+    return date(year, month + 1, min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def month_range(year, month):
+    start = date(year, month, 1)
+    return start, add_months(start, 1)
+
+
+# Period slot: (pattern, function(match, today) -> (start, end exclusive, label))
+def _named_month(match, now):
+    month = MONTHS[match.group(1)]
+    year = int(match.group(2)) if match.group(2) else (now.year if month <= now.month else now.year - 1)
+    start, end = month_range(year, month)
+    return start, end, f"in {calendar.month_name[month]} {year}"
+
+
+def _year(match, now):
+    year = int(match.group(1))
+    return date(year, 1, 1), date(year + 1, 1, 1), f"in {year}"
+
+
+def _last_n(match, now):
+    count, unit = int(match.group(1)), match.group(2)
+    if unit == "month":
+        start = add_months(now, -count)
+    else:
+        start = now - timedelta(days=count * (7 if unit == "week" else 1))
+    return start, now + timedelta(days=1), f"in the last {count} {unit}{'s' if count != 1 else ''}"
+
+
+def _relative(match, now):
+    which, unit = match.group(1), match.group(2)
+    offset = 0 if which == "this" else -1
+    if unit == "year":
+        start = date(now.year + offset, 1, 1)
+        return start, date(start.year + 1, 1, 1), f"{which} year"
+    if unit == "month":
+        start = add_months(date(now.year, now.month, 1), offset)
+        return start, add_months(start, 1), f"{which} month"
+    start = now - timedelta(days=now.weekday()) + timedelta(weeks=offset)
+    return start, start + timedelta(weeks=1), f"{which} week"
+
+
+def _day(match, now):
+    day = now if match.group(1) == "today" else now - timedelta(days=1)
+    return day, day + timedelta(days=1), match.group(1)
+
+
+def _since(match, now):
+    start = date.fromisoformat(match.group(1))
+    return start, now + timedelta(days=1), f"since {start.isoformat()}"
+
+
+PERIODS = [
+    (re.compile(rf"\b(?:in|during|for|of)\s+(?:the\s+month\s+of\s+)?({MONTH_NAMES})\.?(?:\s+(\d{{4}}))?\b"),
+     _named_month),
+    (re.compile(r"\b(?:in|during|for)\s+(\d{4})\b"), _year),
+    (re.compile(r"\b(?:in\s+|over\s+|during\s+|for\s+)?(?:the\s+)?(?:last|past)\s+(\d{1,3})\s+(day|week|month)s?\b"),
+     _last_n),
+    (re.compile(r"\b(?:in\s+|for\s+|during\s+)?(this|last)\s+(week|month|year)\b"), _relative),
+    (re.compile(r"\b(today|yesterday)\b"), _day),
+    (re.compile(r"\bsince\s+(\d{4}-\d{2}-\d{2})\b"), _since),
+]
+LIMIT = re.compile(r"\b(?:top|first|best)\s+(\d{1,3})\b")
+
+
+class Vocabulary:
+    """Database values slots are matched against: coaches, membership tiers, cancellation reasons"""
+
+    def __init__(self, coaches, tiers, reasons):
+        self.coaches = {}
+        first_names = {}
+        for coach_id, name in coaches:
+            self.coaches[_key(name)] = (coach_id, name)
+            first_names.setdefault(_key(name.split()[0]), []).append((coach_id, name))
+        # A first name only identifies a coach when no other coach shares it
+        for first_name, matches in first_names.items():
+            if len(matches) == 1:
+                self.coaches.setdefault(first_name, matches[0])
+        self.tiers = {_key(tier): tier for tier in tiers}
+        self.reasons = {_key(reason): reason for reason in reasons}
+        self.coach_pattern = _alternatives(self.coaches, prefix=r"(?:coach\s+)?")
+        self.tier_pattern = _alternatives(self.tiers, suffix=r"(?:\s+(?:tier|members?|membership))?")
+        self.reason_pattern = _alternatives(self.reasons)
+
+
+def _key(value):
+    """Lookup form of a value: lower case, with runs of spaces and hyphens as one hyphen"""
+    return re.sub(r"[\s-]+", "-", str(value).lower().strip())
+
+
+def _alternatives(values, prefix="", suffix=""):
+    if not values:
+        return None
+    names = sorted(values, key=len, reverse=True)
+    # Stored values use hyphens ("member-request"); questions may use spaces
+    options = "|".join(re.escape(name).replace(r"\-", r"[\s-]+") for name in names)
+    return re.compile(rf"\b{prefix}({options}){suffix}\b")
+
+
+def extract_slots(text, vocabulary):
+    """(slots, text with the slot phrases removed), or None when a slot appears twice"""
+    slots = {}
+
+    def take(pattern):
+        matches = list(pattern.finditer(text)) if pattern else []
+        if len(matches) > 1:
+            raise ValueError("ambiguous slot")
+        return matches[0] if matches else None
+
+    try:
+        found = [(pattern, handler, take(pattern)) for pattern, handler in PERIODS]
+        found = [(handler, match) for _, handler, match in found if match]
+        if len(found) > 1:
+            return None
+        if found:
+            handler, match = found[0]
+            start, end, label = handler(match, today())
+            slots["period"] = {"start": start.isoformat(), "end": end.isoformat(), "label": label}
+            text = text[:match.start()] + " " + text[match.end():]
+
+        # Reasons before coaches, so "coach unavailable" isn't read as a coach
+        match = take(vocabulary.reason_pattern)
+        if match:
+            slots["reason"] = vocabulary.reasons[_key(match.group(1))]
+            text = text[:match.start()] + " " + text[match.end():]
+
+        match = take(vocabulary.coach_pattern)
+        if match:
+            slots["coach_id"], slots["coach"] = vocabulary.coaches[_key(match.group(1))]
+            text = text[:match.start()] + " " + text[match.end():]
+
+        match = take(vocabulary.tier_pattern)
+        if match:
+            slots["tier"] = vocabulary.tiers[_key(match.group(1))]
+            text = text[:match.start()] + " " + text[match.end():]
+
+        match = take(LIMIT)
+        if match:
+            slots["limit"] = min(MAX_LIMIT, max(1, int(match.group(1))))
+            text = text[:match.start()] + " " + text[match.end():]
+    except (ValueError, KeyError):
+        return None
+    return slots, text
+
+
+def sql_literal(value):
+    """value as a SQLite literal"""
+    if isinstance(value, bool) or value is None:
+        raise ValueError(f"unsupported slot value {value!r}")
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def bind(sql, params):
+    """Replace :name placeholders with literals of the slot values"""
+    return re.sub(r":(\w+)", lambda m: sql_literal(params[m.group(1)]), sql)
+
+
+def money(value):
+    return f"${value or 0:,.2f}"
+
+
+def _period(slots, default=""):
+    return f" {slots['period']['label']}" if "period" in slots else default
+
+
+class Intent:
+    """A known question: trigger, allowed words, SQL template and an answer template"""
+
+    def __init__(self, name, trigger, words, sql, answer, conditions=(), filters=None, requires=()):
+        self.name = name
+        self.trigger = re.compile(trigger)
+        self.words = COMMON_WORDS | set(words.split())
+        self.sql = sql
+        self.answer = answer
+        self.conditions = list(conditions)
+        # slot -> condition added to WHERE when the question has that slot
+        self.filters = filters or {}
+        self.requires = set(requires)
+        self.accepts = set(self.filters) | self.requires | ({"limit"} if ":limit" in sql else set())
+
+    def match(self, question, slots, remainder):
+        """The bound SQL when the question fits this intent, else None"""
+        if not self.trigger.search(question) or not self.requires <= set(slots):
+            return None
+        # Slots the template can't use would silently be ignored, so they rule it out
+        if set(slots) - {"coach"} - self.accepts:
+            return None
+        if any(word not in self.words for word in _WORDS.findall(remainder)):
+            return None
+
+        conditions = self.conditions + [condition for slot, condition in self.filters.items() if slot in slots]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params = {"limit": DEFAULT_LIMIT, **slots}
+        if "period" in slots:
+            params.update(start=slots["period"]["start"], end=slots["period"]["end"])
+        return bind(self.sql.format(where=where), params)
+
+
+def _cancellation_rates(rows, slots):
+    if not rows:
+        return f"No members had at least two bookings{_period(slots)}."
+    lines = [f"- {name}: {cancelled} of {total} bookings cancelled ({rate}%)"
+             for _, name, cancelled, total, rate in rows]
+    return f"Members with the highest cancellation rate{_period(slots)}:\n" + "\n".join(lines)
+
+
+def _lost_revenue(rows, slots):
+    count, lost = rows[0]
+    kind = f"{slots['reason'].replace('-', ' ')} cancellations" if "reason" in slots else "cancellations"
+    coach = f" of {slots['coach']}'s lessons" if "coach" in slots else ""
+    if not count:
+        return f"There were no {kind}{coach}{_period(slots)}, so no revenue was lost."
+    return f"We lost {money(lost)} to {count} {kind}{coach}{_period(slots)}."
+
+
+def _coach_rankings(rows, slots):
+    if not rows:
+        return f"No coached lessons were completed{_period(slots)}."
+    lines = [f"- {name}: {money(revenue)} from {lessons} lessons" for name, lessons, revenue in rows]
+    return f"Coaches by revenue from completed lessons{_period(slots)}:\n" + "\n".join(lines)
+
+
+def _coach_revenue(rows, slots):
+    lessons, revenue = rows[0]
+    return f"{slots['coach']} generated {money(revenue)} from {lessons} completed lessons{_period(slots)}."
+
+
+def _top_members(rows, slots):
+    if not rows:
+        return f"No members had bookings{_period(slots)}."
+    lines = [f"- {name} ({tier}): {count} bookings" for name, tier, count in rows]
+    return f"Top {len(rows)} members by total bookings{_period(slots)}:\n" + "\n".join(lines)
+
+
+def _average_revenue(rows, slots):
+    count, average = rows[0]
+    if not count:
+        return f"There were no completed bookings{_period(slots)}."
+    return f"The average revenue per completed booking{_period(slots)} is {money(average)}, across {count} bookings."
+
+
+def _monthly_revenue(rows, slots):
+    if not rows:
+        return f"There was no completed revenue{_period(slots)}."
+    lines = [f"- {month}: {money(revenue)} from {count} bookings" for month, count, revenue in rows]
+    return f"Revenue by month{_period(slots)}:\n" + "\n".join(lines)
+
+
+def _total_revenue(rows, slots):
+    count, revenue = rows[0]
+    return f"Total revenue from completed bookings{_period(slots, ' to date')} is {money(revenue)} across {count} bookings."
+
+
+def _busiest_courts(rows, slots):
+    if not rows:
+        return f"No courts were booked{_period(slots)}."
+    lines = [f"- {name} ({surface}): {count} bookings" for name, surface, count in rows]
+    return f"Busiest courts{_period(slots)}, excluding cancellations:\n" + "\n".join(lines)
+
+
+def _member_counts(rows, slots):
+    if "tier" in slots:
+        return f"We have {rows[0][0]} {slots['tier']} members."
+    total = sum(count for _, count in rows)
+    return f"We have {total} members:\n" + "\n".join(f"- {tier}: {count}" for tier, count in rows)
+
+
+PERIOD_FILTER = "b.booking_date >= :start AND b.booking_date < :end"
+
+# Tried in order; intents that require a slot come before broader ones
+INTENTS = [
+    Intent(
+        # Only per-member questions: "what is the cancellation rate?" asks for one overall figure
+        "member_cancellation_rate",
+        r"^(?=.*\bcancel\w*\s+rates?\b)(?=.*\b(?:members?|who|which|highest|top)\b)",
+        "members member cancellation cancellations rate rates highest",
+        """SELECT m.member_id, m.name,
+       COUNT(CASE WHEN b.status = 'cancelled' THEN 1 END) AS cancellations,
+       COUNT(*) AS total_bookings,
+       ROUND(100.0 * COUNT(CASE WHEN b.status = 'cancelled' THEN 1 END) / COUNT(*), 2) AS cancellation_rate_pct
+FROM members m
+JOIN bookings b ON m.member_id = b.member_id
+{where}
+GROUP BY m.member_id, m.name
+HAVING COUNT(*) >= 2
+ORDER BY cancellation_rate_pct DESC, total_bookings DESC
+LIMIT :limit""",
+        _cancellation_rates,
+        filters={"period": PERIOD_FILTER, "tier": "m.membership_tier = :tier"},
+    ),
+    Intent(
+        "lost_revenue", r"^(?=.*\b(?:lost|lose|losing|loss|losses)\b)(?=.*\b(?:revenue|money|income|cancel\w*)\b)",
+        "lost lose losing loss losses revenue money income due cancellations cancellation cancelled cancelling because",
+        """SELECT COUNT(*) AS cancelled_bookings, ROUND(COALESCE(SUM(b.price), 0), 2) AS lost_revenue
+FROM bookings b
+{where}""",
+        _lost_revenue,
+        conditions=["b.status = 'cancelled'"],
+        filters={"period": PERIOD_FILTER, "reason": "b.cancellation_reason = :reason",
+                 "coach_id": "b.coach_id = :coach_id"},
+    ),
+    Intent(
+        "coach_revenue", r"\b(?:revenue|earn\w*|generat\w*|money|income|made|make)\b",
+        "revenue earn earned earns generate generated generates money income made make",
+        """SELECT COUNT(*) AS lessons, ROUND(COALESCE(SUM(b.price), 0), 2) AS revenue
+FROM bookings b
+{where}""",
+        _coach_revenue,
+        conditions=["b.status = 'completed'"],
+        filters={"coach_id": "b.coach_id = :coach_id", "period": PERIOD_FILTER},
+        requires=["coach_id"],
+    ),
+    Intent(
+        "top_coaches_by_revenue",
+        r"^(?=.*\bcoach(?:es)?\b)(?=.*\b(?:revenue|earn\w*|generat\w*|money|income)\b)",
+        "coach coaches revenue earn earns earned generate generates generated money income most highest best",
+        """SELECT c.name, COUNT(*) AS lessons, ROUND(SUM(b.price), 2) AS revenue
+FROM bookings b
+JOIN coaches c ON b.coach_id = c.coach_id
+{where}
+GROUP BY c.coach_id, c.name
+ORDER BY revenue DESC
+LIMIT :limit""",
+        _coach_rankings,
+        conditions=["b.status = 'completed'"],
+        filters={"period": PERIOD_FILTER},
+    ),
+    Intent(
+        "top_members_by_bookings", r"^(?=.*\b(?:top|most)\b)(?=.*\bmembers?\b)(?=.*\bbook\w*\b)",
+        "members member bookings booking booked book most number",
+        """SELECT m.name, m.membership_tier, COUNT(*) AS total_bookings
+FROM bookings b
+JOIN members m ON b.member_id = m.member_id
+{where}
+GROUP BY m.member_id, m.name, m.membership_tier
+ORDER BY total_bookings DESC, m.name
+LIMIT :limit""",
+        _top_members,
+        filters={"period": PERIOD_FILTER, "tier": "m.membership_tier = :tier"},
+    ),
+    Intent(
+        "average_booking_revenue",
+        r"^(?=.*\b(?:average|avg|mean)\b)(?=.*\b(?:revenue|price|value)\b)(?=.*\bbookings?\b)",
+        "average avg mean revenue price value per booking bookings each",
+        """SELECT COUNT(*) AS bookings, ROUND(AVG(b.price), 2) AS average_revenue
+FROM bookings b
+{where}""",
+        _average_revenue,
+        conditions=["b.status = 'completed'"],
+        filters={"period": PERIOD_FILTER, "coach_id": "b.coach_id = :coach_id"},
+    ),
+    Intent(
+        "revenue_by_month", r"^(?=.*\brevenue\b)(?=.*\b(?:(?:by|per|each)\s+month|monthly)\b)",
+        "revenue by per each month monthly breakdown",
+        """SELECT strftime('%Y-%m', b.booking_date) AS month, COUNT(*) AS bookings, ROUND(SUM(b.price), 2) AS revenue
+FROM bookings b
+{where}
+GROUP BY month
+ORDER BY month""",
+        _monthly_revenue,
+        conditions=["b.status = 'completed'"],
+        filters={"period": PERIOD_FILTER},
+    ),
+    Intent(
+        "total_revenue", r"\brevenue\b",
+        "revenue earn earned make made generate generated income money",
+        """SELECT COUNT(*) AS bookings, ROUND(COALESCE(SUM(b.price), 0), 2) AS revenue
+FROM bookings b
+{where}""",
+        _total_revenue,
+        conditions=["b.status = 'completed'"],
+        filters={"period": PERIOD_FILTER},
+    ),
+    Intent(
+        "busiest_courts", r"^(?=.*\bcourts?\b)(?=.*\b(?:busiest|popular|most\s+(?:booked|used))\b)",
+        "court courts busiest popular most booked used",
+        """SELECT co.court_name, co.surface_type, COUNT(*) AS bookings
+FROM bookings b
+JOIN courts co ON b.court_id = co.court_id
+{where}
+GROUP BY co.court_id, co.court_name, co.surface_type
+ORDER BY bookings DESC
+LIMIT :limit""",
+        _busiest_courts,
+        conditions=["b.status != 'cancelled'"],
+        filters={"period": PERIOD_FILTER},
+    ),
+    Intent(
+        "member_counts", r"^(?=.*\bmembers?\b)(?=.*\b(?:how\s+many|count|number)\b)",
+        "members member count number tier tiers membership per each",
+        """SELECT membership_tier, COUNT(*) AS members
+FROM members
+GROUP BY membership_tier
+ORDER BY members DESC""",
+        _member_counts,
+    ),
+    Intent(
+        "tier_member_count", r"^(?=.*\bmembers?\b)(?=.*\b(?:how\s+many|count|number)\b)",
+        "members member count number",
+        """SELECT COUNT(*) AS members
+FROM members
+{where}""",
+        _member_counts,
+        filters={"tier": "membership_tier = :tier"},
+        requires=["tier"],
+    ),
+]
+
+
+class Match:
+    """A routed question: the intent, its slots and the bound SQL"""
+
+    def __init__(self, intent, slots, sql):
+        self.intent = intent
+        self.slots = slots
+        self.sql = sql
+
+    def answer(self, rows):
+        """Plain-text answer for the template's result rows"""
+        return self.intent.answer(rows, self.slots)
+
+
+class IntentRouter:
+    """Matches questions to INTENTS using slot vocabulary loaded from the database"""
+
+    def __init__(self, connect, schema, version, intents=INTENTS):
+        self._connect = connect
+        self._schema = schema
+        self._version = version
+        self.intents = intents
+        self._lock = threading.Lock()
+        self._vocabulary = None
+        self._vocabulary_key = None
+        self._hits = {}
+        self._misses = 0
+
+    def vocabulary(self):
+        """Slot vocabulary for the current data and schema version"""
+        schema = self._schema()
+        key = (self._version(), schema.hash)
+        with self._lock:
+            if self._vocabulary_key == key:
+                return self._vocabulary
+        with self._connect() as conn:
+            coaches = conn.execute("SELECT coach_id, name FROM coaches WHERE name IS NOT NULL").fetchall()
+        vocabulary = Vocabulary(coaches, schema.values.get(("members", "membership_tier"), []),
+                                schema.values.get(("bookings", "cancellation_reason"), []))
+        with self._lock:
+            self._vocabulary, self._vocabulary_key = vocabulary, key
+        return vocabulary
+
+    def route(self, question, conversation_history=None):
+        """Match for a question, or None when the model should translate it"""
+        match = self._route(question, conversation_history)
+        with self._lock:
+            if match is None:
+                self._misses += 1
+            else:
+                self._hits[match.intent.name] = self._hits.get(match.intent.name, 0) + 1
+        return match
+
+    def _route(self, question, conversation_history):
+        text = " ".join(question.lower().replace("\u2019", "'").replace("?", " ").split())
+        if conversation_history and len(text.split()) < MIN_FOLLOW_UP_WORDS:
+            return None
+        extracted = extract_slots(text, self.vocabulary())
+        if extracted is None:
+            return None
+        slots, remainder = extracted
+        for intent in self.intents:
+            sql = intent.match(text, slots, remainder)
+            if sql is not None:
+                return Match(intent, slots, sql)
+        return None
+
+    def stats(self):
+        """Hit counts per intent and the share of questions answered without the model"""
+        with self._lock:
+            hits = sum(self._hits.values())
+            total = hits + self._misses
+            return {"hits": hits, "misses": self._misses, "hit_ratio": round(hits / total, 4) if total else 0.0,
+                    "by_intent": dict(self._hits)}
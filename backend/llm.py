@@ -0,0 +1,380 @@
+"""
+CourtIQ LLM Calls
+Deadlines, retries, hedging and a circuit breaker around Anthropic calls.
+
+Every model call names its pipeline stage and gets that stage's deadline,
+which covers all of its attempts. Transient failures (connection errors,
+timeouts, 429, 5xx and 529 overloaded) are retried with full-jitter
+exponential backoff while the deadline allows; anything else is raised
+straight away. The SDK's own retries are turned off so the two policies
+don't multiply.
+
+With LLM_HEDGE=1, a create() that is still running after the stage's
+recent p95 latency is sent a second time and the first response wins.
+Hedging doubles the cost of the slowest calls, so it is off by default.
+
+Consecutive transient failures open a circuit breaker shared by every
+client in the process: calls then fail fast with CircuitOpen until a
+cooldown has passed and one trial call gets through. Callers catch
+LLMUnavailable and fall back to a cached or template answer.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+
+from anthropic import APIConnectionError
+
+# Seconds a stage may spend on one call, retries included
+DEFAULT_DEADLINE_SECONDS = float(os.getenv('LLM_DEADLINE_SECONDS', 30))
+DEADLINES = {
+    "sql_generation": float(os.getenv('LLM_SQL_DEADLINE_SECONDS', 20)),
+    "answer_generation": float(os.getenv('LLM_ANSWER_DEADLINE_SECONDS', 30)),
+    "test_api": float(os.getenv('LLM_TEST_DEADLINE_SECONDS', 10)),
+}
+MAX_ATTEMPTS = int(os.getenv('LLM_MAX_ATTEMPTS', 3))
+BACKOFF_BASE_SECONDS = float(os.getenv('LLM_BACKOFF_BASE_SECONDS', 0.25))
+BACKOFF_MAX_SECONDS = float(os.getenv('LLM_BACKOFF_MAX_SECONDS', 4))
+
+HEDGE_ENABLED = os.getenv('LLM_HEDGE', '0').lower() in ('1', 'true', 'yes')
+# Hedge only once a stage has this many recent latencies, and never sooner than HEDGE_MIN_SECONDS
+HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', 20))
+HEDGE_MIN_SECONDS = float(os.getenv('LLM_HEDGE_MIN_SECONDS', 0.5))
+LATENCY_WINDOW = int(os.getenv('LLM_LATENCY_WINDOW', 200))
+HEDGE_THREADS = int(os.getenv('LLM_HEDGE_THREADS', 32))
+
+BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', 5))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv('LLM_BREAKER_COOLDOWN_SECONDS', 30))
+
+# Retried besides every 5xx (529 is the API's "overloaded"); 409 is its lock timeout
+TRANSIENT_STATUS = (408, 409, 429)
+
+
+class LLMUnavailable(Exception):
+    """The model could not answer within its deadline; fall back to a cached or template answer"""
+
+
+class CircuitOpen(LLMUnavailable):
+    """The circuit breaker is open, so the call was not attempted"""
+
+
+def is_transient(error):
+    """Whether a failed call is worth retrying"""
+    # APITimeoutError is a subclass of APIConnectionError
+    if isinstance(error, (APIConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in TRANSIENT_STATUS or status >= 500)
+
+
+def deadline_for(stage):
+    return DEADLINES.get(stage, DEFAULT_DEADLINE_SECONDS)
+
+
+def backoff(attempt):
+    """Full-jitter exponential backoff before retry number attempt"""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive transient failures
+
+    While open every call is rejected; once cooldown seconds have passed
+    one trial call is let through (half-open) and its outcome closes or
+    reopens the circuit.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._opens = 0
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if self._probing or time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        """Whether a call may go ahead now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._opened_at is None and self._failures >= self.failure_threshold:
+                self._opens += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def release(self):
+        """A call that was let through ended without saying anything about the upstream"""
+        with self._lock:
+            self._probing = False
+
+    def stats(self):
+        """State and counters for /health"""
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self._failures, "opens": self._opens}
+
+
+# Shared by every client in the process: they all talk to the same upstream
+upstream_breaker = CircuitBreaker()
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_THREADS, thread_name_prefix="courtiq-llm-hedge")
+
+
+class _Policy:
+    """Deadlines, retry decisions, latency windows and counters shared by the sync and async clients"""
+
+    def __init__(self, name, client, breaker, max_attempts, hedge):
+        self.name = name
+        self.client = client
+        self.breaker = breaker
+        self.max_attempts = max_attempts
+        self.hedge = hedge
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._counts = {}
+
+    def _count(self, stage, result):
+        with self._lock:
+            counts = self._counts.setdefault(stage, {})
+            counts[result] = counts.get(result, 0) + 1
+
+    def _observe(self, stage, seconds):
+        with self._lock:
+            self._latencies.setdefault(stage, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def p95(self, stage):
+        """95th percentile of the stage's recent successful call latencies, or None"""
+        with self._lock:
+            samples = sorted(self._latencies.get(stage, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def hedge_delay(self, stage, remaining):
+        """Seconds to wait before sending a second request, or None to send just one"""
+        if not self.hedge or self.breaker.state != "closed":
+            return None
+        with self._lock:
+            if len(self._latencies.get(stage, ())) < HEDGE_MIN_SAMPLES:
+                return None
+        delay = max(self.p95(stage), HEDGE_MIN_SECONDS)
+        return delay if delay < remaining else None
+
+    def _admit(self, stage, deadline):
+        """Seconds left for the next attempt; raises when the breaker or the deadline says no"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self._count(stage, "failed")
+            raise LLMUnavailable(f"{stage}: deadline exceeded")
+        if not self.breaker.allow():
+            self._count(stage, "rejected")
+            raise CircuitOpen(f"{stage}: circuit open after repeated upstream failures")
+        return remaining
+
+    def _after_failure(self, stage, attempt, error, deadline):
+        """Seconds to back off before retrying; raises when the call should give up"""
+        if not is_transient(error):
+            # The upstream answered; the request itself was bad
+            self.breaker.record_success()
+            self._count(stage, "error")
+            raise error
+        self.breaker.record_failure()
+        delay = backoff(attempt)
+        if attempt >= self.max_attempts or time.monotonic() + delay >= deadline:
+            self._count(stage, "failed")
+            raise LLMUnavailable(f"{stage}: {type(error).__name__}: {error}") from error
+        self._count(stage, "retried")
+        return delay
+
+    def _succeeded(self, stage):
+        self.breaker.record_success()
+        self._count(stage, "ok")
+
+    def stats(self):
+        """Per-stage call outcomes and p95 latency for /health"""
+        with self._lock:
+            stages = {stage: dict(counts) for stage, counts in self._counts.items()}
+        for stage, counts in stages.items():
+            p95 = self.p95(stage)
+            counts["p95_ms"] = round(p95 * 1000, 1) if p95 is not None else None
+        return stages
+
+
+class ResilientClient(_Policy):
+    """messages.create / messages.stream of a sync Anthropic client under the call policy"""
+
+    def __init__(self, client, name="sync", breaker=upstream_breaker, max_attempts=MAX_ATTEMPTS,
+                 hedge=HEDGE_ENABLED):
+        super().__init__(name, client, breaker, max_attempts, hedge)
+
+    def create(self, stage, **kwargs):
+        """client.messages.create(**kwargs) within the stage's deadline"""
+        deadline = time.monotonic() + deadline_for(stage)
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = self._admit(stage, deadline)
+            try:
+                message = self._attempt(stage, kwargs, remaining)
+            except Exception as e:
+                time.sleep(self._after_failure(stage, attempt, e, deadline))
+                continue
+            self._succeeded(stage)
+            return message
+
+    def _timed_create(self, stage, kwargs, timeout):
+        started = time.monotonic()
+        message = self.client.messages.create(timeout=timeout, **kwargs)
+        self._observe(stage, time.monotonic() - started)
+        return message
+
+    def _attempt(self, stage, kwargs, remaining):
+        delay = self.hedge_delay(stage, remaining)
+        if delay is None:
+            return self._timed_create(stage, kwargs, remaining)
+
+        deadline = time.monotonic() + remaining
+        first = _hedge_executor.submit(self._timed_create, stage, kwargs, remaining)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        self._count(stage, "hedged")
+        second = _hedge_executor.submit(self._timed_create, stage, kwargs, deadline - time.monotonic())
+        pending, error = {first, second}, None
+        # The loser keeps running in its thread until its own timeout; sync HTTP calls can't be cancelled
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"{stage}: no response within {remaining:.1f}s")
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count(stage, "hedge_won")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    @contextmanager
+    def stream(self, stage, **kwargs):
+        """client.messages.stream(**kwargs), retried until the stream opens
+
+        Once text is flowing a failure can't be retried without repeating
+        it, so it is raised to the caller.
+        """
+        deadline = time.monotonic() + deadline_for(stage)
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = self._admit(stage, deadline)
+            manager = self.client.messages.stream(timeout=remaining, **kwargs)
+            try:
+                stream = manager.__enter__()
+            except Exception as e:
+                time.sleep(self._after_failure(stage, attempt, e, deadline))
+                continue
+            break
+
+        try:
+            yield stream
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                # The caller stopped reading (say, the client disconnected)
+                self.breaker.release()
+            elif is_transient(e):
+                self.breaker.record_failure()
+                self._count(stage, "failed")
+            else:
+                self.breaker.record_success()
+                self._count(stage, "error")
+            if not manager.__exit__(type(e), e, e.__traceback__):
+                raise
+        else:
+            self._succeeded(stage)
+            manager.__exit__(None, None, None)
+
+
+class AsyncResilientClient(_Policy):
+    """messages.create of an async Anthropic client under the call policy"""
+
+    def __init__(self, client, name="async", breaker=upstream_breaker, max_attempts=MAX_ATTEMPTS,
+                 hedge=HEDGE_ENABLED):
+        super().__init__(name, client, breaker, max_attempts, hedge)
+
+    async def create(self, stage, **kwargs):
+        """await client.messages.create(**kwargs) within the stage's deadline"""
+        deadline = time.monotonic() + deadline_for(stage)
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = self._admit(stage, deadline)
+            try:
+                message = await self._attempt(stage, kwargs, remaining)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                await asyncio.sleep(self._after_failure(stage, attempt, e, deadline))
+                continue
+            self._succeeded(stage)
+            return message
+
+    async def _timed_create(self, stage, kwargs, timeout):
+        started = time.monotonic()
+        message = await self.client.messages.create(timeout=timeout, **kwargs)
+        self._observe(stage, time.monotonic() - started)
+        return message
+
+    async def _attempt(self, stage, kwargs, remaining):
+        delay = self.hedge_delay(stage, remaining)
+        first = asyncio.ensure_future(self._timed_create(stage, kwargs, remaining))
+        tasks = [first]
+        try:
+            deadline = time.monotonic() + remaining
+            done, _ = await asyncio.wait(tasks, timeout=remaining if delay is None else delay)
+            if done:
+                return first.result()
+            if delay is None:
+                raise TimeoutError(f"{stage}: no response within {remaining:.1f}s")
+            self._count(stage, "hedged")
+            tasks.append(asyncio.ensure_future(self._timed_create(stage, kwargs, deadline - time.monotonic())))
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError(f"{stage}: no response within {remaining:.1f}s")
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            self._count(stage, "hedge_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
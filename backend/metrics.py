@@ -0,0 +1,324 @@
+"""
+CourtIQ Metrics
+In-process counters and histograms exported in Prometheus text format,
+plus optional structured per-request trace logs.
+
+Each worker process keeps its own registry, so scrape every worker (or
+run one) for complete numbers. Set COURTIQ_TRACE_LOG=1 to print one JSON
+line per request with its stage timings, token counts and row counts.
+"""
+
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+TRACE_LOG = os.getenv('COURTIQ_TRACE_LOG', '').lower() in ('1', 'true', 'yes')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _label_text(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base for a named metric with a fixed set of label names"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_label_text(self.labelnames, key)} {_number(value)}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Mirror a monotonic count that is maintained elsewhere"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    def _render_sample(self, key, state):
+        counts, count, total = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _label_text(self.labelnames, key, [("le", _number(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _label_text(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_number(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+request_seconds = register(Histogram(
+    "courtiq_request_seconds", "HTTP request latency by endpoint", ("endpoint", "method", "status")))
+stage_seconds = register(Histogram(
+    "courtiq_stage_seconds", "Time spent in one pipeline stage or admin query", ("stage",)))
+query_rows = register(Histogram(
+    "courtiq_query_rows", "Rows returned by a query", ("stage",), buckets=ROW_BUCKETS))
+llm_tokens = register(Counter(
+    "courtiq_llm_tokens_total", "Tokens reported by the Anthropic API", ("stage", "model", "kind")))
+llm_call_seconds = register(Histogram(
+    "courtiq_llm_call_seconds", "Model call latency, retries included, by stage and model", ("stage", "model")))
+llm_cutoffs = register(Counter(
+    "courtiq_llm_max_tokens_total", "Model responses cut off by max_tokens, by stage and model", ("stage", "model")))
+sql_repairs = register(Counter(
+    "courtiq_sql_repairs_total", "Failed SQL sent back to the model for a fix, by whether the fix ran", ("result",)))
+cache_lookups = register(Counter(
+    "courtiq_cache_lookups_total", "Cache lookups in this worker by cache and result", ("cache", "result")))
+cache_hit_ratio = register(Gauge(
+    "courtiq_cache_hit_ratio", "Hit ratio of each cache in this worker", ("cache",)))
+cache_entries = register(Gauge(
+    "courtiq_cache_entries", "Entries stored in each cache", ("cache",)))
+rate_limit_decisions = register(Counter(
+    "courtiq_rate_limit_decisions_total", "Rate limit checks by route group, tier and result",
+    ("route", "tier", "result")))
+intent_routes = register(Counter(
+    "courtiq_intent_router_total", "Questions answered from an intent template (hit) or sent to the model (miss)",
+    ("intent", "result")))
+prewarm_answers = register(Counter(
+    "courtiq_prewarm_answers_total",
+    "Prewarmed suggested-question answers served, reused after a data change, or regenerated", ("result",)))
+rendered_answers = register(Counter(
+    "courtiq_answer_renderer_total",
+    "Answers phrased locally, each saving a model call (rendered, by shape), or left to the model (deferred, by reason)",
+    ("result", "reason")))
+flight_calls = register(Counter(
+    "courtiq_singleflight_calls_total",
+    "Calls that ran the pipeline (leader) or shared an identical in-flight call's result (follower)",
+    ("flight", "role")))
+flights_in_flight = register(Gauge(
+    "courtiq_singleflight_in_flight", "Distinct calls currently running in each single-flight group", ("flight",)))
+llm_calls = register(Counter(
+    "courtiq_llm_calls_total",
+    "Anthropic calls by client, stage and outcome (ok, retried, failed, error, rejected, hedged, hedge_won)",
+    ("client", "stage", "result")))
+llm_circuit_open = register(Gauge(
+    "courtiq_llm_circuit_open", "1 while the LLM circuit breaker is open or half-open, else 0"))
+db_pool_gauge = register(Gauge(
+    "courtiq_db_pool_connections", "Pooled SQLite connections by pool and state", ("pool", "state")))
+
+
+def render():
+    """Every registered metric in Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Per-request trace: stage timings and counts collected while the request runs
+_trace = contextvars.ContextVar("courtiq_trace", default=None)
+
+
+def start_trace(method, path, request_id=None):
+    """Begin collecting a trace for the current request"""
+    trace = {
+        "request_id": request_id or uuid.uuid4().hex[:16],
+        "method": method,
+        "path": path,
+        "started": time.perf_counter(),
+        "stages": [],
+        "tokens": {},
+        "rows": None,
+    }
+    _trace.set(trace)
+    return trace
+
+
+def annotate(key, value):
+    """Attach a value to the current trace, if any"""
+    trace = _trace.get()
+    if trace is not None:
+        trace[key] = value
+
+
+def end_trace(endpoint, status):
+    """Record the request's latency and print its trace when trace logging is on"""
+    trace = _trace.get()
+    if trace is None:
+        return
+    _trace.set(None)
+    elapsed = time.perf_counter() - trace.pop("started")
+    request_seconds.observe(elapsed, endpoint=endpoint, method=trace["method"], status=status)
+    if TRACE_LOG:
+        trace.update(endpoint=endpoint, status=status, duration_ms=round(elapsed * 1000, 3))
+        print(json.dumps(trace, default=str), file=sys.stderr, flush=True)
+
+
+@contextmanager
+def timed_stage(stage):
+    """Time a block into courtiq_stage_seconds and the current trace"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=stage)
+        trace = _trace.get()
+        if trace is not None:
+            trace["stages"].append({"stage": stage, "ms": round(elapsed * 1000, 3)})
+
+
+@contextmanager
+def timed_llm_call(stage, model):
+    """timed_stage for a model call, also recorded by model in courtiq_llm_call_seconds"""
+    started = time.perf_counter()
+    try:
+        with timed_stage(stage):
+            yield
+    finally:
+        llm_call_seconds.observe(time.perf_counter() - started, stage=stage, model=model)
+
+
+def record_llm_response(stage, model, message):
+    """Token usage of a model response, and whether it was cut off by max_tokens"""
+    record_tokens(stage, getattr(message, "usage", None), model)
+    if getattr(message, "stop_reason", None) == "max_tokens":
+        llm_cutoffs.inc(stage=stage, model=model)
+        annotate("max_tokens_cutoff", stage)
+
+
+def record_tokens(stage, usage, model="unknown"):
+    """Count input, output and prompt-cache tokens from an Anthropic response's usage"""
+    if usage is None:
+        return
+    counts = {
+        "input": getattr(usage, "input_tokens", 0) or 0,
+        "output": getattr(usage, "output_tokens", 0) or 0,
+        "cache_read": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        "cache_write": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+    }
+    for kind, count in counts.items():
+        llm_tokens.inc(count, stage=stage, model=model, kind=kind)
+    trace = _trace.get()
+    if trace is not None:
+        totals = trace["tokens"].setdefault(stage, {"model": model, **dict.fromkeys(counts, 0)})
+        for kind, count in counts.items():
+            totals[kind] += count
+
+
+def record_rows(stage, count):
+    """Observe a query's row count"""
+    query_rows.observe(count, stage=stage)
+    annotate("rows", count)
+
+
+def update_cache_gauges(caches):
+    """Refresh cache gauges from {name: PersistentCache}"""
+    for name, cache in caches.items():
+        stats = cache.stats()
+        cache_lookups.set_total(stats["hits"], cache=name, result="hit")
+        cache_lookups.set_total(stats["misses"], cache=name, result="miss")
+        cache_hit_ratio.set(stats["hit_ratio"], cache=name)
+        cache_entries.set(stats["entries"], cache=name)
+
+
+def update_flight_metrics(flights):
+    """Refresh single-flight counters from SingleFlight / AsyncSingleFlight groups"""
+    for flight in flights:
+        stats = flight.stats()
+        flight_calls.set_total(stats["leaders"], flight=flight.name, role="leader")
+        flight_calls.set_total(stats["followers"], flight=flight.name, role="follower")
+        flights_in_flight.set(stats["in_flight"], flight=flight.name)
+
+
+def update_llm_metrics(clients, breaker):
+    """Refresh LLM call counters from ResilientClient / AsyncResilientClient and the circuit breaker"""
+    for client in clients:
+        for stage, counts in client.stats().items():
+            for result, count in counts.items():
+                if result != "p95_ms":
+                    llm_calls.set_total(count, client=client.name, stage=stage, result=result)
+    llm_circuit_open.set(0 if breaker.state == "closed" else 1)
+
+
+def update_pool_gauges(stats):
+    """Refresh pool gauges from db.pool_stats()"""
+    for pool, values in stats.items():
+        for state in ("open", "in_use", "idle"):
+            db_pool_gauge.set(values[state], pool=pool, state=state)
@@ -0,0 +1,159 @@
+"""
+CourtIQ Schema Migrations
+Versioned, idempotent schema changes applied at startup.
+
+The applied version is kept in SQLite's PRAGMA user_version. Run
+`python migrations.py` to migrate courtiq.db by hand, or
+`python migrations.py --check` to verify the hot queries use their indexes;
+test_migrations.py compares their plans on a fresh database before and after.
+"""
+
+import sys
+
+from rollups import ensure_rollups
+
+
+def normalize_dates(conn):
+    """Store dates as plain YYYY-MM-DD text so range predicates can use indexes"""
+    conn.execute("""
+                 UPDATE bookings SET booking_date = date(booking_date)
+                 WHERE date(booking_date) IS NOT NULL AND booking_date != date(booking_date)
+                 """)
+    conn.execute("""
+                 UPDATE members SET join_date = date(join_date)
+                 WHERE date(join_date) IS NOT NULL AND join_date != date(join_date)
+                 """)
+    # Keep later writes in the same form whichever path they come from
+    conn.execute("""
+                 CREATE TRIGGER IF NOT EXISTS bookings_normalize_date AFTER INSERT ON bookings
+                 WHEN date(NEW.booking_date) IS NOT NULL AND NEW.booking_date != date(NEW.booking_date)
+                 BEGIN
+                     UPDATE bookings SET booking_date = date(NEW.booking_date) WHERE booking_id = NEW.booking_id;
+                 END
+                 """)
+
+
+def add_booking_indexes(conn):
+    """Covering indexes for the admin queries and common generated SQL"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_date_status_price ON bookings (booking_date, status, price)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_member_status ON bookings (member_id, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_coach_date ON bookings (coach_id, booking_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_court_date ON bookings (court_id, booking_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_members_status ON members (status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_members_join_date ON members (join_date)")
+
+
+def add_listing_indexes(conn):
+    """Indexes matching the keyset order of the admin listings, alone and per filter"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_listing ON bookings (booking_date, start_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_status_listing ON bookings (status, booking_date, start_time)")
+    # The coach and court indexes gain start_time so a filtered listing needs no sort
+    conn.execute("DROP INDEX IF EXISTS idx_bookings_coach_date")
+    conn.execute("DROP INDEX IF EXISTS idx_bookings_court_date")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_coach_listing ON bookings (coach_id, booking_date, start_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_court_listing ON bookings (court_id, booking_date, start_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_members_tier_join_date ON members (membership_tier, join_date)")
+
+
+def drop_date_trigger(conn):
+    """Drop the date trigger; it slowed bulk inserts as bookings grew, so writers normalise dates instead"""
+    conn.execute("DROP TRIGGER IF EXISTS bookings_normalize_date")
+
+
+# (version, description, function). Append only; never renumber.
+MIGRATIONS = [
+    (1, "normalize stored dates", normalize_dates),
+    (2, "booking and member indexes", add_booking_indexes),
+    (3, "booking rollup tables", ensure_rollups),
+    (4, "keyset listing indexes", add_listing_indexes),
+    (5, "drop booking date trigger", drop_date_trigger),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# (description, query, index the plan must use)
+PLAN_CHECKS = [
+    ("bookings in a date range",
+     "SELECT SUM(price) FROM bookings WHERE booking_date >= '2025-12-01' AND status = 'completed'",
+     "idx_bookings_date_status_price"),
+    ("a member's bookings by status",
+     "SELECT COUNT(*) FROM bookings WHERE member_id = 1 AND status = 'cancelled'",
+     "idx_bookings_member_status"),
+    ("a coach's bookings over time",
+     "SELECT booking_date, price FROM bookings WHERE coach_id = 1 AND booking_date >= '2025-12-01'",
+     "idx_bookings_coach_listing"),
+    ("a court's bookings over time",
+     "SELECT COUNT(*) FROM bookings WHERE court_id = 1 AND booking_date >= '2025-12-01'",
+     "idx_bookings_court_listing"),
+    ("bookings listing page",
+     "SELECT * FROM bookings WHERE (booking_date, start_time, booking_id) < ('2025-12-10', '10:00', 5) "
+     "ORDER BY booking_date DESC, start_time DESC, booking_id DESC LIMIT 101",
+     "idx_bookings_listing"),
+    ("members listing page by tier",
+     "SELECT * FROM members WHERE membership_tier = 'Premium' AND (join_date, member_id) < ('2025-01-01', 10) "
+     "ORDER BY join_date DESC, member_id DESC LIMIT 101",
+     "idx_members_tier_join_date"),
+    ("active member count",
+     "SELECT COUNT(*) FROM members WHERE status = 'active'",
+     "idx_members_status"),
+]
+
+
+def schema_version(conn):
+    """Migration version the database is at"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn):
+    """Apply every pending migration in one transaction; returns the versions applied"""
+    if not conn.in_transaction:
+        # Take the write lock before reading the version so concurrent workers don't race
+        conn.execute("BEGIN IMMEDIATE")
+
+    current = schema_version(conn)
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version > current:
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            applied.append(version)
+
+    if applied:
+        conn.execute("ANALYZE")
+    return applied
+
+
+def explain(conn, sql):
+    """Detail lines of EXPLAIN QUERY PLAN for a query"""
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+
+
+def check_query_plans(conn):
+    """Hot queries whose plan no longer uses the expected index, as (description, plan) pairs"""
+    failures = []
+    for description, sql, index in PLAN_CHECKS:
+        plan = explain(conn, sql)
+        if not any(index in line for line in plan):
+            failures.append((description, plan))
+    return failures
+
+
+if __name__ == "__main__":
+    from db import write_connection
+
+    with write_connection() as conn:
+        before = {description: explain(conn, sql) for description, sql, _ in PLAN_CHECKS}
+        applied = apply_migrations(conn)
+        print(f"✓ Schema at version {schema_version(conn)} (applied: {applied or 'none'})")
+
+        if "--check" in sys.argv:
+            failures = check_query_plans(conn)
+            for description, sql, index in PLAN_CHECKS:
+                status = "✗" if any(f[0] == description for f in failures) else "✓"
+                print(f"{status} {description}")
+                if applied:
+                    # On an already migrated database there is no "before" to show
+                    print(f"    before: {'; '.join(before[description])}")
+                print(f"    after:  {'; '.join(explain(conn, sql))}")
+            if failures:
+                sys.exit(1)
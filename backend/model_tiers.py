@@ -0,0 +1,84 @@
+"""
+CourtIQ Model Tiers
+Which model each pipeline stage calls, and how many tokens it may write.
+
+SQL generation and ordinary answers go to the fast tier. The large tier
+is kept for repairing SQL that failed to run and for narrating long or
+truncated results. max_tokens is sized from the output a stage expects
+instead of a flat 1000: a query needs a few hundred tokens at most, and
+an answer grows with the rows it describes.
+
+LLM_FAST_MODEL and LLM_LARGE_MODEL name the tiers' models, and
+LLM_STAGE_TIERS (a JSON object) moves any route to another tier or
+straight to a model id, e.g. {"sql_generation": "large"}.
+"""
+
+import json
+import os
+
+FAST_MODEL = os.getenv('LLM_FAST_MODEL', 'claude-3-5-haiku-20241022')
+LARGE_MODEL = os.getenv('LLM_LARGE_MODEL', 'claude-sonnet-4-20250514')
+TIERS = {"fast": FAST_MODEL, "large": LARGE_MODEL}
+
+# Route -> tier (or model id)
+DEFAULT_STAGE_TIERS = {
+    "sql_generation": "fast",
+    "sql_repair": "large",
+    "answer_generation": "fast",
+    "long_answer": "large",
+    "test_api": "fast",
+}
+STAGE_TIERS = {**DEFAULT_STAGE_TIERS, **json.loads(os.getenv('LLM_STAGE_TIERS') or '{}')}
+
+SQL_MAX_TOKENS = int(os.getenv('LLM_SQL_MAX_TOKENS', 500))
+SQL_REPAIR_MAX_TOKENS = int(os.getenv('LLM_SQL_REPAIR_MAX_TOKENS', 800))
+# An answer gets ANSWER_BASE_TOKENS plus ANSWER_TOKENS_PER_ROW for each result row, up to ANSWER_MAX_TOKENS
+ANSWER_BASE_TOKENS = int(os.getenv('LLM_ANSWER_BASE_TOKENS', 200))
+ANSWER_TOKENS_PER_ROW = int(os.getenv('LLM_ANSWER_TOKENS_PER_ROW', 30))
+ANSWER_MAX_TOKENS = int(os.getenv('LLM_ANSWER_MAX_TOKENS', 1000))
+# Results with more rows than this (or truncated ones) are narrated by the long_answer route
+LONG_RESULT_ROWS = int(os.getenv('LLM_LONG_RESULT_ROWS', 25))
+TEST_MAX_TOKENS = 100
+
+
+def model_for(route):
+    """Model id for a route, resolving tier names"""
+    tier = STAGE_TIERS.get(route, "large")
+    return TIERS.get(tier, tier)
+
+
+class ModelRoute:
+    """Stage (for deadlines and metrics), model and max_tokens of one model call"""
+
+    def __init__(self, stage, route, max_tokens):
+        self.stage = stage
+        self.route = route
+        self.model = model_for(route)
+        self.max_tokens = max_tokens
+
+    def params(self):
+        """model and max_tokens arguments for messages.create / messages.stream"""
+        return {"model": self.model, "max_tokens": self.max_tokens}
+
+
+def sql_route(repair=False):
+    """Route for translating a question, or for fixing a translation that failed to run"""
+    if repair:
+        return ModelRoute("sql_repair", "sql_repair", SQL_REPAIR_MAX_TOKENS)
+    return ModelRoute("sql_generation", "sql_generation", SQL_MAX_TOKENS)
+
+
+def answer_route(row_count, truncated=False):
+    """Route for narrating row_count result rows"""
+    long_result = truncated or row_count > LONG_RESULT_ROWS
+    max_tokens = min(ANSWER_MAX_TOKENS, ANSWER_BASE_TOKENS + ANSWER_TOKENS_PER_ROW * row_count)
+    return ModelRoute("answer_generation", "long_answer" if long_result else "answer_generation", max_tokens)
+
+
+def test_route():
+    return ModelRoute("test_api", "test_api", TEST_MAX_TOKENS)
+
+
+def describe():
+    """Tier models and the model each route resolves to, for /health"""
+    return {"tiers": dict(TIERS), "routes": {route: model_for(route) for route in STAGE_TIERS}}
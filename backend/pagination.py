@@ -0,0 +1,117 @@
+"""
+CourtIQ Listing Pagination
+Keyset (cursor) pagination and filters for the admin listings.
+
+A page is fetched with `WHERE (k1, k2, k3) < (last values)` ordered by
+the same keys descending, so every page is an index range scan no matter
+how deep the client has scrolled. The cursor is the last row's key
+values, base64-encoded.
+"""
+
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+TOTAL_COUNT_HEADER = 'X-Total-Count'
+
+
+class InvalidPageRequest(ValueError):
+    """Raised for an unusable cursor, limit or filter value"""
+
+
+def encode_cursor(values):
+    """Opaque cursor for a row's key values"""
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, key_count):
+    """Key values from a cursor produced by encode_cursor"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise InvalidPageRequest("Invalid cursor")
+    if not isinstance(values, list) or len(values) != key_count:
+        raise InvalidPageRequest("Invalid cursor")
+    return values
+
+
+def parse_page_args(args):
+    """(limit, cursor token, include_total) from request args"""
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise InvalidPageRequest("limit must be an integer")
+    if limit < 1:
+        raise InvalidPageRequest("limit must be positive")
+    include_total = args.get('include_total', '').lower() in ('1', 'true', 'yes')
+    return min(limit, MAX_PAGE_SIZE), args.get('cursor'), include_total
+
+
+def parse_filters(args, filter_specs):
+    """SQL conditions and parameters for the filters present in request args.
+
+    filter_specs maps an argument name to (condition with one ?, converter).
+    """
+    conditions = []
+    params = []
+    for name, (condition, convert) in filter_specs.items():
+        value = args.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            params.append(convert(value))
+        except ValueError:
+            raise InvalidPageRequest(f"Invalid value for {name}")
+        conditions.append(condition)
+    return conditions, params
+
+
+def fetch_page(cursor, select_sql, from_sql, conditions, params, keys, limit, cursor_token=None,
+               include_total=False):
+    """Fetch one page in descending key order.
+
+    keys is a list of (sql expression, result column) pairs that together
+    identify a row uniquely. Returns (rows as dicts, next cursor or None,
+    total matching rows or None).
+    """
+    total = None
+    if include_total:
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor.execute(f"SELECT COUNT(*) FROM {from_sql} {where}", params)
+        total = cursor.fetchone()[0]
+
+    conditions = list(conditions)
+    params = list(params)
+    if cursor_token:
+        key_exprs = ", ".join(expr for expr, _ in keys)
+        placeholders = ", ".join("?" for _ in keys)
+        conditions.append(f"({key_exprs}) < ({placeholders})")
+        params.extend(decode_cursor(cursor_token, len(keys)))
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order = ", ".join(f"{expr} DESC" for expr, _ in keys)
+    cursor.execute(f"SELECT {select_sql} FROM {from_sql} {where} ORDER BY {order} LIMIT ?", params + [limit + 1])
+
+    columns = [desc[0] for desc in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][column] for _, column in keys])
+    return rows, next_cursor, total
+
+
+def page_headers(next_cursor, total):
+    """Response headers describing the page"""
+    headers = {}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    if total is not None:
+        headers[TOTAL_COUNT_HEADER] = str(total)
+    return headers
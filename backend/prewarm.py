@@ -0,0 +1,124 @@
+"""
+CourtIQ Prewarmed Answers
+Suggested questions answered ahead of time and served straight from a store.
+
+Nearly every visitor clicks one of the questions the frontend suggests,
+so a background thread in each worker computes their SQL, results and
+answers at startup and again whenever the data version changes, keeping
+the finished answers in the shared cache database. A refresh reuses the
+stored SQL and re-runs it, and only asks the model for a new answer when
+the results actually changed.
+
+The questions default to App.js's exampleQuestions; set PREWARM_QUESTIONS
+to a JSON list to change them, or PREWARM=0 to turn prewarming off.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+from cache import normalize_question
+
+ENABLED = os.getenv('PREWARM', '1').lower() not in ('0', 'false', 'no')
+# Seconds between data version checks
+INTERVAL_SECONDS = float(os.getenv('PREWARM_INTERVAL_SECONDS', 15))
+
+DEFAULT_QUESTIONS = [
+    "Which members have the highest cancellation rate?",
+    "How much revenue did we lose to weather cancellations in December?",
+    "Which coaches generate the most revenue?",
+    "Show me the top 5 members by total bookings",
+    "What's the average revenue per booking?",
+]
+
+
+def load_questions():
+    """Questions from PREWARM_QUESTIONS, falling back to DEFAULT_QUESTIONS"""
+    raw = os.getenv('PREWARM_QUESTIONS')
+    return json.loads(raw) if raw else DEFAULT_QUESTIONS
+
+
+class Prewarmer:
+    """Keeps the answers to a fixed list of questions current in a store
+
+    compute(question, previous) returns the answer entry for a question,
+    given the entry computed for the previous data version (or None).
+    """
+
+    def __init__(self, questions, store, compute, version, interval=INTERVAL_SECONDS):
+        self.questions = {normalize_question(question): question for question in questions}
+        self._store = store
+        self._compute = compute
+        self._version = version
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._refreshed_version = None
+        self._served = 0
+        self._refreshes = 0
+        self._failures = 0
+
+    def _key(self, normalized):
+        return f"prewarm:{normalized}"
+
+    def lookup(self, question):
+        """The stored entry for a suggested question, if it is current; None otherwise"""
+        normalized = normalize_question(question)
+        if normalized not in self.questions:
+            return None
+        entry = self._store.get(self._key(normalized))
+        if entry is None or entry["data_version"] != self._version():
+            return None
+        with self._lock:
+            self._served += 1
+        return entry
+
+    def refresh(self):
+        """Bring every stored answer up to the current data version"""
+        version = self._version()
+        for normalized, question in self.questions.items():
+            previous = self._store.get(self._key(normalized))
+            if previous is not None and previous["data_version"] == version:
+                continue
+            try:
+                entry = self._compute(question, previous)
+            except Exception as e:
+                with self._lock:
+                    self._failures += 1
+                print(f"Prewarming {question!r} failed: {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+            if entry is not None:
+                entry["data_version"] = version
+                self._store.set(self._key(normalized), entry)
+        with self._lock:
+            self._refreshed_version = version
+            self._refreshes += 1
+
+    def _run(self):
+        while True:
+            try:
+                if self._version() != self._refreshed_version:
+                    self.refresh()
+            except Exception as e:
+                print(f"Prewarm refresh failed: {type(e).__name__}: {e}", file=sys.stderr)
+            time.sleep(self._interval)
+
+    def ensure_started(self):
+        """Start this process's refresh thread (again after a fork)"""
+        pid = os.getpid()
+        if self._thread_pid == pid:
+            return
+        with self._lock:
+            if self._thread_pid != pid:
+                self._thread = threading.Thread(target=self._run, name="courtiq-prewarm", daemon=True)
+                self._thread.start()
+                self._thread_pid = pid
+
+    def stats(self):
+        """Counters for /health"""
+        with self._lock:
+            return {"questions": len(self.questions), "served": self._served, "refreshes": self._refreshes,
+                    "failures": self._failures, "data_version": self._refreshed_version}
@@ -0,0 +1,142 @@
+"""
+CourtIQ Query Guard
+Checks and limits applied to model-generated SQL before and while it runs.
+
+A query must be one read-only SELECT over the schema's tables. Its plan
+is rejected when the nested full-table scans would visit more than
+QUERY_MAX_PLAN_ROWS rows, it is interrupted after QUERY_TIMEOUT_SECONDS,
+and at most QUERY_MAX_ROWS rows are returned.
+"""
+
+import os
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+MAX_ROWS = int(os.getenv('QUERY_MAX_ROWS', 1000))
+TIMEOUT_SECONDS = float(os.getenv('QUERY_TIMEOUT_SECONDS', 5))
+MAX_PLAN_ROWS = int(os.getenv('QUERY_MAX_PLAN_ROWS', 50_000_000))
+# SQLite VM instructions between deadline checks
+PROGRESS_STEPS = 10000
+
+# Comments and string literals, which may contain ';' or keywords
+_LITERALS = re.compile(r"--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"", re.S)
+_TABLE_REFS = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?|,\s*(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.I)
+_SCAN = re.compile(r"^SCAN (\w+)")
+_CTE_NAMES = re.compile(r"(?:\bWITH(?:\s+RECURSIVE)?|,)\s*(\w+)\s*(?:\([^()]*\))?\s*AS\s*\(", re.I)
+
+ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+
+class QueryRejected(Exception):
+    """Raised when a query fails a guard check"""
+
+
+class QueryTimeout(QueryRejected):
+    """Raised when a query runs past its deadline"""
+
+
+def check_statement(sql):
+    """The query without trailing semicolons; raises QueryRejected unless it is a single SELECT"""
+    sql = sql.strip().rstrip(";").strip()
+    bare = _LITERALS.sub(" ", sql)
+    if ";" in bare:
+        raise QueryRejected("Only a single statement is allowed")
+    if not re.match(r"\s*(SELECT|WITH)\b", bare, re.I):
+        raise QueryRejected("Only SELECT queries are allowed")
+    return sql
+
+
+def table_sizes(conn, tables):
+    """Approximate row count of each table, from its largest rowid"""
+    sizes = {}
+    for table in tables:
+        try:
+            sizes[table] = conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+        except sqlite3.OperationalError:
+            sizes[table] = 0
+    return sizes
+
+
+def estimate_scanned_rows(conn, sql, sizes):
+    """Rows visited by the plan's full scans, multiplying scans nested in the same loop"""
+    aliases = {}
+    for match in _TABLE_REFS.finditer(_LITERALS.sub(" ", sql)):
+        table, alias = (match.group(1), match.group(2)) if match.group(1) else (match.group(3), match.group(4))
+        if table.lower() in sizes:
+            aliases[table.lower()] = table.lower()
+            if alias:
+                aliases[alias.lower()] = table.lower()
+
+    loops = defaultdict(lambda: 1)
+    for _, parent, _, detail in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall():
+        match = _SCAN.match(detail)
+        if match and match.group(1).lower() in aliases:
+            loops[parent] *= max(1, sizes[aliases[match.group(1).lower()]])
+    return max(loops.values(), default=0)
+
+
+@contextmanager
+def guarded(conn, allowed_tables, deadline):
+    """Restrict conn to reading allowed_tables and interrupt it after deadline"""
+    allowed = {table.lower() for table in allowed_tables}
+
+    def authorize(action, arg1, arg2, dbname, source):
+        if action in ALLOWED_ACTIONS:
+            return sqlite3.SQLITE_OK
+        if action == sqlite3.SQLITE_READ and (arg1 or '').lower() in allowed:
+            return sqlite3.SQLITE_OK
+        return sqlite3.SQLITE_DENY
+
+    conn.set_authorizer(authorize)
+    conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
+    try:
+        yield conn
+    finally:
+        conn.set_authorizer(None)
+        conn.set_progress_handler(None, 0)
+
+
+def translate_error(error, timeout):
+    """QueryRejected for an error raised by a guard, else the error itself"""
+    message = str(error)
+    if "not authorized" in message or "prohibited" in message:
+        return QueryRejected("Query reads a table or runs an operation that is not allowed")
+    if "interrupted" in message:
+        return QueryTimeout(f"Query exceeded {timeout:g}s")
+    return error
+
+
+@contextmanager
+def guarded_cursor(conn, sql, allowed_tables, timeout=TIMEOUT_SECONDS, max_plan_rows=MAX_PLAN_ROWS):
+    """Cursor executing generated SQL, with the guards active until the block ends"""
+    sql = check_statement(sql)
+    sizes = table_sizes(conn, allowed_tables)
+    # SQLite reports reads of a WITH clause's own tables too
+    readable = set(allowed_tables) | set(_CTE_NAMES.findall(_LITERALS.sub(" ", sql)))
+    deadline = time.monotonic() + timeout
+    with guarded(conn, readable, deadline):
+        cursor = conn.cursor()
+        try:
+            scanned = estimate_scanned_rows(conn, sql, sizes)
+            if scanned > max_plan_rows:
+                raise QueryRejected(f"Query would scan about {scanned:,} rows (limit {max_plan_rows:,})")
+            cursor.execute(sql)
+            yield cursor
+        except sqlite3.DatabaseError as e:
+            raise translate_error(e, timeout)
+        finally:
+            cursor.close()
+
+
+def run_guarded_query(conn, sql, allowed_tables, max_rows=MAX_ROWS, timeout=TIMEOUT_SECONDS,
+                      max_plan_rows=MAX_PLAN_ROWS):
+    """Run generated SQL under every guard; returns (rows, column names, truncated)"""
+    with guarded_cursor(conn, sql, allowed_tables, timeout, max_plan_rows) as cursor:
+        rows = cursor.fetchmany(max_rows + 1)
+        column_names = [desc[0] for desc in cursor.description]
+
+    truncated = len(rows) > max_rows
+    return rows[:max_rows], column_names, truncated
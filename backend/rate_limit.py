@@ -0,0 +1,227 @@
+"""
+CourtIQ Rate Limiting
+Token-bucket quotas per route group and caller tier, kept in memory or in
+a SQLite file shared by every worker on the host.
+
+A quota of "5/hour" is a bucket holding 5 tokens that refills at 5 per
+hour; each request takes one token. Quotas are configured with
+RATE_LIMIT_QUOTAS as JSON, e.g.
+
+    {"demo": {"ask": "5/hour", "rows": "30/hour"}, "pro": {"ask": "200/hour"}, "internal": {}}
+
+A route group missing from a tier's quotas is unlimited for that tier.
+Callers are on the "demo" tier unless they send an X-API-Key listed in
+RATE_LIMIT_API_KEYS ("key:tier,key:tier").
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from cache import CACHE_DB_PATH
+
+BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'sqlite')
+RATE_LIMIT_DB_PATH = os.getenv('COURTIQ_RATE_LIMIT_DB', CACHE_DB_PATH)
+# Idle buckets are swept every this many hits
+EVICT_EVERY = int(os.getenv('RATE_LIMIT_EVICT_EVERY', 1000))
+
+DEFAULT_TIER = 'demo'
+DEFAULT_QUOTAS = {
+    'demo': {'ask': '5/hour', 'rows': '30/hour'},
+    'pro': {'ask': '200/hour', 'rows': '1000/hour'},
+    'internal': {},
+}
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+class Quota:
+    """limit requests per period seconds"""
+
+    def __init__(self, limit, period):
+        if limit < 1 or period <= 0:
+            raise ValueError("a quota needs a positive limit and period")
+        self.limit = limit
+        self.period = period
+        self.rate = limit / period
+
+    @classmethod
+    def parse(cls, spec):
+        """Quota from "5/hour", "100/minute" or "10/30" (seconds)"""
+        count, _, per = str(spec).partition('/')
+        per = per.strip().lower().rstrip('s') or 'hour'
+        period = PERIODS[per] if per in PERIODS else float(per)
+        return cls(int(count), period)
+
+    def describe(self, noun="requests"):
+        """The quota in words, e.g. 5 requests per hour"""
+        if self.limit == 1:
+            noun = noun.rstrip('s')
+        unit = next((name for name, seconds in PERIODS.items() if seconds == self.period), None)
+        return f"{self.limit} {noun} per {unit or f'{self.period:g} seconds'}"
+
+    def __repr__(self):
+        return f"Quota({self.limit}/{self.period}s)"
+
+
+def _take(tokens, updated_at, now, quota):
+    """Refill a bucket to now and try to take one token: (allowed, tokens left, retry after seconds)"""
+    tokens = min(quota.limit, tokens + (now - updated_at) * quota.rate)
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / quota.rate
+
+
+class MemoryBackend:
+    """Buckets in a dict; limits apply per worker process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def hit(self, key, quota, now):
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (quota.limit, now))
+            allowed, tokens, retry_after = _take(tokens, updated_at, now, quota)
+            self._buckets[key] = (tokens, now)
+        return allowed, retry_after
+
+    def evict(self, now, idle_seconds):
+        with self._lock:
+            idle = [key for key, (_, updated_at) in self._buckets.items() if now - updated_at >= idle_seconds]
+            for key in idle:
+                del self._buckets[key]
+        return len(idle)
+
+    def size(self):
+        with self._lock:
+            return len(self._buckets)
+
+
+class SQLiteBackend:
+    """Buckets in a SQLite table so every worker enforces the same limit"""
+
+    def __init__(self, path=None):
+        self.path = path or RATE_LIMIT_DB_PATH
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def hit(self, key, quota, now):
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front so two workers can't spend the same token
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM rate_limit_buckets WHERE key=?", (key,)).fetchone()
+            tokens, updated_at = row if row else (quota.limit, now)
+            allowed, tokens, retry_after = _take(tokens, updated_at, now, quota)
+            conn.execute("INSERT OR REPLACE INTO rate_limit_buckets VALUES (?, ?, ?)", (key, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+    def evict(self, now, idle_seconds):
+        return self._conn().execute("DELETE FROM rate_limit_buckets WHERE updated_at <= ?",
+                                    (now - idle_seconds,)).rowcount
+
+    def size(self):
+        return self._conn().execute("SELECT COUNT(*) FROM rate_limit_buckets").fetchone()[0]
+
+
+BACKENDS = {'memory': MemoryBackend, 'sqlite': SQLiteBackend}
+
+
+class RateLimiter:
+    """Quota lookup and bookkeeping on top of a bucket backend"""
+
+    def __init__(self, backend, quotas, default_tier=DEFAULT_TIER):
+        self.backend = backend
+        self.default_tier = default_tier
+        self.quotas = {
+            tier: {route: Quota.parse(spec) for route, spec in routes.items() if spec}
+            for tier, routes in quotas.items()
+        }
+        # A bucket untouched for its longest period is full again, so dropping it changes nothing
+        periods = [quota.period for routes in self.quotas.values() for quota in routes.values()]
+        self.idle_seconds = max(periods, default=3600)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._limited = 0
+        self._evictions = 0
+
+    def quota(self, route, tier):
+        """Quota for a route group and tier, or None when unlimited"""
+        routes = self.quotas.get(tier, self.quotas.get(self.default_tier, {}))
+        return routes.get(route)
+
+    def hit(self, route, identity, tier=None):
+        """Spend one request for identity; returns (allowed, seconds until the next one is allowed)"""
+        tier = tier or self.default_tier
+        quota = self.quota(route, tier)
+        if quota is None:
+            return True, 0.0
+
+        now = time.time()
+        allowed, retry_after = self.backend.hit(f"{route}:{tier}:{identity}", quota, now)
+        with self._lock:
+            self._hits += 1
+            if not allowed:
+                self._limited += 1
+            sweep = self._hits % EVICT_EVERY == 0
+        if sweep:
+            evicted = self.backend.evict(now, self.idle_seconds)
+            with self._lock:
+                self._evictions += evicted
+        return allowed, retry_after
+
+    def stats(self):
+        """Counters for /health"""
+        with self._lock:
+            counters = {"hits": self._hits, "limited": self._limited, "evictions": self._evictions}
+        return {"backend": type(self.backend).__name__, "keys": self.backend.size(), **counters}
+
+
+def load_quotas():
+    """Quotas from RATE_LIMIT_QUOTAS, falling back to DEFAULT_QUOTAS"""
+    raw = os.getenv('RATE_LIMIT_QUOTAS')
+    return json.loads(raw) if raw else DEFAULT_QUOTAS
+
+
+def load_api_keys():
+    """API key -> tier from RATE_LIMIT_API_KEYS"""
+    keys = {}
+    for entry in os.getenv('RATE_LIMIT_API_KEYS', '').split(','):
+        key, _, tier = entry.strip().partition(':')
+        if key and tier:
+            keys[key] = tier
+    return keys
+
+
+API_KEY_TIERS = load_api_keys()
+
+
+def tier_for_api_key(api_key):
+    """Tier of a caller's API key, or the default tier"""
+    return API_KEY_TIERS.get(api_key or '', DEFAULT_TIER)
+
+
+rate_limiter = RateLimiter(BACKENDS[BACKEND](), load_quotas())
@@ -1,10 +1,19 @@
 import os
+import sqlite3
 import subprocess
 
-# Remove old database
-if os.path.exists('courtiq.db'):
-    os.remove('courtiq.db')
+DB_FILE = 'courtiq.db'
+
+# Remove old database, folding its WAL back in first and then deleting the
+# -wal/-shm files too, so a stale log is never replayed onto the new one
+if os.path.exists(DB_FILE):
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
     print("Old database removed")
+for path in (DB_FILE, DB_FILE + '-wal', DB_FILE + '-shm'):
+    if os.path.exists(path):
+        os.remove(path)
 
 # Run setup to create fresh database
 subprocess.run(['python3', 'setup_database.py'])
@@ -0,0 +1,137 @@
+"""
+CourtIQ Result Formatting
+Text tables for the answer prompt, bounded by a token budget, and
+row streams for clients that want every row.
+
+Results that don't fit the budget are summarised as head and tail rows
+plus per-column statistics, so the model still sees the shape of the
+data without the prompt growing with the row count.
+"""
+
+import json
+import os
+from collections import Counter
+
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_RESULT_TOKEN_BUDGET', 2000))
+# Rough characters per token for budgeting; errs on the generous side
+CHARS_PER_TOKEN = 4
+STREAM_BATCH_SIZE = 500
+# Shortest a long value is cut to when one or two rows are over the budget
+MIN_CELL_CHARS = 20
+# Longest value quoted in the column statistics
+STATS_VALUE_CHARS = 60
+
+
+def _clip(text, max_chars):
+    return text if max_chars is None or len(text) <= max_chars else text[:max_chars] + "..."
+
+
+def _cell(value, max_chars=None):
+    return "NULL" if value is None else _clip(str(value), max_chars)
+
+
+def _row_line(row, max_cell=None):
+    return " | ".join(_cell(value, max_cell) for value in row)
+
+
+def _header(column_names):
+    line = " | ".join(column_names)
+    return f"\n{line}\n{'-' * len(line)}\n"
+
+
+def format_table(rows, column_names):
+    """Every row as a pipe-separated text table"""
+    if not rows:
+        return "No results found."
+    return _header(column_names) + "".join(_row_line(row) + "\n" for row in rows)
+
+
+def column_stats(rows, column_names):
+    """Count, nulls and min/max/mean (numbers) or distinct/top values (text) per column"""
+    stats = []
+    for i, name in enumerate(column_names):
+        values = [row[i] for row in rows if row[i] is not None]
+        line = f"{name}: {len(values)} values, {len(rows) - len(values)} NULL"
+        numbers = [v for v in values if isinstance(v, (int, float))]
+        if numbers and len(numbers) == len(values):
+            line += (f", min {min(numbers)}, max {max(numbers)}, mean {sum(numbers) / len(numbers):.2f}, "
+                     f"sum {sum(numbers):.2f}")
+        elif values:
+            counts = Counter(_clip(str(v), STATS_VALUE_CHARS) for v in values)
+            top = ", ".join(f"{value} ({count})" for value, count in counts.most_common(3))
+            line += f", {len(counts)} distinct, most common: {top}"
+        stats.append(line)
+    return "\n".join(stats)
+
+
+def summarize_for_prompt(rows, column_names, token_budget=PROMPT_TOKEN_BUDGET):
+    """The full table when it fits token_budget, otherwise head and tail rows plus column statistics.
+
+    One or two rows can't be split into head and tail, so their long values are shortened instead."""
+    if not rows:
+        return "No results found."
+
+    header = _header(column_names)
+    lines = [_row_line(row) for row in rows]
+    table_chars = len(header) + sum(len(line) + 1 for line in lines)
+    if table_chars // CHARS_PER_TOKEN < token_budget:
+        return header + "\n".join(lines) + "\n"
+
+    stats = f"\nColumn statistics over all {len(rows)} rows:\n{column_stats(rows, column_names)}\n"
+    budget_chars = token_budget * CHARS_PER_TOKEN
+    if len(lines) <= 2:
+        room = budget_chars - len(header) - len(stats)
+        max_cell = max(MIN_CELL_CHARS, room // (len(rows) * max(1, len(column_names))) - 6)
+        return header + "\n".join(_row_line(row, max_cell) for row in rows) + "\n" + stats
+
+    average_line = max(1, (table_chars - len(header)) // len(lines))
+    keep = max(1, min((len(lines) - 1) // 2, (budget_chars - len(header) - len(stats)) // (2 * average_line)))
+    while True:
+        head, tail = lines[:keep], lines[-keep:]
+        omitted = len(lines) - 2 * keep
+        summary = "".join([header, "\n".join(head), f"\n... {omitted} more rows not shown ...\n",
+                           "\n".join(tail), "\n", stats])
+        # Row lengths vary, so shrink until the estimate holds
+        if len(summary) <= budget_chars or keep == 1:
+            return summary
+        keep = max(1, keep * 9 // 10)
+
+
+def _bounded_batches(cursor, max_rows, batch_size, outcome):
+    """Batches from cursor.fetchmany until max_rows; sets outcome's row_count and truncated"""
+    remaining = max_rows
+    while True:
+        # Asking for one row past the limit tells us whether anything was cut off
+        batch = cursor.fetchmany(min(batch_size, remaining + 1))
+        if not batch:
+            return
+        if len(batch) > remaining:
+            outcome["truncated"] = True
+            batch = batch[:remaining]
+        remaining -= len(batch)
+        outcome["row_count"] += len(batch)
+        if batch:
+            yield batch
+        if outcome["truncated"]:
+            return
+
+
+def iter_ndjson_rows(cursor, column_names, max_rows, batch_size=STREAM_BATCH_SIZE):
+    """NDJSON lines: the columns, one JSON array per row, then the row count"""
+    yield json.dumps({"columns": column_names}) + "\n"
+    outcome = {"row_count": 0, "truncated": False}
+    for batch in _bounded_batches(cursor, max_rows, batch_size, outcome):
+        yield "".join(json.dumps(row, default=str) + "\n" for row in batch)
+    yield json.dumps(outcome) + "\n"
+
+
+def iter_columnar_batches(cursor, column_names, max_rows, batch_size=STREAM_BATCH_SIZE):
+    """NDJSON lines: the columns, one object of column arrays per batch, then the row count"""
+    yield json.dumps({"columns": column_names}) + "\n"
+    outcome = {"row_count": 0, "truncated": False}
+    for batch in _bounded_batches(cursor, max_rows, batch_size, outcome):
+        yield json.dumps({"data": [list(column) for column in zip(*batch)]}, default=str) + "\n"
+    yield json.dumps(outcome) + "\n"
+
+
+ROW_STREAMS = {"ndjson": iter_ndjson_rows, "columnar": iter_columnar_batches}
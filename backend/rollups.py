@@ -0,0 +1,172 @@
+"""
+CourtIQ Booking Rollups
+Daily and monthly aggregates of bookings that back the admin dashboard.
+
+Both tables hold one row per (period, status, lesson_type, coach, court)
+with the number of bookings and the summed price. A missing coach is
+stored as coach_id 0 and missing text values as '' so every key column
+can be part of the primary key.
+"""
+
+import sqlite3
+import sys
+from collections import defaultdict
+from datetime import date
+from functools import lru_cache
+
+ROLLUP_TABLES = {
+    "rollup_daily": "day",
+    "rollup_monthly": "month",
+}
+
+BOOKING_COLUMNS = "booking_date, status, lesson_type, coach_id, court_id, price"
+
+
+def create_rollup_tables(conn):
+    """Create the rollup tables if they don't exist yet"""
+    for table, period in ROLLUP_TABLES.items():
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                {period} TEXT NOT NULL,
+                status TEXT NOT NULL,
+                lesson_type TEXT NOT NULL,
+                coach_id INTEGER NOT NULL,
+                court_id INTEGER NOT NULL,
+                bookings INTEGER NOT NULL,
+                revenue REAL NOT NULL,
+                PRIMARY KEY ({period}, status, lesson_type, coach_id, court_id)
+            ) WITHOUT ROWID
+        """)
+
+
+def rebuild_rollups(conn):
+    """Recompute both rollup tables from the bookings table"""
+    create_rollup_tables(conn)
+    conn.execute("DELETE FROM rollup_daily")
+    conn.execute("DELETE FROM rollup_monthly")
+    conn.execute("""
+        INSERT INTO rollup_daily
+        SELECT COALESCE(date(booking_date), booking_date), COALESCE(status, ''), COALESCE(lesson_type, ''),
+               COALESCE(coach_id, 0), court_id, COUNT(*), SUM(price)
+        FROM bookings
+        GROUP BY 1, 2, 3, 4, 5
+    """)
+    conn.execute("""
+        INSERT INTO rollup_monthly
+        SELECT substr(day, 1, 7), status, lesson_type, coach_id, court_id, SUM(bookings), SUM(revenue)
+        FROM rollup_daily
+        GROUP BY 1, 2, 3, 4, 5
+    """)
+    conn.execute("INSERT OR REPLACE INTO courtiq_meta VALUES ('rollups_built', datetime('now'))")
+
+
+def ensure_rollups(conn):
+    """Build the rollups once for a database that doesn't have them yet"""
+    create_rollup_tables(conn)
+    built = conn.execute("SELECT 1 FROM courtiq_meta WHERE key='rollups_built'").fetchone()
+    if built is None:
+        rebuild_rollups(conn)
+
+
+@lru_cache(maxsize=8192)
+def normalize_date(value):
+    """YYYY-MM-DD form of a date or timestamp; unparseable values are returned as given"""
+    try:
+        return date.fromisoformat(str(value)[:10]).isoformat()
+    except ValueError:
+        return value
+
+
+def apply_bookings(conn, bookings, sign=1):
+    """Add (sign=1) or remove (sign=-1) bookings from the rollups in the caller's transaction"""
+    apply_booking_rows(conn, ((booking['booking_date'], booking.get('status'), booking.get('lesson_type'),
+                               booking.get('coach_id'), booking['court_id'], booking['price'])
+                              for booking in bookings), sign)
+
+
+def apply_booking_rows(conn, rows, sign=1):
+    """apply_bookings for (booking_date, status, lesson_type, coach_id, court_id, price) tuples"""
+    daily = defaultdict(lambda: [0, 0.0])
+    for day, status, lesson_type, coach_id, court_id, price in rows:
+        # Same normalisation as rebuild_rollups so incremental and full builds agree
+        totals = daily[(normalize_date(day), status or '', lesson_type or '', coach_id or 0, court_id)]
+        totals[0] += sign
+        totals[1] += sign * float(price)
+
+    monthly = defaultdict(lambda: [0, 0.0])
+    for (day, *rest), (count, revenue) in daily.items():
+        totals = monthly[(day[:7], *rest)]
+        totals[0] += count
+        totals[1] += revenue
+
+    for table, totals in (("rollup_daily", daily), ("rollup_monthly", monthly)):
+        period = ROLLUP_TABLES[table]
+        rows = [(*key, count, revenue) for key, (count, revenue) in totals.items()]
+        conn.executemany(f"""
+            INSERT INTO {table} VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT ({period}, status, lesson_type, coach_id, court_id) DO UPDATE SET
+                bookings = bookings + excluded.bookings,
+                revenue = revenue + excluded.revenue
+        """, rows)
+        conn.execute(f"DELETE FROM {table} WHERE bookings <= 0")
+
+
+def apply_booking(conn, booking, sign=1):
+    """Single-booking form of apply_bookings"""
+    apply_bookings(conn, [booking], sign)
+
+
+def fetch_booking(conn, booking_id):
+    """The fields of a stored booking that the rollups need, or None"""
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute(f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE booking_id=?", (booking_id,))
+    row = cursor.fetchone()
+    return dict(row) if row else None
+
+
+def dashboard_stats(conn):
+    """Booking figures for /admin/stats, read from the monthly rollup"""
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT SUM(revenue) FROM rollup_monthly WHERE status='completed'")
+    total_revenue = cursor.fetchone()[0] or 0
+
+    cursor.execute("""
+                   SELECT SUM(bookings), SUM(CASE WHEN status='completed' THEN revenue ELSE 0 END)
+                   FROM rollup_monthly
+                   WHERE month = strftime('%Y-%m', 'now')
+                   """)
+    bookings_this_month, revenue_this_month = cursor.fetchone()
+
+    return {
+        "total_revenue": total_revenue,
+        "bookings_this_month": bookings_this_month or 0,
+        "revenue_this_month": revenue_this_month or 0
+    }
+
+
+def revenue_by_day(conn, days):
+    """Completed revenue per day over the last `days` days, from the daily rollup"""
+    cursor = conn.cursor()
+    cursor.execute("""
+                   SELECT day, SUM(CASE WHEN status='completed' THEN revenue ELSE 0 END) as revenue
+                   FROM rollup_daily
+                   WHERE day >= DATE ('now', '-' || ? || ' days')
+                   GROUP BY day
+                   ORDER BY day
+                   """, (days,))
+    return cursor.fetchall()
+
+
+if __name__ == "__main__":
+    if "--rebuild" not in sys.argv:
+        print("Usage: python rollups.py --rebuild")
+        sys.exit(1)
+
+    from db import write_connection
+
+    with write_connection() as conn:
+        rebuild_rollups(conn)
+        days = conn.execute("SELECT COUNT(DISTINCT day) FROM rollup_daily").fetchone()[0]
+    print(f"✓ Rollups rebuilt for {days} days")
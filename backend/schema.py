@@ -0,0 +1,177 @@
+"""
+CourtIQ Schema Introspection
+The schema block sent to the model, generated from the database itself.
+
+Tables, columns, foreign keys, row counts and the values of enum-like
+columns are read once and kept until the database schema changes (a
+migration or any other DDL moves PRAGMA schema_version / user_version).
+Row counts are given to an order of magnitude and enum values in sorted
+order, so the text stays the same as rows come and go (and across workers
+and restarts). It is sent as a system block marked for Anthropic prompt
+caching; note the API only caches blocks of at least 1024 tokens (2048 on
+Haiku), so a small schema is sent uncached. The schema hash, which keys
+the translation cache, covers only the structure: tables, columns, types
+and foreign keys.
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+
+# Bookkeeping tables the model should neither see nor query
+INTERNAL_TABLE_PREFIXES = ('sqlite_', 'rollup_', 'courtiq_')
+# A column is listed with its values when it has at most this many distinct ones
+ENUM_MAX_DISTINCT = int(os.getenv('SCHEMA_ENUM_MAX_DISTINCT', 8))
+# Seconds between checks of the schema version
+CHECK_INTERVAL_SECONDS = float(os.getenv('SCHEMA_CHECK_SECONDS', 30))
+DATE_CONTEXT = os.getenv('SCHEMA_DATE_CONTEXT', '2026-01-02')
+
+SQL_INSTRUCTIONS = ("You are a SQL expert for a tennis club database. Generate ONLY the SQL query needed to "
+                    "answer the question. No explanation, no markdown, just the query.")
+
+
+def schema_signature(conn):
+    """Changes whenever the database schema or the migration version does"""
+    schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+    return schema_version, user_version
+
+
+def user_tables(conn):
+    """Names of the club data tables, in creation order"""
+    names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY rowid")]
+    return [name for name in names if not name.lower().startswith(INTERNAL_TABLE_PREFIXES)]
+
+
+def approximate_count(count):
+    """Row count to the nearest power of ten, so inserts and deletes rarely change the text"""
+    if count < 10:
+        return "fewer than 10"
+    return f"about {10 ** round(math.log10(count)):,}"
+
+
+def enum_values(conn, table, column, row_count):
+    """Distinct values of a low-cardinality column in sorted order, or None"""
+    rows = conn.execute(
+        f'SELECT DISTINCT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL '
+        f'ORDER BY "{column}" LIMIT ?', (ENUM_MAX_DISTINCT + 1,)).fetchall()
+    # Require repeats so names and other unique values on small tables aren't mistaken for enums
+    if not rows or len(rows) > ENUM_MAX_DISTINCT or len(rows) * 2 > row_count:
+        return None
+    return [row[0] for row in rows]
+
+
+def _may_be_enum(column_type, name, is_key):
+    return not is_key and column_type in ('TEXT', 'INTEGER') and not name.endswith(('_id', '_at', '_date'))
+
+
+def introspect(conn):
+    """Tables with their columns, foreign keys, row counts and enum values"""
+    tables = []
+    for table in user_tables(conn):
+        row_count = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        foreign_keys = {row[3]: f"{row[2]}.{row[4]}"
+                        for row in conn.execute(f'PRAGMA foreign_key_list("{table}")')}
+        columns = []
+        for _, name, column_type, notnull, _, pk in conn.execute(f'PRAGMA table_info("{table}")'):
+            column_type = (column_type or 'TEXT').upper()
+            values = None
+            if _may_be_enum(column_type, name, pk or name in foreign_keys):
+                values = enum_values(conn, table, name, row_count)
+            columns.append({
+                "name": name,
+                "type": column_type,
+                "primary_key": bool(pk),
+                "references": foreign_keys.get(name),
+                "nullable": not notnull and not pk,
+                "values": values,
+            })
+        tables.append({"name": table, "row_count": row_count, "columns": columns})
+    return tables
+
+
+def _column_line(column):
+    details = [column["type"]]
+    if column["primary_key"]:
+        details.append("PRIMARY KEY")
+    if column["references"]:
+        details.append(f"FOREIGN KEY -> {column['references']}")
+        if column["nullable"]:
+            details.append("nullable")
+    if column["values"]:
+        details[0] += ": " + ", ".join(str(value) for value in column["values"])
+    return f"- {column['name']} ({', '.join(details)})"
+
+
+def structure(tables):
+    """Tables and columns without anything read from the data, for the schema hash"""
+    return [[table["name"], [[column["name"], column["type"], column["primary_key"], column["references"],
+                              column["nullable"]] for column in table["columns"]]] for table in tables]
+
+
+def render_schema(tables, date_context=DATE_CONTEXT):
+    """The schema block in the layout the prompts have always used"""
+    parts = ["Database Schema for CourtIQ (Tennis Club Analytics):"]
+    for table in tables:
+        lines = [f"TABLE: {table['name']} ({approximate_count(table['row_count'])} rows)"]
+        lines.extend(_column_line(column) for column in table["columns"])
+        parts.append("\n".join(lines))
+    parts.append(f"Current date context: {date_context}")
+    return "\n" + "\n\n".join(parts) + "\n"
+
+
+class SchemaContext:
+    """One generated schema: its text, hash, tables, enum values and the system blocks built from it"""
+
+    def __init__(self, tables, signature):
+        self.tables = [table["name"] for table in tables]
+        # (table, column) -> distinct values of the enum-like columns
+        self.values = {(table["name"], column["name"]): column["values"]
+                       for table in tables for column in table["columns"] if column["values"]}
+        self.signature = signature
+        self.text = render_schema(tables)
+        self.hash = hashlib.sha256(json.dumps(structure(tables)).encode("utf-8")).hexdigest()[:16]
+
+    def system_blocks(self, instructions=SQL_INSTRUCTIONS):
+        """System prompt for SQL generation with the schema marked for prompt caching"""
+        return [{"type": "text", "text": f"{instructions}\n{self.text}", "cache_control": {"type": "ephemeral"}}]
+
+
+def load_schema(conn):
+    """Introspect conn into a SchemaContext"""
+    return SchemaContext(introspect(conn), schema_signature(conn))
+
+
+class SchemaCache:
+    """The current SchemaContext, regenerated only when the schema signature changes"""
+
+    def __init__(self, connect, check_interval=CHECK_INTERVAL_SECONDS):
+        self._connect = connect
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._context = None
+        self._checked_at = 0.0
+        self.refreshes = 0
+
+    def get(self):
+        """The schema context, rechecking the signature at most every check_interval seconds"""
+        now = time.monotonic()
+        context = self._context
+        if context is not None and now - self._checked_at < self._check_interval:
+            return context
+        with self._lock:
+            if self._context is not None and now - self._checked_at < self._check_interval:
+                return self._context
+            with self._connect() as conn:
+                if self._context is None or schema_signature(conn) != self._context.signature:
+                    self._context = load_schema(conn)
+                    self.refreshes += 1
+            self._checked_at = now
+            return self._context
+
+    def invalidate(self):
+        """Force a signature check on the next get()"""
+        self._checked_at = 0.0
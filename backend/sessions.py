@@ -0,0 +1,135 @@
+"""
+CourtIQ Conversation Sessions
+Compacted conversation state kept on the server, keyed by session id.
+
+Clients used to post their whole chat history with every question, of
+which only the last three messages were used. With a session the client
+sends just the new question and its session id. The server keeps the
+last few turns, the earlier questions as a running summary, the entities
+the answers named (members, coaches, tiers, ...) and the last SQL query,
+and renders them into conversation text for the SQL prompt that stays
+within SESSION_CONTEXT_TOKEN_BUDGET tokens however long the chat gets.
+
+State is stored in the shared cache database, so every worker sees it.
+A session expires SESSION_TTL_SECONDS after its last question, the least
+recently used are dropped past SESSION_MAX_ENTRIES, and each one is
+bounded to a few kilobytes. Two questions sent on one session at the
+same time both see the state from before either; the later save wins.
+"""
+
+import os
+import re
+import uuid
+
+from result_format import CHARS_PER_TOKEN
+
+SESSION_HEADER = 'X-Session-Id'
+TOKEN_BUDGET = int(os.getenv('SESSION_CONTEXT_TOKEN_BUDGET', 500))
+# Turns kept word for word; older questions move to the summary
+RECENT_TURNS = int(os.getenv('SESSION_RECENT_TURNS', 2))
+SUMMARY_QUESTIONS = 8
+QUESTION_CHARS = 300
+SUMMARY_QUESTION_CHARS = 120
+ANSWER_CHARS = 300
+SQL_CHARS = 1000
+ENTITY_COLUMNS = 6
+ENTITY_VALUES = 5
+
+# Result columns whose text values are worth remembering for follow-ups ("what about her bookings?")
+_ENTITY_COLUMN = re.compile(r"(^|_)(name|tier|status|reason|surface|type|level)$")
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def valid_session_id(value):
+    return isinstance(value, str) and bool(_SESSION_ID.match(value))
+
+
+def new_state():
+    return {"turns": [], "summary": [], "entities": {}, "last_sql": None}
+
+
+def history_context(conversation_history):
+    """Conversation text from a history posted by the client: its last three messages"""
+    lines = []
+    for msg in (conversation_history or [])[-3:]:
+        if msg.get('question'):
+            lines.append(f"User asked: {msg['question']}")
+        if msg.get('answer'):
+            lines.append(f"Assistant answered: {msg['answer'][:ANSWER_CHARS]}...")
+    return "Recent conversation for context:\n" + "\n".join(lines) if lines else ""
+
+
+def extract_entities(rows, column_names):
+    """{column: values} of the name-like text columns in the first rows of a result"""
+    entities = {}
+    for i, column in enumerate(column_names or []):
+        if not _ENTITY_COLUMN.search(column.lower()):
+            continue
+        values = []
+        for row in rows:
+            if isinstance(row[i], str) and row[i] not in values:
+                values.append(row[i])
+                if len(values) == ENTITY_VALUES:
+                    break
+        if values:
+            entities[column] = values
+    return entities
+
+
+def record_turn(state, question, answer, sql_query=None, rows=None, column_names=None):
+    """state with a finished question folded in; returned for saving"""
+    state["turns"].append({"question": question[:QUESTION_CHARS], "answer": (answer or "")[:ANSWER_CHARS]})
+    while len(state["turns"]) > RECENT_TURNS:
+        state["summary"].append(state["turns"].pop(0)["question"][:SUMMARY_QUESTION_CHARS])
+    del state["summary"][:-SUMMARY_QUESTIONS]
+    if sql_query:
+        state["last_sql"] = sql_query[:SQL_CHARS]
+    entities = state["entities"]
+    for column, values in extract_entities(rows or [], column_names).items():
+        # Re-inserted so the most recently mentioned columns are kept
+        entities.pop(column, None)
+        entities[column] = values
+    for column in list(entities)[:-ENTITY_COLUMNS]:
+        del entities[column]
+    return state
+
+
+def _render(summary, entities, turns, last_sql):
+    lines = ["Conversation so far:"]
+    if summary:
+        lines.append("Earlier questions: " + "; ".join(summary))
+    if entities:
+        lines.append("Named in recent answers: " + "; ".join(
+            f"{column}: {', '.join(values)}" for column, values in entities.items()))
+    for turn in turns:
+        lines.append(f"User asked: {turn['question']}")
+        if turn["answer"]:
+            lines.append(f"Assistant answered: {turn['answer']}")
+    if last_sql:
+        lines.append(f"Last SQL query: {last_sql}")
+    return "\n".join(lines)
+
+
+def render_context(state, token_budget=TOKEN_BUDGET):
+    """Conversation text for the SQL prompt within token_budget.
+
+    Over the budget, the oldest summary questions go first, then the oldest turns (the latest one stays),
+    then the entities; whatever is still too long is cut off."""
+    if not state["turns"]:
+        return ""
+    summary, entities, turns = list(state["summary"]), dict(state["entities"]), list(state["turns"])
+    limit = token_budget * CHARS_PER_TOKEN
+    text = _render(summary, entities, turns, state["last_sql"])
+    while len(text) > limit and (summary or entities or len(turns) > 1):
+        if summary:
+            summary.pop(0)
+        elif len(turns) > 1:
+            turns.pop(0)
+        else:
+            entities = {}
+        text = _render(summary, entities, turns, state["last_sql"])
+    return text[:limit]
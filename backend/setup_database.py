@@ -5,6 +5,7 @@ Creates database, tables, and sample data for tennis club analytics
 
 import sqlite3
 from datetime import datetime
+from db import bump_data_version
 
 
 def create_database():
@@ -245,6 +246,7 @@ def create_database():
     ]
     cursor.executemany('INSERT OR IGNORE INTO bookings VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)', bookings_data)
 
+    bump_data_version(conn)
     conn.commit()
     print("Sample data inserted successfully!")
 
@@ -0,0 +1,132 @@
+"""
+CourtIQ Single-Flight
+Coalesces identical concurrent calls so they share one computation.
+
+The first caller for a key runs the function; callers arriving with the
+same key while it runs wait for it and receive the same result (or the
+same exception). Nothing is kept once the call finishes, so this only
+merges requests that overlap in time; the caches handle the rest.
+Coalescing is per worker process.
+"""
+
+import asyncio
+import os
+import threading
+
+# A follower stops waiting after this long and runs the call itself
+WAIT_SECONDS = float(os.getenv('SINGLEFLIGHT_WAIT_SECONDS', 60))
+
+
+class LeaderFailed(Exception):
+    """Raised to followers when the leader was interrupted by a BaseException (a worker timeout, a shutdown)"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Stats:
+    def __init__(self, name):
+        self.name = name
+        self._stats_lock = threading.Lock()
+        self._leaders = 0
+        self._followers = 0
+        self._errors = 0
+
+    def _count(self, leader=False, follower=False, error=False):
+        with self._stats_lock:
+            self._leaders += leader
+            self._followers += follower
+            self._errors += error
+
+    def stats(self):
+        """Calls that ran the function (leaders) and calls that shared another's result (followers)"""
+        with self._stats_lock:
+            calls = self._leaders + self._followers
+            return {
+                "leaders": self._leaders,
+                "followers": self._followers,
+                "errors": self._errors,
+                "in_flight": self.in_flight(),
+                "coalesced_ratio": round(self._followers / calls, 4) if calls else 0.0,
+            }
+
+
+class SingleFlight(_Stats):
+    """Single-flight group for threads"""
+
+    def __init__(self, name, wait_seconds=WAIT_SECONDS):
+        super().__init__(name)
+        self.wait_seconds = wait_seconds
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args):
+        """(func(*args), whether the result was shared with an earlier caller)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.done.wait(self.wait_seconds):
+                self._count(follower=True)
+                if call.error is not None:
+                    raise call.error
+                return call.result, True
+            # The leader is stuck; don't let it hold this request too
+            self._count(leader=True)
+            return func(*args), False
+
+        self._count(leader=True)
+        try:
+            call.result = func(*args)
+            return call.result, False
+        except BaseException as e:
+            # Followers re-raise errors in their own threads, which KeyboardInterrupt or SystemExit mustn't reach
+            call.error = e if isinstance(e, Exception) else LeaderFailed(
+                f"The shared {self.name} call was interrupted ({type(e).__name__})")
+            self._count(error=True)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        return len(self._calls)
+
+
+class AsyncSingleFlight(_Stats):
+    """Single-flight group for coroutines on one event loop
+
+    The shared call runs as its own task, so a caller that is cancelled
+    (say, its client disconnected) doesn't cancel it for the others.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self._tasks = {}
+
+    async def do(self, key, func, *args):
+        """(await func(*args), whether the result was shared with an earlier caller)"""
+        task = self._tasks.get(key)
+        leader = task is None
+        if leader:
+            task = self._tasks[key] = asyncio.ensure_future(func(*args))
+            task.add_done_callback(lambda done: self._finished(key, done))
+        self._count(leader=leader, follower=not leader)
+        return await asyncio.shield(task), not leader
+
+    def _finished(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled() and task.exception() is not None:
+            self._count(error=True)
+
+    def in_flight(self):
+        return len(self._tasks)
@@ -0,0 +1,46 @@
+"""
+CourtIQ Answer Rendering Tests
+Money and percentage formatting picked from whole words of the column name.
+"""
+
+import pytest
+
+from answer_render import format_value
+
+
+@pytest.mark.parametrize("column, value, expected", [
+    ("revenue", 1234.5, "$1,234.50"),
+    ("total_revenue", 42916, "$42,916.00"),
+    ("lost_revenue", 80.0, "$80.00"),
+    ("price", 15, "$15.00"),
+    ("amount_paid", 7.25, "$7.25"),
+])
+def test_money_columns(column, value, expected):
+    assert format_value(column, value) == expected
+
+
+@pytest.mark.parametrize("column, value, expected", [
+    ("cancellation_rate_pct", 12.5, "12.50%"),
+    ("revenue_percent", 40.0, "40%"),
+    ("percentage", 3, "3%"),
+])
+def test_percent_columns(column, value, expected):
+    assert format_value(column, value) == expected
+
+
+@pytest.mark.parametrize("column, value, expected", [
+    # Money words inside other words don't count
+    ("repricing_count", 3, "3"),
+    ("lessons_lost", 4, "4"),
+    ("feedback_score", 4.5, "4.50"),
+    ("accuracy", 0.75, "0.75"),
+    ("bookings", 1200, "1,200"),
+    ("total_bookings", 12.0, "12"),
+])
+def test_plain_numbers(column, value, expected):
+    assert format_value(column, value) == expected
+
+
+def test_text_and_null_cells():
+    assert format_value("revenue", None) == "none"
+    assert format_value("revenue", "n/a") == "n/a"
@@ -0,0 +1,110 @@
+"""
+CourtIQ Intent Router Tests
+Which questions the templates answer, and which they leave to the model.
+"""
+
+import sqlite3
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from intents import IntentRouter
+
+COACHES = [(1, "Jordan Lee"), (2, "Chris Wong")]
+TIERS = ["Junior", "Premium", "Standard"]
+REASONS = ["weather", "member-request", "coach-unavailable"]
+
+
+@pytest.fixture
+def router():
+    """IntentRouter over a small coaches table and fixed enum values"""
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.execute("CREATE TABLE coaches (coach_id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO coaches VALUES (?, ?)", COACHES)
+
+    @contextmanager
+    def connect():
+        yield conn
+
+    schema = SimpleNamespace(hash="test", values={("members", "membership_tier"): TIERS,
+                                                  ("bookings", "cancellation_reason"): REASONS})
+    yield IntentRouter(connect, lambda: schema, lambda: 1)
+    conn.close()
+
+
+def intent_of(router, question):
+    match = router.route(question)
+    return match.intent.name if match else None
+
+
+@pytest.mark.parametrize("question", [
+    "What is the cancellation rate?",
+    "What is the cancellation rate this month?",
+    "What's our overall cancellation rate in 2025?",
+    "cancellation rates for last month",
+])
+def test_overall_cancellation_rate_goes_to_the_model(router, question):
+    assert intent_of(router, question) is None
+
+
+@pytest.mark.parametrize("question", [
+    "Which members have the highest cancellation rate?",
+    "Who has the highest cancellation rate this month?",
+    "Top 5 members by cancellation rate",
+])
+def test_per_member_cancellation_rate_uses_the_template(router, question):
+    assert intent_of(router, question) == "member_cancellation_rate"
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("Which coaches generate the most revenue?", "top_coaches_by_revenue"),
+    ("How much revenue did Jordan make last month?", "coach_revenue"),
+    ("What is the revenue for coach Jordan in March 2025?", "coach_revenue"),
+    ("How much revenue did we lose to weather cancellations in December?", "lost_revenue"),
+    ("Who are the top 5 members by bookings?", "top_members_by_bookings"),
+    ("What is the average revenue per booking?", "average_booking_revenue"),
+    ("Show revenue by month in 2025", "revenue_by_month"),
+    ("What is our total revenue?", "total_revenue"),
+    ("Which courts are busiest this week?", "busiest_courts"),
+    ("How many members are in each tier?", "member_counts"),
+    ("How many Premium members do we have?", "tier_member_count"),
+])
+def test_common_questions_match_their_intent(router, question, intent):
+    assert intent_of(router, question) == intent
+
+
+@pytest.mark.parametrize("question", [
+    # Words no intent knows
+    "Which members booked clay courts on weekends?",
+    "What revenue did we make from juniors?",
+    "Which coach is the best teacher?",
+    "How many members joined this year?",
+    # Two periods
+    "What was revenue in March and April?",
+    "revenue last month and last year",
+])
+def test_questions_a_template_would_half_answer_go_to_the_model(router, question):
+    assert intent_of(router, question) is None
+
+
+def test_short_follow_ups_go_to_the_model(router):
+    conversation = "User asked: What is our total revenue?"
+    assert router.route("revenue last month?", conversation) is None
+    assert intent_of(router, "revenue last month?") == "total_revenue"
+
+
+def test_slots_are_bound_into_the_sql(router):
+    match = router.route("How much revenue did Jordan make last month?")
+    assert match.slots["coach"] == "Jordan Lee"
+    assert "b.coach_id = 1" in match.sql
+    assert f"b.booking_date >= '{match.slots['period']['start']}'" in match.sql
+    assert ":" not in match.sql.replace("%Y-%m", "")
+
+    match = router.route("Who are the top 5 members by bookings?")
+    assert match.sql.rstrip().endswith("LIMIT 5")
+
+
+def test_template_answer(router):
+    match = router.route("How many Premium members do we have?")
+    assert match.answer([(26,)]) == "We have 26 Premium members."
@@ -0,0 +1,41 @@
+"""
+CourtIQ Migration Tests
+EXPLAIN QUERY PLAN of the hot queries before and after the migrations.
+"""
+
+import sqlite3
+
+import pytest
+
+import setup_database
+from migrations import PLAN_CHECKS, LATEST_VERSION, apply_migrations, explain, schema_version
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """Connection to a database just built by setup_database, before any migration"""
+    monkeypatch.chdir(tmp_path)
+    setup_database.create_database()
+    conn = sqlite3.connect(tmp_path / "courtiq.db")
+    yield conn
+    conn.close()
+
+
+def test_migrations_give_hot_queries_their_indexes(fresh_db):
+    before = {description: explain(fresh_db, sql) for description, sql, _ in PLAN_CHECKS}
+    apply_migrations(fresh_db)
+    fresh_db.commit()
+    assert schema_version(fresh_db) == LATEST_VERSION
+
+    for description, sql, index in PLAN_CHECKS:
+        after = explain(fresh_db, sql)
+        assert not any(index in line for line in before[description]), (description, before[description])
+        assert any(index in line for line in after), (description, after)
+
+
+def test_migrations_are_idempotent(fresh_db):
+    apply_migrations(fresh_db)
+    fresh_db.commit()
+    assert apply_migrations(fresh_db) == []
+    for description, sql, index in PLAN_CHECKS:
+        assert any(index in line for line in explain(fresh_db, sql)), description
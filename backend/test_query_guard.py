@@ -0,0 +1,86 @@
+"""
+CourtIQ Query Guard Tests
+What generated SQL may do, and what gets it rejected.
+"""
+
+import sqlite3
+
+import pytest
+
+from query_guard import run_guarded_query, QueryRejected, QueryTimeout
+
+ALLOWED = ["members", "bookings"]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE members (member_id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE bookings (booking_id INTEGER PRIMARY KEY, member_id INTEGER, price REAL);
+        CREATE TABLE api_keys (key TEXT);
+    """)
+    conn.executemany("INSERT INTO members VALUES (?, ?)", [(i, f"Member {i}") for i in range(1, 301)])
+    conn.executemany("INSERT INTO bookings VALUES (?, ?, ?)", [(i, i % 300 + 1, 20.0) for i in range(1, 301)])
+    yield conn
+    conn.close()
+
+
+def test_select_runs(conn):
+    rows, columns, truncated = run_guarded_query(conn, "SELECT COUNT(*) AS n FROM members;", ALLOWED)
+    assert rows == [(300,)] and columns == ["n"] and not truncated
+
+
+def test_semicolons_in_literals_are_allowed(conn):
+    rows, _, _ = run_guarded_query(conn, "SELECT name FROM members WHERE name = 'a; b' -- ; trailing", ALLOWED)
+    assert rows == []
+
+
+def test_common_table_expressions_are_allowed(conn):
+    rows, _, _ = run_guarded_query(
+        conn, "WITH spend AS (SELECT member_id, SUM(price) AS total FROM bookings GROUP BY member_id) "
+              "SELECT COUNT(*) FROM spend", ALLOWED)
+    assert rows == [(300,)]
+
+
+def test_results_are_truncated_to_max_rows(conn):
+    rows, _, truncated = run_guarded_query(conn, "SELECT * FROM members", ALLOWED, max_rows=10)
+    assert len(rows) == 10 and truncated
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM members",
+    "UPDATE members SET name = 'x'",
+    "DROP TABLE members",
+    "PRAGMA table_info(members)",
+    "ATTACH DATABASE 'other.db' AS other",
+    "SELECT 1; DROP TABLE members",
+    "SELECT 1; SELECT 2",
+])
+def test_statements_other_than_one_select_are_rejected(conn, sql):
+    with pytest.raises(QueryRejected):
+        run_guarded_query(conn, sql, ALLOWED)
+    assert conn.execute("SELECT COUNT(*) FROM members").fetchone()[0] == 300
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM api_keys",
+    "SELECT name FROM sqlite_master",
+    "SELECT m.name FROM members m JOIN api_keys k ON 1 = 1",
+    "WITH leaked AS (SELECT key FROM api_keys) SELECT * FROM leaked",
+])
+def test_tables_outside_the_schema_are_rejected(conn, sql):
+    with pytest.raises(QueryRejected):
+        run_guarded_query(conn, sql, ALLOWED)
+
+
+def test_nested_full_scans_over_the_plan_limit_are_rejected(conn):
+    sql = "SELECT COUNT(*) FROM members a, members b, bookings c"
+    with pytest.raises(QueryRejected, match="would scan"):
+        run_guarded_query(conn, sql, ALLOWED, max_plan_rows=1_000_000)
+
+
+def test_queries_past_the_deadline_are_interrupted(conn):
+    sql = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT MAX(i) FROM n"
+    with pytest.raises(QueryTimeout):
+        run_guarded_query(conn, sql, ALLOWED, timeout=0.05)
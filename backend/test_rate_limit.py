@@ -0,0 +1,59 @@
+"""
+CourtIQ Rate Limiting Tests
+Quota parsing, per-tier limits and refills, on the in-memory backend.
+"""
+
+import pytest
+
+import rate_limit
+from rate_limit import Quota, RateLimiter, MemoryBackend
+
+QUOTAS = {"demo": {"ask": "2/hour", "rows": "1/minute"}, "pro": {"ask": "100/hour"}, "internal": {}}
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "time", lambda: clock[0])
+    limiter = RateLimiter(MemoryBackend(), QUOTAS)
+    limiter.clock = clock
+    return limiter
+
+
+@pytest.mark.parametrize("spec, limit, period, words", [
+    ("5/hour", 5, 3600, "5 requests per hour"),
+    ("100/minutes", 100, 60, "100 requests per minute"),
+    ("1/day", 1, 86400, "1 request per day"),
+    ("10/30", 10, 30, "10 requests per 30 seconds"),
+])
+def test_quota_parse_and_describe(spec, limit, period, words):
+    quota = Quota.parse(spec)
+    assert (quota.limit, quota.period) == (limit, period)
+    assert quota.describe() == words
+
+
+@pytest.mark.parametrize("spec", ["0/hour", "5/0"])
+def test_empty_quotas_are_rejected(spec):
+    with pytest.raises(ValueError):
+        Quota.parse(spec)
+
+
+def test_tiers_have_their_own_limits(limiter):
+    assert [limiter.hit("ask", "1.2.3.4")[0] for _ in range(3)] == [True, True, False]
+    assert all(limiter.hit("ask", "1.2.3.4", "pro")[0] for _ in range(10))
+    assert all(limiter.hit("ask", "1.2.3.4", "internal")[0] for _ in range(10))
+    # Route groups are counted separately
+    assert limiter.hit("rows", "1.2.3.4")[0]
+
+
+def test_unknown_tiers_get_the_default_quotas(limiter):
+    assert limiter.quota("ask", "nonexistent").limit == 2
+
+
+def test_buckets_refill_over_time(limiter):
+    limiter.hit("ask", "5.6.7.8")
+    limiter.hit("ask", "5.6.7.8")
+    allowed, retry_after = limiter.hit("ask", "5.6.7.8")
+    assert not allowed and retry_after == pytest.approx(1800)
+    limiter.clock[0] += 1800
+    assert limiter.hit("ask", "5.6.7.8")[0]
@@ -0,0 +1,35 @@
+"""
+CourtIQ Result Formatting Tests
+Answer prompt tables within the token budget.
+"""
+
+import pytest
+
+from result_format import summarize_for_prompt, CHARS_PER_TOKEN
+
+BUDGET = 100
+
+
+def test_small_result_is_sent_whole():
+    text = summarize_for_prompt([(1, "Court 1"), (2, "Court 2")], ["court_id", "court_name"], BUDGET)
+    assert "Court 1" in text and "Court 2" in text
+    assert "not shown" not in text and "statistics" not in text
+
+
+@pytest.mark.parametrize("row_count", [1, 2])
+def test_one_or_two_long_rows_are_shortened_not_split(row_count):
+    rows = [(i, f"note {i} " + "x" * 5000) for i in range(row_count)]
+    text = summarize_for_prompt(rows, ["booking_id", "notes"], BUDGET)
+    table, _ = text.split(f"Column statistics over all {row_count} rows")
+    assert "not shown" not in table
+    for i in range(row_count):
+        assert table.count(f"note {i} ") == 1
+    assert len(text) <= BUDGET * CHARS_PER_TOKEN
+
+
+def test_many_rows_keep_head_and_tail():
+    rows = [(i, f"member {i}") for i in range(1000)]
+    text = summarize_for_prompt(rows, ["member_id", "name"], BUDGET)
+    assert "member 0\n" in text and "member 999\n" in text
+    assert "more rows not shown" in text
+    assert len(text) <= BUDGET * CHARS_PER_TOKEN
@@ -0,0 +1,68 @@
+"""
+CourtIQ Single-Flight Tests
+Followers share the leader's result, its exception, or a LeaderFailed.
+"""
+
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight, LeaderFailed
+
+
+def run_with_follower(func):
+    """Outcomes (results or exceptions) of a leader running func and a follower asking for the same key"""
+    flight = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+    outcomes = {}
+
+    def leader_func():
+        started.set()
+        release.wait(5)
+        return func()
+
+    def call(name, target):
+        try:
+            outcomes[name] = flight.do("key", target)
+        except BaseException as e:
+            outcomes[name] = e
+
+    leader = threading.Thread(target=call, args=("leader", leader_func))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call, args=("follower", lambda: "ran itself"))
+    follower.start()
+    # Time for the follower to start waiting on the leader's call
+    time.sleep(0.2)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    return outcomes["leader"], outcomes["follower"], flight.stats()
+
+
+def test_followers_share_the_result():
+    leader, follower, stats = run_with_follower(lambda: "answer")
+    assert leader == ("answer", False)
+    assert follower == ("answer", True)
+    assert stats["followers"] == 1 and stats["in_flight"] == 0
+
+
+def test_followers_share_the_exception():
+    def failing():
+        raise ValueError("bad SQL")
+
+    leader, follower, stats = run_with_follower(failing)
+    assert isinstance(leader, ValueError) and follower is leader
+    assert stats["errors"] == 1
+
+
+@pytest.mark.parametrize("interrupt", [KeyboardInterrupt, SystemExit])
+def test_followers_of_an_interrupted_leader_get_leader_failed(interrupt):
+    def interrupted():
+        raise interrupt()
+
+    leader, follower, stats = run_with_follower(interrupted)
+    assert isinstance(leader, interrupt)
+    assert isinstance(follower, LeaderFailed)
+    assert stats["errors"] == 1 and stats["in_flight"] == 0
@@ -5,78 +5,44 @@ Converts natural language questions into SQL queries and returns answers
 
 import sqlite3
 import os
+import sys
 from anthropic import Anthropic
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Anthropic client
-client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
-
-# Database schema for context
-SCHEMA = """
-Database Schema for CourtIQ (Tennis Club Analytics):
-
-TABLE: members
-- member_id (INTEGER, PRIMARY KEY)
-- name (TEXT)
-- email (TEXT)
-- phone (TEXT)
-- membership_tier (TEXT: Premium, Standard, Junior)
-- join_date (DATE)
-- status (TEXT: active, inactive, churned)
-
-TABLE: courts
-- court_id (INTEGER, PRIMARY KEY)
-- court_name (TEXT)
-- surface_type (TEXT: hard, clay, grass)
-- indoor (INTEGER: 0 or 1)
-
-TABLE: coaches
-- coach_id (INTEGER, PRIMARY KEY)
-- name (TEXT)
-- specialty (TEXT)
-- hourly_rate (REAL)
-- weekly_available_hours (INTEGER)
-
-TABLE: bookings
-- booking_id (INTEGER, PRIMARY KEY)
-- member_id (INTEGER, FOREIGN KEY)
-- coach_id (INTEGER, FOREIGN KEY, nullable)
-- court_id (INTEGER, FOREIGN KEY)
-- lesson_type (TEXT: private, semi-private, group, court-rental)
-- booking_date (DATE)
-- start_time (TEXT)
-- end_time (TEXT)
-- duration_minutes (INTEGER)
-- price (REAL)
-- status (TEXT: completed, cancelled, no-show, scheduled)
-- cancellation_reason (TEXT: weather, member-request, coach-unavailable)
-- created_at (TEXT)
-
-Current date context: 2026-01-02
-"""
+# Schema block and call policy shared with the backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from schema import load_schema  # noqa: E402
+from llm import ResilientClient  # noqa: E402
+from model_tiers import sql_route, answer_route  # noqa: E402
+
+# Initialize Anthropic client; retries, deadlines and the circuit breaker come from backend/llm.py
+client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), max_retries=0)
+llm = ResilientClient(client)
+
+schema_conn = sqlite3.connect('courtiq.db')
+SCHEMA = load_schema(schema_conn)
+schema_conn.close()
 
 
 def get_sql_from_question(question):
     """
     Use Claude to convert a natural language question into SQL
     """
-    prompt = f"""You are a SQL expert for a tennis club database. Given the following schema and a user question, generate ONLY the SQL query needed to answer it. Do not include any explanation, markdown formatting, or additional text.
-
-{SCHEMA}
-
-User Question: {question}
+    prompt = f"""User Question: {question}
 
 Generate a valid SQLite query that answers this question. Return ONLY the SQL query, nothing else."""
 
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=1000,
+    route = sql_route()
+    message = llm.create(
+        route.stage,
+        system=SCHEMA.system_blocks(),
         messages=[
             {"role": "user", "content": prompt}
-        ]
+        ],
+        **route.params()
     )
 
     sql_query = message.content[0].text.strip()
@@ -140,12 +106,13 @@ Results:
 
 Provide a clear, conversational answer that directly addresses the question. Include specific numbers and names from the results."""
 
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=1000,
+    route = answer_route(len(results))
+    message = llm.create(
+        route.stage,
         messages=[
             {"role": "user", "content": prompt}
-        ]
+        ],
+        **route.params()
     )
 
     return message.content[0].text.strip()
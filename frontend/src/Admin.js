@@ -12,6 +12,8 @@ function Admin() {
   const [coaches, setCoaches] = useState([]);
   const [courts, setCourts] = useState([]);
   const [bookings, setBookings] = useState([]);
+  const [membersCursor, setMembersCursor] = useState(null);
+  const [bookingsCursor, setBookingsCursor] = useState(null);
   const [showAddForm, setShowAddForm] = useState(false);
   const [formData, setFormData] = useState({});
   const [revenueData, setRevenueData] = useState([]);
@@ -38,9 +40,11 @@ useEffect(() => {
   setRevenueData(res.data);
 };
 
-  const loadMembers = async () => {
-    const res = await axios.get(`${API_BASE}/admin/members`);
-    setMembers(res.data);
+  // Listings are paged; a cursor loads the next page and appends it
+  const loadMembers = async (cursor = null) => {
+    const res = await axios.get(`${API_BASE}/admin/members`, {params: cursor ? {cursor} : {}});
+    setMembers(prev => cursor ? [...prev, ...res.data] : res.data);
+    setMembersCursor(res.headers['x-next-cursor'] || null);
   };
 
   const loadCoaches = async () => {
@@ -53,9 +57,10 @@ useEffect(() => {
     setCourts(res.data);
   };
 
-  const loadBookings = async () => {
-    const res = await axios.get(`${API_BASE}/admin/bookings`);
-    setBookings(res.data);
+  const loadBookings = async (cursor = null) => {
+    const res = await axios.get(`${API_BASE}/admin/bookings`, {params: cursor ? {cursor} : {}});
+    setBookings(prev => cursor ? [...prev, ...res.data] : res.data);
+    setBookingsCursor(res.headers['x-next-cursor'] || null);
   };
 
   const handleAddMember = async (e) => {
@@ -252,6 +257,7 @@ useEffect(() => {
                 ))}
               </tbody>
             </table>
+            {membersCursor && <button className="add-btn" onClick={() => loadMembers(membersCursor)}>Load more</button>}
           </div>
         )}
 
@@ -455,6 +461,7 @@ useEffect(() => {
                 ))}
               </tbody>
             </table>
+            {bookingsCursor && <button className="add-btn" onClick={() => loadBookings(bookingsCursor)}>Load more</button>}
           </div>
         )}
       </div>
@@ -1,5 +1,4 @@
 import React, { useState, useRef, useEffect } from 'react';
-import axios from 'axios';
 import './App.css';
 
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000';
@@ -9,6 +8,8 @@ function App() {
   const [messages, setMessages] = useState([]);
   const [loading, setLoading] = useState(false);
   const messagesEndRef = useRef(null);
+  // The server keeps the conversation; only its session id is sent back with each question
+  const sessionIdRef = useRef(null);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -36,27 +37,54 @@ function App() {
     setQuestion('');
     setLoading(true);
 
+    let streamStarted = false;
     try {
-      const response = await axios.post(`${API_URL}/ask`, {
-        question: question,
-        history: messages.map(msg => ({
-          question: msg.type === 'user' ? msg.text : null,
-          answer: msg.type === 'assistant' ? msg.text : null
-        }))
+      const response = await fetch(`${API_URL}/ask/stream`, {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({
+          question: question,
+          session_id: sessionIdRef.current
+        })
       });
+      if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+      sessionIdRef.current = response.headers.get('X-Session-Id') || sessionIdRef.current;
 
-      const assistantMessage = {
-        type: 'assistant',
-        text: response.data.answer,
-      };
+      // Show the answer as it streams in instead of waiting for the whole pipeline
+      setMessages(prev => [...prev, {type: 'assistant', text: ''}]);
+      streamStarted = true;
+      setLoading(false);
+
+      const appendText = (text) => setMessages(prev => {
+        const last = prev[prev.length - 1];
+        return [...prev.slice(0, -1), {...last, text: last.text + text}];
+      });
 
-      setMessages(prev => [...prev, assistantMessage]);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const {done, value} = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, {stream: true});
+
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const raw of events) {
+          const event = raw.match(/^event: (.*)$/m)?.[1];
+          const data = raw.match(/^data: (.*)$/m)?.[1];
+          if (!event || !data) continue;
+          if (event === 'token') appendText(JSON.parse(data).text);
+          if (event === 'error') throw new Error(JSON.parse(data).error);
+        }
+      }
     } catch (error) {
       const errorMessage = {
         type: 'assistant',
         text: "I'm having trouble understanding that question. Could you rephrase it or ask something about members, bookings, coaches, or revenue?"
       };
-      setMessages(prev => [...prev, errorMessage]);
+      // Replace a partially streamed answer rather than leaving it half-written
+      setMessages(prev => [...(streamStarted ? prev.slice(0, -1) : prev), errorMessage]);
     } finally {
       setLoading(false);
       setTimeout(() => {